@@ -0,0 +1,374 @@
+import math
+import threading
+import time
+
+
+class AdmissionController:
+    """ Decides if a request can be handled or has to be rejected because the server is overloaded. It supports a
+    global concurrency limit, concurrency limits per API route and an optional adaptive mode that sheds load when the
+    queueing delay of the requests stays over a target, following the CoDel algorithm.
+
+    When the global limit is reached, the requests can wait in a bounded queue for a slot to be released instead of
+    being rejected at once. The queueing delay is the time since the request was parsed until it gets a slot, so it
+    doesn't include the connection setup or a slow client. As the requests are handled by a thread each, the delay
+    only grows while they wait in the queue, so the adaptive mode needs a global limit and a queue.
+    """
+    __MAX_CONCURRENCY = None
+
+    __ROUTE_CONCURRENCY = {}
+
+    __RETRY_AFTER = 1
+
+    __ADAPTIVE = None
+
+    __QUEUE = {
+        "max_size": 0,
+        "timeout": 1
+    }
+
+    __LOCK = threading.Lock()
+
+    __SLOT_RELEASED = threading.Condition(__LOCK)
+
+    __WAITING = 0
+
+    __IN_FLIGHT = {
+        "global": 0,
+        "routes": {}
+    }
+
+    __CODEL = {
+        "first_above_time": 0,
+        "drop_next": 0,
+        "count": 0,
+        "dropping": False
+    }
+
+    __STATS = {
+        "global": {
+            "admitted": 0,
+            "rejected": 0
+        },
+        "routes": {},
+        "shed": 0
+    }
+
+    @staticmethod
+    def admit(route=None, queued_since=None):
+        """ Admits a request, taking one slot of the global limit if `route` is `None`, or one slot of the limit of
+        `route` otherwise. Every admitted request has to call `release` with the same route once it is handled.
+
+        Args:
+            route (str): the API route of the endpoint, as it was given to the endpoint decorator.
+            queued_since (float): the `time.monotonic()` value of the moment the request was parsed, used by the
+                adaptive mode to measure the queueing delay.
+
+        Raises:
+            RequestRejectedException: if the limit is exceeded and the queue is full or the request has waited for too
+                long, or if the adaptive mode decides to shed the request.
+        """
+        with AdmissionController.__LOCK:
+            if route is None:
+                limit = AdmissionController.__MAX_CONCURRENCY
+                in_flight = AdmissionController.__IN_FLIGHT["global"]
+                stats = AdmissionController.__STATS["global"]
+
+            else:
+                limit = AdmissionController.__ROUTE_CONCURRENCY.get(route)
+                in_flight = AdmissionController.__IN_FLIGHT["routes"].get(route, 0)
+                stats = AdmissionController.__STATS["routes"].setdefault(route, {"admitted": 0, "rejected": 0})
+
+            if limit is not None and in_flight >= limit and \
+                    (route is not None or not AdmissionController.__wait_for_slot()):
+                stats["rejected"] += 1
+                raise RequestRejectedException(AdmissionController.__RETRY_AFTER)
+
+            if route is None and AdmissionController.__ADAPTIVE is not None and queued_since is not None:
+                if AdmissionController.__should_shed(time.monotonic(), queued_since):
+                    AdmissionController.__STATS["shed"] += 1
+                    raise RequestRejectedException(AdmissionController.__RETRY_AFTER)
+
+            stats["admitted"] += 1
+            if route is None:
+                AdmissionController.__IN_FLIGHT["global"] += 1
+
+            else:
+                AdmissionController.__IN_FLIGHT["routes"][route] = in_flight + 1
+
+    @staticmethod
+    def __wait_for_slot():
+        """ Waits in the queue until a global slot is released, if the queue is not full. Must be called with the lock
+        held, that is released while waiting.
+
+        Returns:
+            `True` if there is a free slot, `False` if the queue is full or the queue timeout expired.
+        """
+        if AdmissionController.__WAITING >= AdmissionController.__QUEUE["max_size"]:
+            return False
+
+        AdmissionController.__WAITING += 1
+        try:
+            return AdmissionController.__SLOT_RELEASED.wait_for(AdmissionController.__has_free_slot,
+                                                                AdmissionController.__QUEUE["timeout"])
+
+        finally:
+            AdmissionController.__WAITING -= 1
+
+    @staticmethod
+    def __has_free_slot():
+        """ Checks if the global limit allows one more request. Must be called with the lock held.
+
+        Returns:
+            `True` if there is a free global slot.
+        """
+        limit = AdmissionController.__MAX_CONCURRENCY
+        return limit is None or AdmissionController.__IN_FLIGHT["global"] < limit
+
+    @staticmethod
+    def release(route=None):
+        """ Releases the slot taken by `admit`.
+
+        Args:
+            route (str): the API route of the endpoint, `None` for the global slot.
+        """
+        with AdmissionController.__LOCK:
+            if route is None:
+                AdmissionController.__IN_FLIGHT["global"] -= 1
+                AdmissionController.__SLOT_RELEASED.notify()
+
+            else:
+                AdmissionController.__IN_FLIGHT["routes"][route] -= 1
+
+    @staticmethod
+    def get_stats():
+        """ Gets the counters of the global limit and of the limit of each route, with the admitted and rejected
+        requests and the requests currently in flight, along with the requests shed by the adaptive mode and the ones
+        waiting in the queue.
+
+        Returns:
+            A `dict` with the "global" counters, the counters of each route in "routes", "shed" and "waiting".
+        """
+        with AdmissionController.__LOCK:
+            stats = {
+                "global": dict(AdmissionController.__STATS["global"],
+                               in_flight=AdmissionController.__IN_FLIGHT["global"]),
+                "routes": {route: dict(counters, in_flight=AdmissionController.__IN_FLIGHT["routes"].get(route, 0))
+                           for route, counters in AdmissionController.__STATS["routes"].items()},
+                "shed": AdmissionController.__STATS["shed"],
+                "waiting": AdmissionController.__WAITING
+            }
+            return stats
+
+    @staticmethod
+    def __should_shed(now, queued_since):
+        """ Applies the CoDel control law. While the queueing delay stays under the target nothing is shed. When it
+        has been over the target for a whole interval it enters the dropping state, where requests are shed at a rate
+        that grows with the square root of the drops, until a request is seen with a delay under the target again.
+        Must be called with the lock held.
+
+        Args:
+            now (float): the current `time.monotonic()` value.
+            queued_since (float): the `time.monotonic()` value of the moment the request was parsed.
+
+        Returns:
+            `True` if the request has to be shed.
+        """
+        target = AdmissionController.__ADAPTIVE["target"]
+        interval = AdmissionController.__ADAPTIVE["interval"]
+        codel = AdmissionController.__CODEL
+        if now - queued_since < target:
+            codel["first_above_time"] = 0
+            codel["dropping"] = False
+            return False
+
+        if codel["dropping"]:
+            if now >= codel["drop_next"]:
+                codel["count"] += 1
+                codel["drop_next"] += interval / math.sqrt(codel["count"])
+                return True
+
+            return False
+
+        if codel["first_above_time"] == 0:
+            codel["first_above_time"] = now + interval
+            return False
+
+        if now >= codel["first_above_time"]:
+            """ If the last dropping state was recent, starts dropping at a rate close to the one it had.
+            """
+            codel["dropping"] = True
+            if codel["count"] > 2 and now - codel["drop_next"] < 8 * interval:
+                codel["count"] -= 2
+
+            else:
+                codel["count"] = 1
+
+            codel["drop_next"] = now + interval / math.sqrt(codel["count"])
+            return True
+
+        return False
+
+    @staticmethod
+    def set_max_concurrency(max_concurrency):
+        """ Sets the global concurrency limit.
+
+        Args:
+            max_concurrency (int): the maximum amount of requests handled at the same time, `None` for no limit.
+
+        Raises:
+            ConcurrencyLimitWrongTypeException: if the limit is not a positive `int` or `None`.
+            AdaptiveSheddingWithoutQueueException: if the limit is removed while the adaptive mode is enabled.
+        """
+        if max_concurrency is not None and not AdmissionController.__is_positive_int(max_concurrency):
+            raise ConcurrencyLimitWrongTypeException(max_concurrency)
+
+        with AdmissionController.__LOCK:
+            if max_concurrency is None and AdmissionController.__ADAPTIVE is not None:
+                raise AdaptiveSheddingWithoutQueueException()
+
+            AdmissionController.__MAX_CONCURRENCY = max_concurrency
+            AdmissionController.__SLOT_RELEASED.notify_all()
+
+    @staticmethod
+    def set_route_concurrency(route_concurrency):
+        """ Sets the concurrency limits per API route.
+
+        Args:
+            route_concurrency (dict of str: int): the limits, the keys are the routes as they were given to the
+                endpoint decorators.
+
+        Raises:
+            ConcurrencyLimitWrongTypeException: if the limits object has an incorrect structure.
+        """
+        if not isinstance(route_concurrency, dict):
+            raise ConcurrencyLimitWrongTypeException(route_concurrency)
+
+        for route in route_concurrency:
+            if not isinstance(route, str) or not AdmissionController.__is_positive_int(route_concurrency[route]):
+                raise ConcurrencyLimitWrongTypeException(route_concurrency)
+
+        AdmissionController.__ROUTE_CONCURRENCY = route_concurrency
+
+    @staticmethod
+    def get_retry_after():
+        """ Gets the seconds sent in the "Retry-After" header of the rejected requests.
+
+        Returns:
+            The seconds.
+        """
+        return AdmissionController.__RETRY_AFTER
+
+    @staticmethod
+    def set_retry_after(retry_after):
+        """ Sets the seconds sent in the "Retry-After" header of the rejected requests.
+
+        Args:
+            retry_after (int): the seconds.
+
+        Raises:
+            ConcurrencyLimitWrongTypeException: if the seconds are not a positive `int`.
+        """
+        if not AdmissionController.__is_positive_int(retry_after):
+            raise ConcurrencyLimitWrongTypeException(retry_after)
+
+        AdmissionController.__RETRY_AFTER = retry_after
+
+    @staticmethod
+    def set_queue(queue):
+        """ Sets the queue where the requests wait for a global slot when the global limit is reached.
+
+        Args:
+            queue (dict of str: obj): a `dict` with the "max_size" of the queue, 0 by default, that rejects the requests
+                without waiting, and the "timeout" in seconds a request waits for a slot, 1 by default.
+
+        Raises:
+            ConcurrencyLimitWrongTypeException: if the queue object has an incorrect structure.
+            AdaptiveSheddingWithoutQueueException: if the queue is removed while the adaptive mode is enabled.
+        """
+        if not isinstance(queue, dict):
+            raise ConcurrencyLimitWrongTypeException(queue)
+
+        max_size = queue.get("max_size", 0)
+        timeout = queue.get("timeout", 1)
+        if isinstance(max_size, bool) or not isinstance(max_size, int) or max_size < 0 or \
+                isinstance(timeout, bool) or not isinstance(timeout, (int, float)) or timeout <= 0:
+            raise ConcurrencyLimitWrongTypeException(queue)
+
+        with AdmissionController.__LOCK:
+            if max_size == 0 and AdmissionController.__ADAPTIVE is not None:
+                raise AdaptiveSheddingWithoutQueueException()
+
+            AdmissionController.__QUEUE = {"max_size": max_size, "timeout": timeout}
+
+    @staticmethod
+    def set_adaptive_shedding(adaptive):
+        """ Enables or disables the adaptive mode. It can only be enabled once the global limit and a queue with a
+        "max_size" over 0 are set, as the queueing delay is measured while the requests wait in the queue.
+
+        Args:
+            adaptive (dict of str: float): a `dict` with the "target" queueing delay and the "interval" in seconds, or
+                `None` to disable it. Both values are optional and default to 0.005 and 0.1 seconds.
+
+        Raises:
+            ConcurrencyLimitWrongTypeException: if the adaptive mode object has an incorrect structure.
+            AdaptiveSheddingWithoutQueueException: if the global limit or the queue are not set.
+        """
+        if adaptive is None:
+            AdmissionController.__ADAPTIVE = None
+            return
+
+        if not isinstance(adaptive, dict):
+            raise ConcurrencyLimitWrongTypeException(adaptive)
+
+        target = adaptive.get("target", 0.005)
+        interval = adaptive.get("interval", 0.1)
+        for value in [target, interval]:
+            if isinstance(value, bool) or not isinstance(value, (int, float)) or value <= 0:
+                raise ConcurrencyLimitWrongTypeException(adaptive)
+
+        with AdmissionController.__LOCK:
+            if AdmissionController.__MAX_CONCURRENCY is None or AdmissionController.__QUEUE["max_size"] == 0:
+                raise AdaptiveSheddingWithoutQueueException()
+
+            AdmissionController.__ADAPTIVE = {"target": target, "interval": interval}
+            AdmissionController.__CODEL.update(first_above_time=0, drop_next=0, count=0, dropping=False)
+
+    @staticmethod
+    def __is_positive_int(value):
+        """ Checks if a value is a positive `int`.
+
+        Args:
+            value (obj): the value.
+
+        Returns:
+            `True` if the value is a positive `int`.
+        """
+        return isinstance(value, int) and not isinstance(value, bool) and value > 0
+
+
+class RequestRejectedException(Exception):
+    """ Exception to be raised when a request is rejected because the server is overloaded.
+
+    Attributes:
+        retry_after (int): the seconds the client should wait before retrying.
+    """
+    def __init__(self, retry_after):
+        self.retry_after = retry_after
+        super().__init__("Request rejected, retry after {} seconds".format(retry_after))
+
+
+class ConcurrencyLimitWrongTypeException(Exception):
+    """ Exception to be raised if a concurrency limit option has an incorrect type.
+    """
+    def __init__(self, value):
+        message = "Concurrency limit options should be positive numbers, '{}' was given".format(value)
+        super().__init__(message)
+
+
+class AdaptiveSheddingWithoutQueueException(Exception):
+    """ Exception to be raised if the adaptive mode is enabled without the global limit and the queue it needs, or
+    they are removed while it is enabled.
+    """
+    def __init__(self):
+        message = "The adaptive shedding needs a 'max_concurrency' and an 'admission_queue' with a 'max_size' over 0"
+        super().__init__(message)
@@ -0,0 +1,149 @@
+import hashlib
+import mimetypes
+import os
+import threading
+
+
+class AssetManifest:
+    """ An in-memory manifest of the files of a folder, with their size, modification time, MIME type, content hash and
+    precompressed variants, so they can be looked up without touching the filesystem. Only this metadata is kept in
+    memory, the content is read from the files when they are served. Each file is also reachable by a
+    fingerprinted path, with the start of its content hash before its extension, like "js/app.3f2a9c1b5d7e8f60.js",
+    that changes whenever its content changes, so it can be cached forever.
+
+    The precompressed variants are the files with the same path followed by ".br" or ".gz", that are not assets on
+    their own. A variant older than its file is ignored, as it was compressed from a previous content. Rescanning only
+    hashes the files whose size or modification time have changed.
+
+    Attributes:
+        folder (str): the scanned folder.
+    """
+    __VARIANT_EXTENSIONS = {
+        ".br": "br",
+        ".gz": "gzip"
+    }
+
+    __FINGERPRINT_LENGTH = 16
+
+    __HASH_CHUNK_SIZE = 65536
+
+    def __init__(self, folder):
+        """ Scans the folder.
+
+        Args:
+            folder (str): the folder.
+        """
+        self.folder = folder
+        self.__assets = {}
+        self.__fingerprinted = {}
+        self.__lock = threading.Lock()
+        self.rescan()
+
+    def get(self, path):
+        """ Gets an asset by its path or its fingerprinted path.
+
+        Args:
+            path (str): the normalized path, relative to the folder.
+
+        Returns:
+            A tuple(Asset, bool) with the asset and `True` if the path is the fingerprinted one, or `None` if there is
+            no asset with that path.
+        """
+        asset = self.__assets.get(path)
+        if asset is not None:
+            return asset, False
+
+        asset = self.__fingerprinted.get(path)
+        if asset is not None:
+            return asset, True
+
+        return None
+
+    def rescan(self):
+        """ Scans the folder again, hashing only the new and modified files. The new manifest replaces the current one
+        at once, so the lookups done meanwhile are not affected.
+
+        Returns:
+            The amount of files that have been added, modified or removed.
+        """
+        with self.__lock:
+            files = {}
+            for directory, _, names in os.walk(self.folder):
+                for name in names:
+                    full_path = os.path.join(directory, name)
+                    try:
+                        stat = os.stat(full_path)
+
+                    except OSError:
+                        continue
+
+                    path = os.path.relpath(full_path, self.folder).replace(os.sep, "/")
+                    files[path] = (stat.st_size, stat.st_mtime_ns)
+
+            assets = {}
+            changes = 0
+            for path, (size, mtime) in files.items():
+                extension = os.path.splitext(path)[1]
+                if extension in AssetManifest.__VARIANT_EXTENSIONS and path[:-len(extension)] in files:
+                    continue
+
+                asset = self.__assets.get(path)
+                if asset is None or asset.size != size or asset.mtime != mtime:
+                    try:
+                        asset = Asset(path, size, mtime, self.__hash(path))
+
+                    except OSError:
+                        continue
+
+                    changes += 1
+
+                asset.variants = {encoding: path + variant_extension
+                                  for variant_extension, encoding in AssetManifest.__VARIANT_EXTENSIONS.items()
+                                  if path + variant_extension in files and files[path + variant_extension][1] >= mtime}
+                assets[path] = asset
+
+            changes += len(set(self.__assets) - set(assets))
+            self.__fingerprinted = {asset.fingerprinted_path: asset for asset in assets.values()}
+            self.__assets = assets
+            return changes
+
+    def __hash(self, path):
+        """ Hashes the content of a file.
+
+        Args:
+            path (str): the path of the file, relative to the folder.
+
+        Returns:
+            The SHA-256 hash as a hexadecimal `str`.
+        """
+        hasher = hashlib.sha256()
+        with open(os.path.join(self.folder, path), "rb") as f:
+            for chunk in iter(lambda: f.read(AssetManifest.__HASH_CHUNK_SIZE), b""):
+                hasher.update(chunk)
+
+        return hasher.hexdigest()[:AssetManifest.__FINGERPRINT_LENGTH]
+
+
+class Asset:
+    """ A file of the manifest.
+
+    Attributes:
+        path (str): the path, relative to the folder of the manifest.
+        size (int): the size in bytes.
+        mtime (int): the modification time in nanoseconds.
+        mime_type (str): the guessed MIME type, or `None` if it is unknown.
+        hash (str): the start of the SHA-256 hash of the content.
+        fingerprinted_path (str): the path with the hash before the extension.
+        variants (dict of str: str): the paths of the precompressed variants by their encoding, "br" or "gzip".
+    """
+    def __init__(self, path, size, mtime, content_hash):
+        self.path = path
+        self.size = size
+        self.mtime = mtime
+        self.mime_type = mimetypes.guess_type(path, strict=True)[0]
+        self.hash = content_hash
+        directory, name = path.rpartition("/")[::2]
+        stem, extension = os.path.splitext(name)
+        fingerprinted_name = "{}.{}{}".format(stem or extension, content_hash, extension if stem else "")
+        self.fingerprinted_path = directory + "/" + fingerprinted_name if directory else fingerprinted_name
+        self.variants = {}
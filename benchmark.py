@@ -0,0 +1,759 @@
+""" Load-testing benchmark of the server.
+
+Every scenario starts a fresh server in a child process, so the hooks and endpoints of one scenario don't affect the
+others, and drives it with a load generator of many concurrent connections written with `asyncio`. It reports the
+requests per second, the p50, p99 and p999 latencies and the memory of the server, and can save the results as JSON to
+compare them with the results of another commit.
+
+Usage:
+    python benchmark.py [--scenarios name,...] [--connections 50] [--duration 5] [--output results.json]
+                        [--compare previous.json]
+"""
+import argparse
+import asyncio
+import base64
+import concurrent.futures
+import http.server
+import json
+import os
+import platform
+import signal
+import socket
+import ssl
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+
+STATIC_FILE_SIZES = {
+    "static_1k": 1024,
+    "static_64k": 64 * 1024,
+    "static_1m": 1024 * 1024
+}
+
+WS_MESSAGE = "x" * 64
+
+SCENARIOS = {}
+
+
+def scenario(name, description, processes=1):
+    """ Registers a scenario. The decorated function sets up the server side of the scenario, see `run_client` for
+    the load that drives it.
+
+    Args:
+        name (str): the name of the scenario.
+        description (str): a short description, shown in the help.
+        processes (int): the amount of server processes, that share the port and the connections.
+    """
+    def wrap(setup):
+        SCENARIOS[name] = {"setup": setup, "description": description, "processes": processes}
+        return setup
+
+    return wrap
+
+
+""" Server side
+"""
+
+
+def serve(scenario_name, port, peer=False):
+    """ Sets up the scenario and serves it forever, one thread per connection. It is run in the child process. If the
+    scenario has several processes, this one starts the others, its peers, and waits until they are listening.
+
+    Args:
+        scenario_name (str): the name of the scenario.
+        port (int): the port to listen on.
+        peer (bool): `True` if it is a peer, that exits when the first process closes its stdin.
+    """
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from httprequesthandler import HttpRequestHandler
+
+    os.chdir(tempfile.mkdtemp(prefix="httpserver-benchmark-"))
+    processes = SCENARIOS[scenario_name]["processes"]
+    SCENARIOS[scenario_name]["setup"]()
+    if peer:
+        threading.Thread(target=lambda: (sys.stdin.read(), os._exit(0)), daemon=True).start()
+
+    elif processes > 1:
+        for _ in range(processes - 1):
+            process = subprocess.Popen([sys.executable, os.path.abspath(__file__), "--serve", scenario_name,
+                                        "--port", str(port), "--peer"], stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+            process.stdout.readline()
+
+    """ The handler logs every request, which would measure the speed of the terminal.
+    """
+    sys.stdout = open(os.devnull, "w")
+    """ Exiting on SIGTERM lets the process pool stop its workers and release their resources.
+    """
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if processes > 1:
+        server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+
+    server.bind(("127.0.0.1", port))
+    server.listen(1024)
+    if peer:
+        sys.__stdout__.write("ready\n")
+        sys.__stdout__.flush()
+
+    while True:
+        client, address = server.accept()
+        threading.Thread(target=HttpRequestHandler, args=(client, address), daemon=True).start()
+
+
+def setup_static():
+    """ Writes the app files of every size.
+    """
+    os.mkdir("app")
+    for name, size in STATIC_FILE_SIZES.items():
+        with open(os.path.join("app", name + ".bin"), "wb") as f:
+            f.write(os.urandom(size))
+
+
+for static_name in STATIC_FILE_SIZES:
+    scenario(static_name, "GET of a {} byte app file".format(STATIC_FILE_SIZES[static_name]))(setup_static)
+
+
+@scenario("static_manifest", "GET of a 1024 byte app file looked up in the asset manifest")
+def setup_static_manifest():
+    """ Writes the app file and scans it into the asset manifest.
+    """
+    from httprequesthandler import HttpRequestHandler
+
+    os.mkdir("app")
+    with open(os.path.join("app", "static_manifest.bin"), "wb") as f:
+        f.write(os.urandom(1024))
+
+    HttpRequestHandler.configure({"asset_manifest": {}})
+
+
+def setup_tls():
+    """ Generates a self-signed certificate with the `openssl` command and enables TLS.
+    """
+    from httprequesthandler import HttpRequestHandler
+
+    subprocess.run(["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-keyout", "key.pem",
+                    "-out", "cert.pem", "-days", "1", "-subj", "/CN=127.0.0.1"], check=True, capture_output=True)
+    HttpRequestHandler.configure({"tls": {"certfile": "cert.pem", "keyfile": "key.pem"}})
+    HttpRequestHandler.get("/ping")(lambda: b"pong")
+
+
+scenario("tls_full", "GET over a new TLS connection with a full handshake")(setup_tls)
+scenario("tls_resumed", "GET over a new TLS connection resuming the previous session with a ticket")(setup_tls)
+
+
+def register_routes():
+    """ Registers a realistic amount of exact-match and dynamic API routes.
+    """
+    from httprequesthandler import HttpRequestHandler
+
+    for i in range(20):
+        HttpRequestHandler.get("/resource{}".format(i))(lambda: b"{}")
+        HttpRequestHandler.get("/resource{}/:id".format(i))(lambda id_: b"{}")
+
+    HttpRequestHandler.get("/ping")(lambda: b"pong")
+    HttpRequestHandler.get("/users/:user/posts/:post")(lambda user, post: (user + ":" + post).encode("utf-8"))
+
+
+@scenario("api_exact", "GET of an exact-match API route")
+def setup_api_exact():
+    register_routes()
+
+
+@scenario("api_dynamic", "GET of a dynamic API route with two :param parts")
+def setup_api_dynamic():
+    register_routes()
+
+
+@scenario("api_hooks", "GET of an exact-match API route with 10 hooks in each hook list")
+def setup_api_hooks():
+    from httprequesthandler import HttpRequestHandler
+
+    register_routes()
+    for i in range(10):
+        def hook(request, response, i=i):
+            response.headers["X-Hook-{}".format(i)] = str(response.status_code)
+
+        HttpRequestHandler.after_parsing_request(hook)
+        HttpRequestHandler.before_sending_response(hook)
+        HttpRequestHandler.after_sending_response(hook)
+
+
+def process_endpoint():
+    """ The endpoint of the "api_process" scenario, at module level so the workers of the process pool can import it.
+    """
+    return b"pong"
+
+
+@scenario("api_process", "GET of an exact-match API route run in the process pool")
+def setup_api_process():
+    from httprequesthandler import HttpRequestHandler
+
+    register_routes()
+    HttpRequestHandler.configure({"process_pool": {"max_pending": 1024}})
+    HttpRequestHandler.get("/process", executor="process")(process_endpoint)
+
+
+@scenario("proxy", "GET proxied to a local keep-alive backend through the upstream connection pool")
+def setup_proxy():
+    from httprequesthandler import HttpRequestHandler
+
+    class BackendHandler(http.server.BaseHTTPRequestHandler):
+        """ The head and the body are written separately, so without TCP_NODELAY the body would wait for the delayed
+        ACK of the head on the kept-alive connection.
+        """
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True
+
+        def do_GET(self):
+            self.send_response(200)
+            self.send_header("Content-Length", "4")
+            self.end_headers()
+            self.wfile.write(b"pong")
+
+        def log_message(self, *args):
+            pass
+
+    class BackendServer(http.server.ThreadingHTTPServer):
+        request_queue_size = 1024
+
+    backend = BackendServer(("127.0.0.1", 0), BackendHandler)
+    threading.Thread(target=backend.serve_forever, daemon=True).start()
+    HttpRequestHandler.proxy("/backend", ["http://127.0.0.1:{}".format(backend.server_address[1])], pool_size=64)
+
+
+@scenario("ws_echo", "WebSocket text messages echoed back to the sender")
+def setup_ws_echo():
+    from httprequesthandler import HttpRequestHandler
+
+    HttpRequestHandler.get("/echo", ws_handler=make_ws_handler(broadcast=False))(lambda: None)
+
+
+@scenario("ws_broadcast", "WebSocket text messages broadcast to every connection")
+def setup_ws_broadcast():
+    from httprequesthandler import HttpRequestHandler
+
+    HttpRequestHandler.get("/broadcast", ws_handler=make_ws_handler(broadcast=True))(lambda: None)
+
+
+@scenario("ws_bus", "WebSocket text messages published through the bus to a group split between two processes",
+          processes=2)
+def setup_ws_bus():
+    from httprequesthandler import HttpRequestHandler
+    from websocketbus import WebSocketBus
+
+    """ The peer gets the bus directory of the first process in its environment.
+    """
+    if WebSocketBus.DIRECTORY_VARIABLE not in os.environ:
+        os.environ[WebSocketBus.DIRECTORY_VARIABLE] = os.path.abspath("bus")
+
+    HttpRequestHandler.get("/bus", ws_handler=make_ws_handler(broadcast=True, bus=True))(lambda: None)
+
+
+def make_ws_handler(broadcast, bus=False):
+    """ Makes a WebSocket handler class that echoes or broadcasts the received messages.
+
+    Args:
+        broadcast (bool): `True` to send the messages to every connection, `False` to send them back to the sender.
+        bus (bool): `True` to broadcast the messages to the connections of every process through the `WebSocketBus`.
+
+    Returns:
+        The WebSocketHandler class.
+    """
+    from select import select
+    from websockethandler import WebSocketHandler
+    from websocketbus import WebSocketBus
+
+    class BenchmarkHandler(WebSocketHandler):
+        connections = set()
+        lock = threading.Lock()
+
+        def setup(self):
+            if bus:
+                self.join("broadcast")
+
+            with self.lock:
+                self.connections.add(self)
+
+            try:
+                while not self.closed:
+                    select([self.client], [], [])
+                    self.read()
+
+            except OSError:
+                pass
+
+            finally:
+                with self.lock:
+                    self.connections.discard(self)
+
+        def received_message(self, message):
+            if not broadcast:
+                self.send(message)
+                return
+
+            if bus:
+                WebSocketBus.publish("broadcast", message)
+                return
+
+            with self.lock:
+                receivers = list(self.connections)
+
+            for receiver in receivers:
+                try:
+                    receiver.send(message)
+
+                except OSError:
+                    pass
+
+    return BenchmarkHandler
+
+
+""" Client side
+"""
+
+
+async def http_get(port, path, latencies, errors):
+    """ Sends a GET request and reads the whole response, the server closes the connection after it.
+
+    Args:
+        port (int): the server port.
+        path (str): the request path.
+        latencies (list of float): the list where the latency is appended.
+        errors (list of str): the list where the error is appended, if any.
+    """
+    start = time.perf_counter()
+    try:
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write("GET {} HTTP/1.1\r\nHost: 127.0.0.1\r\n\r\n".format(path).encode("utf-8"))
+        response = await reader.read()
+        writer.close()
+        status = response[9:12]
+        if not status.startswith(b"2"):
+            errors.append(status.decode("utf-8", "replace"))
+            return
+
+        latencies.append(time.perf_counter() - start)
+
+    except OSError as e:
+        errors.append(type(e).__name__)
+
+
+async def http_load(port, path, connections, duration):
+    """ Keeps `connections` requests in flight for `duration` seconds.
+
+    Returns:
+        The latencies and the errors.
+    """
+    latencies = []
+    errors = []
+    deadline = time.perf_counter() + duration
+
+    async def worker():
+        while time.perf_counter() < deadline:
+            await http_get(port, path, latencies, errors)
+
+    await asyncio.gather(*[worker() for _ in range(connections)])
+    return latencies, errors
+
+
+async def tls_load(port, connections, duration, resume):
+    """ Keeps `connections` TLS connections being opened for `duration` seconds, each one with a GET request. The
+    streams of `asyncio` cannot resume a session, so each connection is a blocking socket in its own thread. When
+    resuming, a connection that needs a full handshake is counted as an error.
+
+    Returns:
+        The latencies and the errors.
+    """
+    latencies = []
+    errors = []
+    deadline = time.perf_counter() + duration
+
+    def worker():
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
+        context.check_hostname = False
+        context.verify_mode = ssl.CERT_NONE
+        session = None
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                with socket.create_connection(("127.0.0.1", port)) as raw, \
+                        context.wrap_socket(raw, session=session) as client:
+                    client.sendall(b"GET /api/ping HTTP/1.1\r\nHost: 127.0.0.1\r\n\r\n")
+                    response = b""
+                    while True:
+                        data = client.recv(65536)
+                        if not data:
+                            break
+
+                        response += data
+
+                    if session is not None and not client.session_reused:
+                        errors.append("not resumed")
+
+                    if resume:
+                        session = client.session
+
+            except OSError as e:
+                errors.append(type(e).__name__)
+                continue
+
+            status = response[9:12]
+            if not status.startswith(b"2"):
+                errors.append(status.decode("utf-8", "replace"))
+                continue
+
+            latencies.append(time.perf_counter() - start)
+
+    loop = asyncio.get_running_loop()
+    with concurrent.futures.ThreadPoolExecutor(connections) as executor:
+        await asyncio.gather(*[loop.run_in_executor(executor, worker) for _ in range(connections)])
+
+    return latencies, errors
+
+
+async def ws_connect(port, path):
+    """ Opens a WebSocket connection.
+
+    Returns:
+        The reader and writer streams.
+    """
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    key = base64.b64encode(os.urandom(16)).decode("utf-8")
+    writer.write("GET {} HTTP/1.1\r\nHost: 127.0.0.1\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                 "Sec-WebSocket-Key: {}\r\nSec-WebSocket-Version: 13\r\n\r\n".format(path, key).encode("utf-8"))
+    head = await reader.readuntil(b"\r\n\r\n")
+    if not head.startswith(b"HTTP/1.1 101"):
+        raise ConnectionError(head.split(b"\r\n")[0].decode("utf-8", "replace"))
+
+    return reader, writer
+
+
+def ws_frame(message):
+    """ Builds a masked text frame, as clients have to mask their frames.
+
+    Args:
+        message (str): the message.
+
+    Returns:
+        The frame `bytes`.
+    """
+    payload = bytearray(message.encode("utf-8"))
+    mask = os.urandom(4)
+    for i in range(len(payload)):
+        payload[i] ^= mask[i % 4]
+
+    if len(payload) < 126:
+        header = struct.pack(">BB", 0b10000001, 0b10000000 | len(payload))
+    else:
+        header = struct.pack(">BBH", 0b10000001, 0b10000000 | 126, len(payload))
+
+    return header + mask + bytes(payload)
+
+
+async def ws_read(reader):
+    """ Reads a frame sent by the server.
+
+    Returns:
+        The payload `bytes`.
+    """
+    first_bytes = await reader.readexactly(2)
+    length = first_bytes[1] & 0b01111111
+    if length == 126:
+        length = struct.unpack(">H", await reader.readexactly(2))[0]
+    elif length == 127:
+        length = struct.unpack(">Q", await reader.readexactly(8))[0]
+
+    return await reader.readexactly(length)
+
+
+async def ws_echo_load(port, connections, duration):
+    """ Every connection sends a message and waits for the echo, for `duration` seconds.
+
+    Returns:
+        The latencies and the errors.
+    """
+    latencies = []
+    errors = []
+    streams = await asyncio.gather(*[ws_connect(port, "/api/echo") for _ in range(connections)])
+    deadline = time.perf_counter() + duration
+    frame = ws_frame(WS_MESSAGE)
+
+    async def worker(reader, writer):
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                writer.write(frame)
+                await ws_read(reader)
+                latencies.append(time.perf_counter() - start)
+
+            except (OSError, asyncio.IncompleteReadError) as e:
+                errors.append(type(e).__name__)
+                return
+
+    await asyncio.gather(*[worker(reader, writer) for reader, writer in streams])
+    for _, writer in streams:
+        writer.close()
+
+    return latencies, errors
+
+
+async def ws_broadcast_load(port, path, connections, duration):
+    """ One connection publishes messages with the time they were sent, and every connection, the publisher included,
+    measures the latency of the delivery. A latency is counted for every delivered message.
+
+    Returns:
+        The latencies and the errors.
+    """
+    latencies = []
+    errors = []
+    streams = await asyncio.gather(*[ws_connect(port, path) for _ in range(connections)])
+    deadline = time.perf_counter() + duration
+    published = []
+
+    async def subscriber(reader):
+        received = 0
+        try:
+            while received < len(published) or time.perf_counter() < deadline:
+                payload = await ws_read(reader)
+                latencies.append(time.perf_counter() - float(payload.decode("utf-8")))
+                received += 1
+
+        except (OSError, asyncio.IncompleteReadError) as e:
+            errors.append(type(e).__name__)
+
+    async def publisher(writer):
+        while time.perf_counter() < deadline:
+            published.append(None)
+            writer.write(ws_frame(repr(time.perf_counter())))
+            await asyncio.sleep(0.001)
+
+    subscribers = [asyncio.ensure_future(subscriber(reader)) for reader, _ in streams]
+    await publisher(streams[0][1])
+    await asyncio.wait(subscribers, timeout=5)
+    for _, writer in streams:
+        writer.close()
+
+    return latencies, errors
+
+
+def run_client(scenario_name, port, connections, duration):
+    """ Runs the load of a scenario.
+
+    Returns:
+        The latencies and the errors.
+    """
+    if scenario_name in STATIC_FILE_SIZES or scenario_name == "static_manifest":
+        load = http_load(port, "/{}.bin".format(scenario_name), connections, duration)
+    elif scenario_name == "api_dynamic":
+        load = http_load(port, "/api/users/1234/posts/5678", connections, duration)
+    elif scenario_name in ["api_exact", "api_hooks"]:
+        load = http_load(port, "/api/ping", connections, duration)
+    elif scenario_name == "api_process":
+        load = http_load(port, "/api/process", connections, duration)
+    elif scenario_name == "proxy":
+        load = http_load(port, "/backend/ping", connections, duration)
+    elif scenario_name in ["tls_full", "tls_resumed"]:
+        load = tls_load(port, connections, duration, resume=scenario_name == "tls_resumed")
+    elif scenario_name == "ws_echo":
+        load = ws_echo_load(port, connections, duration)
+    elif scenario_name == "ws_bus":
+        load = ws_broadcast_load(port, "/api/bus", connections, duration)
+    else:
+        load = ws_broadcast_load(port, "/api/broadcast", connections, duration)
+
+    return asyncio.run(load)
+
+
+""" Orchestration
+"""
+
+
+def free_port():
+    """ Gets a free local port.
+
+    Returns:
+        The port.
+    """
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_for_server(port, process, timeout=10):
+    """ Waits until the server accepts connections.
+
+    Raises:
+        RuntimeError: if the server doesn't start in time.
+    """
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("The server exited with code {}".format(process.returncode))
+
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return
+
+        except OSError:
+            time.sleep(0.05)
+
+    raise RuntimeError("The server didn't start in {} seconds".format(timeout))
+
+
+def read_memory(pid):
+    """ Reads the current and peak resident set size of a process, only available on Linux.
+
+    Returns:
+        A tuple with the RSS and the peak RSS in KiB, `None` if they are not available.
+    """
+    memory = {"VmRSS": None, "VmHWM": None}
+    try:
+        with open("/proc/{}/status".format(pid)) as f:
+            for line in f:
+                key = line.split(":")[0]
+                if key in memory:
+                    memory[key] = int(line.split()[1])
+
+    except OSError:
+        pass
+
+    return memory["VmRSS"], memory["VmHWM"]
+
+
+def percentile(sorted_values, fraction):
+    """ Gets a percentile of a sorted list.
+
+    Returns:
+        The value, or `None` if the list is empty.
+    """
+    if not sorted_values:
+        return None
+
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+def run_scenario(scenario_name, connections, duration):
+    """ Starts the server of a scenario, runs the load against it and measures it.
+
+    Returns:
+        A `dict` with the results.
+    """
+    port = free_port()
+    process = subprocess.Popen([sys.executable, os.path.abspath(__file__), "--serve", scenario_name,
+                                "--port", str(port)])
+    try:
+        wait_for_server(port, process)
+        start = time.perf_counter()
+        latencies, errors = run_client(scenario_name, port, connections, duration)
+        elapsed = time.perf_counter() - start
+        rss, peak_rss = read_memory(process.pid)
+
+    finally:
+        process.terminate()
+        process.wait()
+
+    latencies.sort()
+
+    def to_ms(value):
+        return None if value is None else round(value * 1000, 3)
+
+    return {
+        "scenario": scenario_name,
+        "requests": len(latencies),
+        "errors": len(errors),
+        "rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": to_ms(percentile(latencies, 0.5)),
+        "p99_ms": to_ms(percentile(latencies, 0.99)),
+        "p999_ms": to_ms(percentile(latencies, 0.999)),
+        "rss_kb": rss,
+        "peak_rss_kb": peak_rss
+    }
+
+
+def git_commit():
+    """ Gets the current commit, to identify the results.
+
+    Returns:
+        The commit hash, or `None` if it is not available.
+    """
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=os.path.dirname(os.path.abspath(__file__)),
+                                       stderr=subprocess.DEVNULL).decode("utf-8").strip()
+
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_results(results, previous=None):
+    """ Prints the results as a table, with the change against previous results if given.
+
+    Args:
+        results (list of dict): the results.
+        previous (dict of str: dict): the previous results by scenario name.
+    """
+    columns = ["rps", "p50_ms", "p99_ms", "p999_ms", "rss_kb"]
+    print("{:<16}{:>10}{:>8}".format("scenario", "requests", "errors") + "".join("{:>18}".format(c) for c in columns))
+    for result in results:
+        line = "{:<16}{:>10}{:>8}".format(result["scenario"], result["requests"], result["errors"])
+        for column in columns:
+            value = result[column]
+            cell = "-" if value is None else str(value)
+            old = (previous or {}).get(result["scenario"], {}).get(column)
+            if value is not None and old:
+                cell += " ({:+.1f}%)".format((value - old) / old * 100)
+
+            line += "{:>18}".format(cell)
+
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-testing benchmark of the server.")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS),
+                        help="comma separated scenarios, from: " + "; ".join(
+                            "{} ({})".format(name, SCENARIOS[name]["description"]) for name in SCENARIOS))
+    parser.add_argument("--connections", type=int, default=50, help="concurrent connections")
+    parser.add_argument("--duration", type=float, default=5, help="seconds of load per scenario")
+    parser.add_argument("--output", help="file to write the results as JSON")
+    parser.add_argument("--compare", help="JSON results of a previous run to compare with")
+    parser.add_argument("--serve", help=argparse.SUPPRESS)
+    parser.add_argument("--port", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--peer", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.serve, args.port, args.peer)
+        return
+
+    scenario_names = [name for name in args.scenarios.split(",") if name]
+    for name in scenario_names:
+        if name not in SCENARIOS:
+            parser.error("unknown scenario '{}'".format(name))
+
+    results = [run_scenario(name, args.connections, args.duration) for name in scenario_names]
+    previous = None
+    if args.compare:
+        with open(args.compare) as f:
+            previous = {result["scenario"]: result for result in json.load(f)["results"]}
+
+    print_results(results, previous)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({
+                "commit": git_commit(),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+                "connections": args.connections,
+                "duration": args.duration,
+                "results": results
+            }, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
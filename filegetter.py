@@ -1,14 +1,35 @@
 import mimetypes
+import posixpath
 import re
+import threading
+
+from assetmanifest import AssetManifest
 
 
 class FileGetter:
     """ Retrieves the app files.
+
+    Optionally, the app folder is scanned once into an `AssetManifest`, so the files are looked up without touching the
+    filesystem until they are read, and each file can also be requested by its fingerprinted path, that is served to be
+    cached forever. Only the metadata of the files is kept in memory, they are still read on every request. The
+    manifest is rescanned periodically or on demand, and until then the new files are not found.
     """
     __APP_FOLDER = "app/"
 
     __MAPPINGS = {}
 
+    __MANIFEST = None
+
+    __MANIFEST_CONFIG = {
+        "rescan_interval": None
+    }
+
+    __RESCAN_STOP = None
+
+    __IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+    __ENCODINGS_PREFERENCE = ["br", "gzip"]
+
     @staticmethod
     def get_file(file_path):
         """ Gets a file.
@@ -18,10 +39,11 @@ class FileGetter:
 
         Returns:
             A `byte` containing the file and a `str` containing the mime type.
+
+        Raises:
+            FileNotFoundError: if the path goes out of the app folder.
         """
-        if file_path in FileGetter.__MAPPINGS:
-            file_path = FileGetter.__MAPPINGS[file_path]
-        file_path = FileGetter.__APP_FOLDER + file_path
+        file_path = FileGetter.__APP_FOLDER + FileGetter.__resolve(file_path)
         mime_type = mimetypes.guess_type(file_path, strict=True)[0]
         data = None
         with open(file_path, "rb") as f:
@@ -29,6 +51,169 @@ class FileGetter:
 
         return data, mime_type
 
+    @staticmethod
+    def get_asset(file_path, accept_encoding=""):
+        """ Gets a file with the headers to serve it. If the asset manifest is enabled, the file is looked up in it and
+        the headers include its "ETag", a "Cache-Control" that makes it cached forever if it is requested by its
+        fingerprinted path, and the "Content-Encoding" of the precompressed variant served if the client accepts one.
+        The manifest only holds the metadata, the file or its variant is read from the disk every time.
+
+        Args:
+            file_path (str): the name of the file, or its fingerprinted name.
+            accept_encoding (str): the "Accept-Encoding" header of the request.
+
+        Returns:
+            A `bytes` containing the file and a `dict` of str: str containing the headers.
+
+        Raises:
+            IOError: if the file cannot be read, is not in the manifest or the path goes out of the app folder.
+        """
+        manifest = FileGetter.__MANIFEST
+        if manifest is None:
+            data, mime_type = FileGetter.get_file(file_path)
+            return data, {} if mime_type is None else {"Content-Type": mime_type}
+
+        found = manifest.get(FileGetter.__resolve(file_path))
+        if found is None:
+            raise FileNotFoundError(file_path)
+
+        asset, fingerprinted = found
+        headers = {
+            "ETag": '"' + asset.hash + '"',
+            "Cache-Control": FileGetter.__IMMUTABLE_CACHE_CONTROL if fingerprinted else "no-cache"
+        }
+        if asset.mime_type is not None:
+            headers["Content-Type"] = asset.mime_type
+
+        path = asset.path
+        if asset.variants:
+            headers["Vary"] = "Accept-Encoding"
+            encoding = FileGetter.__choose_encoding(asset.variants, accept_encoding)
+            if encoding is not None:
+                path = asset.variants[encoding]
+                headers["Content-Encoding"] = encoding
+                headers["ETag"] = '"' + asset.hash + "-" + encoding + '"'
+
+        with open(manifest.folder + path, "rb") as f:
+            return f.read(), headers
+
+    @staticmethod
+    def get_asset_url(file_path):
+        """ Gets the fingerprinted URL of a file, to be used in the pages so the file is cached forever by the clients
+        and a new URL is used when it changes.
+
+        Args:
+            file_path (str): the name of the file.
+
+        Returns:
+            The absolute URL of the file, fingerprinted if the asset manifest is enabled and the file is in it.
+        """
+        manifest = FileGetter.__MANIFEST
+        found = None
+        if manifest is not None:
+            try:
+                found = manifest.get(FileGetter.__resolve(file_path))
+
+            except FileNotFoundError:
+                pass
+
+        if found is None:
+            return "/" + file_path
+
+        return "/" + found[0].fingerprinted_path
+
+    @staticmethod
+    def rescan():
+        """ Rescans the asset manifest, if it is enabled, hashing only the new and modified files.
+
+        Returns:
+            The amount of files that have been added, modified or removed.
+        """
+        manifest = FileGetter.__MANIFEST
+        return 0 if manifest is None else manifest.rescan()
+
+    @staticmethod
+    def __resolve(file_path):
+        """ Maps and normalizes a file path, without the empty, "." and duplicated separators.
+
+        Args:
+            file_path (str): the name of the file.
+
+        Returns:
+            The normalized path, relative to the app folder.
+
+        Raises:
+            FileNotFoundError: if the path has ".." segments, that could go out of the app folder.
+        """
+        if file_path in FileGetter.__MAPPINGS:
+            file_path = FileGetter.__MAPPINGS[file_path]
+
+        if ".." in file_path.split("/") or "\\" in file_path or "\0" in file_path:
+            raise FileNotFoundError(file_path)
+
+        file_path = posixpath.normpath("/" + file_path).lstrip("/")
+        return file_path
+
+    @staticmethod
+    def __choose_encoding(variants, accept_encoding):
+        """ Chooses the preferred encoding among the precompressed variants of a file and the accepted ones.
+
+        Args:
+            variants (dict of str: str): the paths of the variants by their encoding.
+            accept_encoding (str): the "Accept-Encoding" header of the request.
+
+        Returns:
+            The encoding, or `None` if no variant is accepted.
+        """
+        accepted = set()
+        for item in accept_encoding.split(","):
+            coding, _, parameters = item.partition(";")
+            quality = parameters.strip()
+            if quality.startswith("q="):
+                try:
+                    if float(quality[2:]) <= 0:
+                        continue
+
+                except ValueError:
+                    continue
+
+            accepted.add(coding.strip().lower())
+
+        for encoding in FileGetter.__ENCODINGS_PREFERENCE:
+            if encoding in variants and (encoding in accepted or "*" in accepted):
+                return encoding
+
+        return None
+
+    @staticmethod
+    def __rescan_periodically(manifest, interval, stop):
+        """ Rescans a manifest periodically until it is replaced.
+
+        Args:
+            manifest (AssetManifest): the manifest.
+            interval (float): the seconds between rescans.
+            stop (threading.Event): the event set when the manifest is replaced.
+        """
+        while not stop.wait(interval):
+            manifest.rescan()
+
+    @staticmethod
+    def __build_manifest():
+        """ Scans the app folder into a new manifest, replacing the current one and its periodic rescans.
+        """
+        if FileGetter.__RESCAN_STOP is not None:
+            FileGetter.__RESCAN_STOP.set()
+            FileGetter.__RESCAN_STOP = None
+
+        manifest = AssetManifest(FileGetter.__APP_FOLDER)
+        interval = FileGetter.__MANIFEST_CONFIG["rescan_interval"]
+        if interval is not None:
+            FileGetter.__RESCAN_STOP = threading.Event()
+            threading.Thread(target=FileGetter.__rescan_periodically,
+                             args=(manifest, interval, FileGetter.__RESCAN_STOP), daemon=True).start()
+
+        FileGetter.__MANIFEST = manifest
+
     @staticmethod
     def set_app_folder(app_folder):
         """ Sets the app folder.
@@ -41,6 +226,8 @@ class FileGetter:
         """
         if app_folder is not None and re.match(r"^[^/]+/$", app_folder):
             FileGetter.__APP_FOLDER = app_folder
+            if FileGetter.__MANIFEST is not None:
+                FileGetter.__build_manifest()
 
         else:
             raise AppFolderWrongSyntaxException(app_folder)
@@ -66,6 +253,38 @@ class FileGetter:
         else:
             raise FileMappingsWrongTypeException(mappings)
 
+    @staticmethod
+    def set_asset_manifest(config):
+        """ Enables the asset manifest, scanning the app folder, or disables it.
+
+        Args:
+            config (dict of str: obj): a `dict` with the optional key:
+                "rescan_interval": the seconds between the rescans of the app folder, or `None` to rescan it only when
+                    `rescan` is called, the default.
+            Or `None` to disable the manifest.
+
+        Raises:
+            AssetManifestConfigWrongTypeException: if the config object has an incorrect structure.
+        """
+        if config is None:
+            if FileGetter.__RESCAN_STOP is not None:
+                FileGetter.__RESCAN_STOP.set()
+                FileGetter.__RESCAN_STOP = None
+
+            FileGetter.__MANIFEST = None
+            return
+
+        if not isinstance(config, dict):
+            raise AssetManifestConfigWrongTypeException(config)
+
+        for key, value in config.items():
+            if key not in FileGetter.__MANIFEST_CONFIG or value is not None and \
+                    (isinstance(value, bool) or not isinstance(value, (int, float)) or value <= 0):
+                raise AssetManifestConfigWrongTypeException(config)
+
+        FileGetter.__MANIFEST_CONFIG.update(config)
+        FileGetter.__build_manifest()
+
 
 class AppFolderWrongSyntaxException(Exception):
     """ Exception to be raised if the app folder has wrong syntax.
@@ -81,3 +300,12 @@ class FileMappingsWrongTypeException(Exception):
     def __init__(self, mappings):
         message = "File mappings should be a `dict` of `str`: `str`, '{}' given".format(mappings)
         super().__init__(message)
+
+
+class AssetManifestConfigWrongTypeException(Exception):
+    """ Exception to be raised if the asset manifest config object has an incorrect structure.
+    """
+    def __init__(self, config):
+        message = "Asset manifest config should be a `dict` of 'rescan_interval' or `None`, " \
+                  "'{}' was given".format(config)
+        super().__init__(message)
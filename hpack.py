@@ -0,0 +1,460 @@
+def _canonical_codes(lengths):
+    """ Builds the codes of a canonical Huffman code, where the codes of the same length are consecutive and ordered by
+    symbol, and every code is bigger than the codes shorter than it.
+
+    Args:
+        lengths (list of int): the length in bits of the code of each symbol.
+
+    Returns:
+        A `list` with the code of each symbol.
+    """
+    codes = [0] * len(lengths)
+    code = 0
+    previous_length = 0
+    for length, symbol in sorted((length, symbol) for symbol, length in enumerate(lengths)):
+        code <<= length - previous_length
+        previous_length = length
+        codes[symbol] = code
+        code += 1
+
+    return codes
+
+
+class HpackDecoder:
+    """ Decodes HTTP/2 header blocks compressed with HPACK, see https://tools.ietf.org/html/rfc7541. It keeps the
+    dynamic table of the connection, so every header block of a connection has to be decoded, in order, by the same
+    decoder.
+    """
+    def __init__(self, max_table_size=4096):
+        """ Creates the decoder.
+
+        Args:
+            max_table_size (int): the maximum size of the dynamic table, announced to the peer in the SETTINGS frame.
+        """
+        self.__table = HpackTable(max_table_size)
+        self.__max_table_size = max_table_size
+
+    def decode(self, data):
+        """ Decodes a header block.
+
+        Args:
+            data (bytes): the header block.
+
+        Returns:
+            A `list` of tuple(str, str) with the header names and values, in order.
+
+        Raises:
+            HpackDecodingErrorException: if the header block is not well formed.
+        """
+        headers = []
+        position = 0
+        try:
+            while position < len(data):
+                byte = data[position]
+                if byte & 0b10000000:
+                    """ Indexed header field.
+                    """
+                    index, position = Hpack.decode_integer(data, position, 7)
+                    headers.append(self.__table.get(index))
+
+                elif byte & 0b11000000 == 0b01000000:
+                    """ Literal header field with incremental indexing.
+                    """
+                    name, value, position = self.__decode_literal(data, position, 6)
+                    self.__table.add(name, value)
+                    headers.append((name, value))
+
+                elif byte & 0b11100000 == 0b00100000:
+                    """ Dynamic table size update.
+                    """
+                    size, position = Hpack.decode_integer(data, position, 5)
+                    if size > self.__max_table_size:
+                        raise HpackDecodingErrorException("table size update over the maximum")
+
+                    self.__table.resize(size)
+
+                else:
+                    """ Literal header field without indexing or never indexed.
+                    """
+                    name, value, position = self.__decode_literal(data, position, 4)
+                    headers.append((name, value))
+
+        except (IndexError, KeyError, UnicodeDecodeError):
+            raise HpackDecodingErrorException("malformed header block")
+
+        return headers
+
+    def __decode_literal(self, data, position, prefix):
+        """ Decodes a literal header field, whose name is either indexed or literal.
+
+        Args:
+            data (bytes): the header block.
+            position (int): the position of the representation.
+            prefix (int): the bits of the prefix of the name index.
+
+        Returns:
+            A tuple with the name, the value and the position after the representation.
+        """
+        index, position = Hpack.decode_integer(data, position, prefix)
+        if index == 0:
+            name, position = Hpack.decode_string(data, position)
+
+        else:
+            name = self.__table.get(index)[0]
+
+        value, position = Hpack.decode_string(data, position)
+        return name, value, position
+
+
+class HpackEncoder:
+    """ Encodes header lists with HPACK. The headers whose value is repeated between responses, like "content-type",
+    are added to the dynamic table so they are sent as one byte afterwards, while the ones that change every time, like
+    "content-length", are sent as literals without indexing so they don't evict useful entries.
+    """
+    __NOT_INDEXED = {"content-length", "date", "etag", "last-modified", "expires", "set-cookie", "authorization",
+                     "retry-after", "location", "age"}
+
+    def __init__(self, max_table_size=4096):
+        """ Creates the encoder.
+
+        Args:
+            max_table_size (int): the maximum size of the dynamic table.
+        """
+        self.__table = HpackTable(max_table_size)
+        self.__pending_resize = None
+
+    def resize(self, max_table_size):
+        """ Changes the maximum size of the dynamic table, when the peer announces a new one. The change is signaled at
+        the beginning of the next header block.
+
+        Args:
+            max_table_size (int): the maximum size announced by the peer, it is capped at 4096 bytes.
+        """
+        self.__pending_resize = min(max_table_size, 4096)
+
+    def encode(self, headers):
+        """ Encodes a header list.
+
+        Args:
+            headers (list of tuple(str, str)): the header names, in lowercase, and values.
+
+        Returns:
+            The header block `bytes`.
+        """
+        block = bytearray()
+        if self.__pending_resize is not None:
+            self.__table.resize(self.__pending_resize)
+            block += Hpack.encode_integer(self.__pending_resize, 5, 0b00100000)
+            self.__pending_resize = None
+
+        for name, value in headers:
+            index, name_index = self.__table.find(name, value)
+            if index is not None:
+                block += Hpack.encode_integer(index, 7, 0b10000000)
+                continue
+
+            if name in HpackEncoder.__NOT_INDEXED:
+                block += Hpack.encode_integer(name_index or 0, 4, 0)
+
+            else:
+                block += Hpack.encode_integer(name_index or 0, 6, 0b01000000)
+                self.__table.add(name, value)
+
+            if not name_index:
+                block += Hpack.encode_string(name)
+
+            block += Hpack.encode_string(value)
+
+        return bytes(block)
+
+
+class HpackTable:
+    """ The static and dynamic tables of HPACK, addressed with one index space where the static entries go first.
+    """
+    STATIC_TABLE = [
+        (":authority", ""), (":method", "GET"), (":method", "POST"), (":path", "/"), (":path", "/index.html"),
+        (":scheme", "http"), (":scheme", "https"), (":status", "200"), (":status", "204"), (":status", "206"),
+        (":status", "304"), (":status", "400"), (":status", "404"), (":status", "500"), ("accept-charset", ""),
+        ("accept-encoding", "gzip, deflate"), ("accept-language", ""), ("accept-ranges", ""), ("accept", ""),
+        ("access-control-allow-origin", ""), ("age", ""), ("allow", ""), ("authorization", ""),
+        ("cache-control", ""), ("content-disposition", ""), ("content-encoding", ""), ("content-language", ""),
+        ("content-length", ""), ("content-location", ""), ("content-range", ""), ("content-type", ""),
+        ("cookie", ""), ("date", ""), ("etag", ""), ("expect", ""), ("expires", ""), ("from", ""), ("host", ""),
+        ("if-match", ""), ("if-modified-since", ""), ("if-none-match", ""), ("if-range", ""),
+        ("if-unmodified-since", ""), ("last-modified", ""), ("link", ""), ("location", ""), ("max-forwards", ""),
+        ("proxy-authenticate", ""), ("proxy-authorization", ""), ("range", ""), ("referer", ""), ("refresh", ""),
+        ("retry-after", ""), ("server", ""), ("set-cookie", ""), ("strict-transport-security", ""),
+        ("transfer-encoding", ""), ("user-agent", ""), ("vary", ""), ("via", ""), ("www-authenticate", "")
+    ]
+
+    """ The indexes of the first static entry of each name and value, and of each name.
+    """
+    __STATIC_INDEX = {entry: i + 1 for i, entry in reversed(list(enumerate(STATIC_TABLE)))}
+
+    __STATIC_NAME_INDEX = {entry[0]: i + 1 for i, entry in reversed(list(enumerate(STATIC_TABLE)))}
+
+    def __init__(self, max_size):
+        self.__entries = []
+        self.__size = 0
+        self.__max_size = max_size
+
+    def get(self, index):
+        """ Gets an entry.
+
+        Args:
+            index (int): the index, starting at 1.
+
+        Returns:
+            A tuple with the name and the value.
+
+        Raises:
+            KeyError: if the index is out of the tables.
+        """
+        if 0 < index <= len(HpackTable.STATIC_TABLE):
+            return HpackTable.STATIC_TABLE[index - 1]
+
+        dynamic_index = index - len(HpackTable.STATIC_TABLE) - 1
+        if 0 <= dynamic_index < len(self.__entries):
+            return self.__entries[dynamic_index]
+
+        raise KeyError(index)
+
+    def find(self, name, value):
+        """ Finds an entry.
+
+        Args:
+            name (str): the name.
+            value (str): the value.
+
+        Returns:
+            A tuple with the index of the entry with the same name and value, and the index of an entry with the same
+            name, `None` if they are not found.
+        """
+        index = HpackTable.__STATIC_INDEX.get((name, value))
+        if index is not None:
+            return index, index
+
+        name_index = HpackTable.__STATIC_NAME_INDEX.get(name)
+        for i, entry in enumerate(self.__entries):
+            if entry[0] == name:
+                if entry[1] == value:
+                    return len(HpackTable.STATIC_TABLE) + i + 1, None
+
+                if name_index is None:
+                    name_index = len(HpackTable.STATIC_TABLE) + i + 1
+
+        return None, name_index
+
+    def add(self, name, value):
+        """ Adds an entry to the dynamic table, evicting the oldest entries if it doesn't fit.
+
+        Args:
+            name (str): the name.
+            value (str): the value.
+        """
+        size = HpackTable.__entry_size(name, value)
+        if size > self.__max_size:
+            self.__entries = []
+            self.__size = 0
+            return
+
+        self.__entries.insert(0, (name, value))
+        self.__size += size
+        self.__evict()
+
+    def resize(self, max_size):
+        """ Changes the maximum size of the dynamic table.
+
+        Args:
+            max_size (int): the new maximum size.
+        """
+        self.__max_size = max_size
+        self.__evict()
+
+    def __evict(self):
+        """ Evicts the oldest entries until the dynamic table fits its maximum size.
+        """
+        while self.__size > self.__max_size:
+            name, value = self.__entries.pop()
+            self.__size -= HpackTable.__entry_size(name, value)
+
+    @staticmethod
+    def __entry_size(name, value):
+        """ Gets the size of an entry, as defined by HPACK.
+        """
+        return len(name.encode("utf-8")) + len(value.encode("utf-8")) + 32
+
+
+class Hpack:
+    """ The primitive representations of HPACK: integers with a prefix, and strings that may be Huffman encoded.
+    """
+    """ The lengths in bits of the codes of the Huffman code of HPACK, one for each byte plus the end of string
+    symbol. The code is canonical, so the codes themselves are built from the lengths.
+    """
+    __HUFFMAN_LENGTHS = (
+        [13, 23] + [28] * 7 + [24, 30, 28, 28, 30] + [28] * 8 + [30] + [28] * 9 +
+        [6, 10, 10, 12, 13, 6, 8, 11, 10, 10, 8, 11, 8, 6, 6, 6, 5, 5, 5] + [6] * 7 +
+        [7, 8, 15, 6, 12, 10, 13, 6] + [7] * 22 + [8, 7, 8, 13, 19, 13, 14, 6, 15] +
+        [5, 6, 5, 6, 5, 6, 6, 6, 5, 7, 7, 6, 6, 6, 5, 6, 7, 6, 5, 5, 6, 7, 7, 7, 7, 7, 15, 11, 14, 13, 28] +
+        [20, 22, 20, 20, 22, 22, 22, 23, 22, 23, 23, 23, 23, 23, 24, 23, 24, 24, 22, 23, 24, 23, 23, 23, 23, 21, 22,
+         23, 22, 23, 23, 24, 22, 21, 20, 22, 22, 23, 23, 21, 23, 22, 22, 24, 21, 22, 23, 23, 21, 21, 22, 21, 23, 22,
+         23, 23, 20, 22, 22, 22, 23, 22, 22, 23, 26, 26, 20, 19, 22, 23, 22, 25, 26, 26, 26, 27, 27, 26, 24, 25, 19,
+         21, 26, 27, 27, 26, 27, 24, 21, 21, 26, 26, 28, 27, 27, 27, 20, 24, 20, 21, 22, 21, 21, 23, 22, 22, 25, 25,
+         24, 24, 26, 23, 26, 27, 26, 26, 27, 27, 27, 27, 27, 28, 27, 27, 27, 27, 27, 26, 30]
+    )
+
+    __HUFFMAN_CODES = _canonical_codes(__HUFFMAN_LENGTHS)
+
+    __HUFFMAN_DECODING = {(length, code): symbol for symbol, (length, code) in
+                          enumerate(zip(__HUFFMAN_LENGTHS, __HUFFMAN_CODES))}
+
+    __EOS = 256
+
+    @staticmethod
+    def decode_integer(data, position, prefix):
+        """ Decodes an integer.
+
+        Args:
+            data (bytes): the data.
+            position (int): the position of the byte with the prefix.
+            prefix (int): the bits of the prefix.
+
+        Returns:
+            A tuple with the integer and the position after it.
+        """
+        mask = (1 << prefix) - 1
+        value = data[position] & mask
+        position += 1
+        if value < mask:
+            return value, position
+
+        shift = 0
+        while True:
+            byte = data[position]
+            position += 1
+            value += (byte & 0b01111111) << shift
+            shift += 7
+            if not byte & 0b10000000:
+                return value, position
+
+            if shift > 28:
+                raise HpackDecodingErrorException("integer too big")
+
+    @staticmethod
+    def encode_integer(value, prefix, flags):
+        """ Encodes an integer.
+
+        Args:
+            value (int): the integer.
+            prefix (int): the bits of the prefix.
+            flags (int): the bits of the first byte that are not part of the prefix.
+
+        Returns:
+            The encoded `bytes`.
+        """
+        mask = (1 << prefix) - 1
+        if value < mask:
+            return bytes([flags | value])
+
+        encoded = bytearray([flags | mask])
+        value -= mask
+        while value >= 0b10000000:
+            encoded.append((value & 0b01111111) | 0b10000000)
+            value >>= 7
+
+        encoded.append(value)
+        return bytes(encoded)
+
+    @staticmethod
+    def decode_string(data, position):
+        """ Decodes a string.
+
+        Args:
+            data (bytes): the data.
+            position (int): the position of the string.
+
+        Returns:
+            A tuple with the string and the position after it.
+        """
+        huffman = data[position] & 0b10000000
+        length, position = Hpack.decode_integer(data, position, 7)
+        if position + length > len(data):
+            raise HpackDecodingErrorException("string longer than the header block")
+
+        raw = data[position:position + length]
+        if huffman:
+            raw = Hpack.__huffman_decode(raw)
+
+        return raw.decode("utf-8"), position + length
+
+    @staticmethod
+    def encode_string(value):
+        """ Encodes a string, with the Huffman code if it makes it shorter.
+
+        Args:
+            value (str): the string.
+
+        Returns:
+            The encoded `bytes`.
+        """
+        raw = value.encode("utf-8")
+        huffman = Hpack.__huffman_encode(raw)
+        if len(huffman) < len(raw):
+            return Hpack.encode_integer(len(huffman), 7, 0b10000000) + huffman
+
+        return Hpack.encode_integer(len(raw), 7, 0) + raw
+
+    @staticmethod
+    def __huffman_encode(raw):
+        """ Encodes bytes with the Huffman code, padding the last byte with the most significant bits of the end of
+        string symbol.
+        """
+        accumulator = 0
+        bits = 0
+        for byte in raw:
+            accumulator = (accumulator << Hpack.__HUFFMAN_LENGTHS[byte]) | Hpack.__HUFFMAN_CODES[byte]
+            bits += Hpack.__HUFFMAN_LENGTHS[byte]
+
+        padding = -bits % 8
+        accumulator = (accumulator << padding) | ((1 << padding) - 1)
+        return accumulator.to_bytes((bits + padding) // 8, "big")
+
+    @staticmethod
+    def __huffman_decode(raw):
+        """ Decodes bytes encoded with the Huffman code. The shortest code has 5 bits and the longest 30.
+
+        Raises:
+            HpackDecodingErrorException: if the data is not well encoded.
+        """
+        decoded = bytearray()
+        code = 0
+        length = 0
+        for byte in raw:
+            for shift in range(7, -1, -1):
+                code = (code << 1) | ((byte >> shift) & 1)
+                length += 1
+                if length >= 5:
+                    symbol = Hpack.__HUFFMAN_DECODING.get((length, code))
+                    if symbol is not None:
+                        if symbol == Hpack.__EOS:
+                            raise HpackDecodingErrorException("end of string symbol in a string")
+
+                        decoded.append(symbol)
+                        code = 0
+                        length = 0
+
+                    elif length > 30:
+                        raise HpackDecodingErrorException("invalid Huffman code")
+
+        """ The padding has to be shorter than a byte and made only of ones.
+        """
+        if length > 7 or code != (1 << length) - 1:
+            raise HpackDecodingErrorException("invalid Huffman padding")
+
+        return bytes(decoded)
+
+
+class HpackDecodingErrorException(Exception):
+    """ An exception to raise if a header block cannot be decoded.
+    """
+    pass
@@ -0,0 +1,803 @@
+import base64
+import select
+import ssl
+import struct
+import threading
+import time
+
+from hpack import HpackDecoder, HpackEncoder, HpackDecodingErrorException
+from httprequest import HttpRequest, HttpRequestTimeoutException
+from httpresponse import HttpResponse
+
+
+class Http2Connection:
+    """ Serves an HTTP/2 connection, see https://tools.ietf.org/html/rfc7540, either cleartext (h2c) or over TLS when
+    the client has chosen "h2" with ALPN, see `TlsContext`. Every stream is handled by its own request handler in its
+    own thread, so one connection carries many concurrent requests. The streams are given to the handler as
+    `Http2Stream` objects, that hold the already parsed `HttpRequest` and send the `HttpResponse` as HEADERS and DATA
+    frames, so the endpoints and hooks work the same as with HTTP/1.1.
+
+    The connection can start with the client preface (prior knowledge) or with an HTTP/1.1 request with the
+    "Upgrade: h2c" header, that becomes the stream 1.
+
+    The request bodies are buffered until their stream ends, so the flow control window of each stream is given back
+    only while its body is under the maximum size, and a bigger body is answered with a 413 HTTP error code. The
+    timeouts of `HttpRequest` apply to the connection: the idle timeout while no request is being received, the body
+    timeout while a request body is, and the header timeout to finish the preface and the header blocks. When one
+    expires the connection is closed with GOAWAY once the requests in progress are answered.
+    """
+    PREFACE = b"PRI * HTTP/2.0\r\n\r\nSM\r\n\r\n"
+
+    DATA = 0x0
+    HEADERS = 0x1
+    PRIORITY = 0x2
+    RST_STREAM = 0x3
+    SETTINGS = 0x4
+    PUSH_PROMISE = 0x5
+    PING = 0x6
+    GOAWAY = 0x7
+    WINDOW_UPDATE = 0x8
+    CONTINUATION = 0x9
+
+    END_STREAM = 0x1
+    ACK = 0x1
+    END_HEADERS = 0x4
+    PADDED = 0x8
+    PRIORITY_FLAG = 0x20
+
+    SETTINGS_HEADER_TABLE_SIZE = 0x1
+    SETTINGS_MAX_CONCURRENT_STREAMS = 0x3
+    SETTINGS_INITIAL_WINDOW_SIZE = 0x4
+    SETTINGS_MAX_FRAME_SIZE = 0x5
+
+    NO_ERROR = 0x0
+    PROTOCOL_ERROR = 0x1
+    FLOW_CONTROL_ERROR = 0x3
+    STREAM_CLOSED = 0x5
+    FRAME_SIZE_ERROR = 0x6
+    REFUSED_STREAM = 0x7
+    COMPRESSION_ERROR = 0x9
+
+    __MAX_CONCURRENT_STREAMS = 256
+
+    __DEFAULT_WINDOW_SIZE = 65535
+
+    __MAX_FRAME_SIZE = 16384
+
+    __MAX_WINDOW_SIZE = 2 ** 31 - 1
+
+    __MAX_BODY_SIZE = 8 * 1024 * 1024
+
+    def __init__(self, client, address, handler, data=b"", upgrade_request=None):
+        """ Creates the connection.
+
+        Args:
+            client (socket.socket): the client socket.
+            address (tuple(str, int)): the client address and port.
+            handler (class): the class that handles each stream, called with the stream and the address.
+            data (bytes): the data already read from the client, that follows the request line "PRI * HTTP/2.0" if
+                the connection started with the preface.
+            upgrade_request (HttpRequest): the HTTP/1.1 request that asked for the upgrade, if any.
+        """
+        self.__client = client
+        self.__address = address
+        self.__handler = handler
+        self.__buffer = data
+        self.__upgrade_request = upgrade_request
+        self.__decoder = HpackDecoder()
+        self.__encoder = HpackEncoder()
+        self.__streams = {}
+        self.__last_stream_id = 0
+        self.__closed = False
+        self.__goaway_received = False
+        """ The lock protects the state shared with the stream threads: the streams and the flow control windows. The
+        write lock serializes the frames, so they are never interleaved and the header blocks are sent in the same
+        order they are encoded.
+        """
+        self.__lock = threading.Condition()
+        self.__write_lock = threading.Lock()
+        self.__send_window = Http2Connection.__DEFAULT_WINDOW_SIZE
+        self.__receive_window = Http2Connection.__DEFAULT_WINDOW_SIZE
+        self.__peer_initial_window = Http2Connection.__DEFAULT_WINDOW_SIZE
+        self.__peer_max_frame_size = Http2Connection.__MAX_FRAME_SIZE
+
+    def serve(self):
+        """ Reads and processes the frames until the client closes the connection or sends GOAWAY, and then waits for
+        the streams in progress.
+        """
+        try:
+            if self.__upgrade_request is not None:
+                self.__apply_settings(base64.urlsafe_b64decode(
+                    self.__upgrade_request.headers.get("HTTP2-Settings", "") + "=="))
+                self.__send_settings()
+                self.__read_exactly(len(Http2Connection.PREFACE), Http2Connection.PREFACE,
+                                    self.__get_deadline("header"))
+                self.__start_upgraded_stream()
+
+            else:
+                self.__send_settings()
+                self.__read_exactly(len(Http2Connection.PREFACE) - 18, Http2Connection.PREFACE[18:],
+                                    self.__get_deadline("header"))
+
+            while not self.__goaway_received:
+                frame_type, flags, stream_id, payload = self.__read_frame()
+                self.__process_frame(frame_type, flags, stream_id, payload)
+
+        except HttpRequestTimeoutException:
+            """ The streams in progress are still answered, the client just cannot start new ones.
+            """
+            self.__send_goaway(Http2Connection.NO_ERROR)
+
+        except Http2ConnectionErrorException as e:
+            self.__send_goaway(e.error_code)
+            self.__close()
+
+        except (OSError, ConnectionError):
+            self.__close()
+
+        finally:
+            """ After a GOAWAY the streams in progress are finished, otherwise they are aborted.
+            """
+            with self.__lock:
+                threads = [stream.thread for stream in self.__streams.values() if stream.thread is not None]
+
+            for thread in threads:
+                thread.join()
+
+            self.__close()
+
+    def __close(self):
+        """ Closes the connection, aborting the streams that are sending data.
+        """
+        with self.__lock:
+            already_closed = self.__closed
+            self.__closed = True
+            self.__lock.notify_all()
+
+        if not already_closed:
+            try:
+                self.__client.close()
+
+            except OSError:
+                pass
+
+    def __process_frame(self, frame_type, flags, stream_id, payload):
+        """ Processes a frame.
+
+        Args:
+            frame_type (int): the type.
+            flags (int): the flags.
+            stream_id (int): the stream identifier.
+            payload (bytes): the payload.
+
+        Raises:
+            Http2ConnectionErrorException: if the frame breaks the protocol.
+        """
+        if frame_type == Http2Connection.SETTINGS:
+            if stream_id != 0:
+                raise Http2ConnectionErrorException(Http2Connection.PROTOCOL_ERROR)
+
+            if not flags & Http2Connection.ACK:
+                self.__apply_settings(payload)
+                self.__send_frame(Http2Connection.SETTINGS, Http2Connection.ACK, 0)
+
+        elif frame_type == Http2Connection.PING:
+            if len(payload) != 8:
+                raise Http2ConnectionErrorException(Http2Connection.FRAME_SIZE_ERROR)
+
+            if not flags & Http2Connection.ACK:
+                self.__send_frame(Http2Connection.PING, Http2Connection.ACK, 0, payload)
+
+        elif frame_type == Http2Connection.WINDOW_UPDATE:
+            self.__process_window_update(stream_id, payload)
+
+        elif frame_type == Http2Connection.HEADERS:
+            self.__process_headers(flags, stream_id, payload)
+
+        elif frame_type == Http2Connection.DATA:
+            self.__process_data(flags, stream_id, payload)
+
+        elif frame_type == Http2Connection.RST_STREAM:
+            with self.__lock:
+                stream = self.__streams.get(stream_id)
+                if stream is not None:
+                    stream.reset = True
+                    self.__lock.notify_all()
+
+        elif frame_type == Http2Connection.GOAWAY:
+            self.__goaway_received = True
+
+        elif frame_type in [Http2Connection.PUSH_PROMISE, Http2Connection.CONTINUATION]:
+            """ Clients cannot push, and the CONTINUATION frames are read along with their HEADERS frame.
+            """
+            raise Http2ConnectionErrorException(Http2Connection.PROTOCOL_ERROR)
+
+        """ PRIORITY frames and unknown frame types are ignored.
+        """
+
+    def __process_headers(self, flags, stream_id, payload):
+        """ Processes a HEADERS frame and its CONTINUATION frames. A HEADERS frame either opens a stream or carries the
+        trailers of an open one.
+        """
+        if stream_id == 0:
+            raise Http2ConnectionErrorException(Http2Connection.PROTOCOL_ERROR)
+
+        payload = self.__remove_padding(flags, payload)
+        if flags & Http2Connection.PRIORITY_FLAG:
+            payload = payload[5:]
+
+        block = payload
+        while not flags & Http2Connection.END_HEADERS:
+            frame_type, continuation_flags, continuation_id, payload = self.__read_frame("header")
+            if frame_type != Http2Connection.CONTINUATION or continuation_id != stream_id:
+                raise Http2ConnectionErrorException(Http2Connection.PROTOCOL_ERROR)
+
+            block += payload
+            flags = (flags & Http2Connection.END_STREAM) | continuation_flags
+
+        try:
+            """ Every header block has to be decoded, even the ones of refused streams, to keep the dynamic table in
+            sync with the client.
+            """
+            headers = self.__decoder.decode(block)
+
+        except HpackDecodingErrorException:
+            raise Http2ConnectionErrorException(Http2Connection.COMPRESSION_ERROR)
+
+        with self.__lock:
+            stream = self.__streams.get(stream_id)
+            if stream is None:
+                if stream_id % 2 == 0 or stream_id <= self.__last_stream_id:
+                    raise Http2ConnectionErrorException(Http2Connection.PROTOCOL_ERROR)
+
+                self.__last_stream_id = stream_id
+                if len(self.__streams) >= Http2Connection.__MAX_CONCURRENT_STREAMS:
+                    refused = True
+
+                else:
+                    refused = False
+                    stream = Http2Stream(self, stream_id, self.__peer_initial_window,
+                                         Http2Connection.__DEFAULT_WINDOW_SIZE)
+                    stream.headers = headers
+                    self.__streams[stream_id] = stream
+
+            else:
+                refused = False
+                if stream.end_stream_received:
+                    raise Http2ConnectionErrorException(Http2Connection.STREAM_CLOSED)
+
+        if refused:
+            self.__send_frame(Http2Connection.RST_STREAM, 0, stream_id,
+                              struct.pack(">I", Http2Connection.REFUSED_STREAM))
+
+        elif flags & Http2Connection.END_STREAM:
+            self.__start_stream(stream)
+
+    def __process_data(self, flags, stream_id, payload):
+        """ Processes a DATA frame. The window of the connection is given back right away, as the data is either
+        buffered within the maximum body size of its stream or discarded. The window of the stream is given back only
+        while the body is under the maximum size, so the client cannot send much more than it before it is answered.
+        """
+        if stream_id == 0:
+            raise Http2ConnectionErrorException(Http2Connection.PROTOCOL_ERROR)
+
+        """ The windows are only changed by the thread that reads the frames, the one of the connection included.
+        """
+        self.__receive_window -= len(payload)
+        if self.__receive_window < 0:
+            raise Http2ConnectionErrorException(Http2Connection.FLOW_CONTROL_ERROR)
+
+        if len(payload) > 0:
+            self.__receive_window += len(payload)
+            self.__send_frame(Http2Connection.WINDOW_UPDATE, 0, 0, struct.pack(">I", len(payload)))
+
+        with self.__lock:
+            stream = self.__streams.get(stream_id)
+
+        if stream is None or stream.end_stream_received:
+            self.__send_frame(Http2Connection.RST_STREAM, 0, stream_id,
+                              struct.pack(">I", Http2Connection.STREAM_CLOSED))
+            return
+
+        stream.receive_window -= len(payload)
+        if stream.receive_window < 0:
+            self.__reset_stream(stream, Http2Connection.FLOW_CONTROL_ERROR)
+            return
+
+        data = self.__remove_padding(flags, payload)
+        stream.body.append(data)
+        stream.body_size += len(data)
+        if stream.body_size > Http2Connection.__MAX_BODY_SIZE:
+            self.__answer(stream, 413, reset=not flags & Http2Connection.END_STREAM)
+
+        elif flags & Http2Connection.END_STREAM:
+            self.__start_stream(stream)
+
+        else:
+            """ The window is never bigger than what is left to exceed the maximum body size, that lets the client
+            send a body of exactly the maximum size and its end.
+            """
+            increment = min(len(payload), Http2Connection.__MAX_BODY_SIZE + 1 - stream.body_size -
+                            stream.receive_window)
+            if increment > 0:
+                stream.receive_window += increment
+                self.__send_frame(Http2Connection.WINDOW_UPDATE, 0, stream_id, struct.pack(">I", increment))
+
+    def __reset_stream(self, stream, error_code):
+        """ Resets a stream and forgets it, aborting the sending of its response if it has started.
+
+        Args:
+            stream (Http2Stream): the stream.
+            error_code (int): the error code.
+        """
+        with self.__lock:
+            stream.reset = True
+            self.__streams.pop(stream.stream_id, None)
+            self.__lock.notify_all()
+
+        self.__send_frame(Http2Connection.RST_STREAM, 0, stream.stream_id, struct.pack(">I", error_code))
+
+    def __process_window_update(self, stream_id, payload):
+        """ Processes a WINDOW_UPDATE frame, waking up the streams waiting to send data. An increment of 0 is a
+        PROTOCOL_ERROR and a window over 2^31-1 is a FLOW_CONTROL_ERROR, of the connection if the frame is for the
+        connection or of the stream otherwise.
+
+        Args:
+            stream_id (int): the stream identifier, 0 for the connection.
+            payload (bytes): the payload.
+
+        Raises:
+            Http2ConnectionErrorException: if the frame breaks the protocol for the connection.
+        """
+        if len(payload) != 4:
+            raise Http2ConnectionErrorException(Http2Connection.FRAME_SIZE_ERROR)
+
+        increment = struct.unpack(">I", payload)[0] & 0x7fffffff
+        if stream_id == 0:
+            if increment == 0:
+                raise Http2ConnectionErrorException(Http2Connection.PROTOCOL_ERROR)
+
+            with self.__lock:
+                self.__send_window += increment
+                if self.__send_window > Http2Connection.__MAX_WINDOW_SIZE:
+                    raise Http2ConnectionErrorException(Http2Connection.FLOW_CONTROL_ERROR)
+
+                self.__lock.notify_all()
+
+            return
+
+        error_code = None
+        with self.__lock:
+            """ The frames for the streams already closed are ignored.
+            """
+            stream = self.__streams.get(stream_id)
+            if stream is None:
+                return
+
+            if increment == 0:
+                error_code = Http2Connection.PROTOCOL_ERROR
+
+            elif stream.send_window + increment > Http2Connection.__MAX_WINDOW_SIZE:
+                error_code = Http2Connection.FLOW_CONTROL_ERROR
+
+            else:
+                stream.send_window += increment
+                self.__lock.notify_all()
+
+        if error_code is not None:
+            self.__reset_stream(stream, error_code)
+
+    def __apply_settings(self, payload):
+        """ Applies the settings of the client.
+
+        Args:
+            payload (bytes): the payload of the SETTINGS frame.
+        """
+        if len(payload) % 6 != 0:
+            raise Http2ConnectionErrorException(Http2Connection.FRAME_SIZE_ERROR)
+
+        for i in range(0, len(payload), 6):
+            identifier, value = struct.unpack(">HI", payload[i:i + 6])
+            if identifier == Http2Connection.SETTINGS_INITIAL_WINDOW_SIZE:
+                if value > Http2Connection.__MAX_WINDOW_SIZE:
+                    raise Http2ConnectionErrorException(Http2Connection.FLOW_CONTROL_ERROR)
+
+                with self.__lock:
+                    """ The change applies to the windows of the open streams too.
+                    """
+                    delta = value - self.__peer_initial_window
+                    self.__peer_initial_window = value
+                    for stream in self.__streams.values():
+                        stream.send_window += delta
+
+                    self.__lock.notify_all()
+
+            elif identifier == Http2Connection.SETTINGS_MAX_FRAME_SIZE:
+                if not Http2Connection.__MAX_FRAME_SIZE <= value <= 2 ** 24 - 1:
+                    raise Http2ConnectionErrorException(Http2Connection.PROTOCOL_ERROR)
+
+                self.__peer_max_frame_size = value
+
+            elif identifier == Http2Connection.SETTINGS_HEADER_TABLE_SIZE:
+                with self.__write_lock:
+                    self.__encoder.resize(value)
+
+    def __start_upgraded_stream(self):
+        """ Handles the HTTP/1.1 request that asked for the upgrade as the stream 1, that is already half closed.
+        """
+        stream = Http2Stream(self, 1, self.__peer_initial_window, 0)
+        stream.request = self.__upgrade_request
+        with self.__lock:
+            self.__streams[1] = stream
+            self.__last_stream_id = 1
+
+        self.__start_stream(stream, parse=False)
+
+    def __start_stream(self, stream, parse=True):
+        """ Starts handling a stream that the client has finished sending.
+
+        Args:
+            stream (Http2Stream): the stream.
+            parse (bool): `False` if the stream already has its request.
+        """
+        stream.end_stream_received = True
+        if parse:
+            try:
+                stream.request = self.__build_request(stream.headers, b"".join(stream.body))
+                stream.request.scheme = "https" if isinstance(self.__client, ssl.SSLSocket) else "http"
+
+            except KeyError:
+                """ The request is malformed, it is answered directly without calling the handler.
+                """
+                self.__answer(stream, 400)
+                return
+
+        stream.thread = threading.Thread(target=self.__handle_stream, args=(stream,), daemon=True)
+        stream.thread.start()
+
+    def __answer(self, stream, status, reset=False):
+        """ Answers a stream with an empty response without calling the handler, discarding its body.
+
+        Args:
+            stream (Http2Stream): the stream.
+            status (int): the HTTP status code.
+            reset (bool): `True` if the client has not finished sending, so the stream is reset with NO_ERROR after
+                the response to tell it to stop.
+        """
+        stream.end_stream_received = True
+        stream.body = []
+        response = HttpResponse()
+        response.status = status
+        stream.thread = threading.Thread(target=self.__send_answer, args=(stream, response, reset), daemon=True)
+        stream.thread.start()
+
+    def __send_answer(self, stream, response, reset):
+        """ Sends the response of `__answer` and forgets the stream.
+        """
+        try:
+            stream.send_response(response)
+            if reset:
+                self.__send_frame(Http2Connection.RST_STREAM, 0, stream.stream_id,
+                                  struct.pack(">I", Http2Connection.NO_ERROR))
+
+        except OSError:
+            pass
+
+        finally:
+            self.__close_stream(stream)
+
+    def __handle_stream(self, stream):
+        """ Runs the handler of a stream and forgets the stream when it is finished.
+        """
+        try:
+            self.__handler(stream, self.__address)
+
+        finally:
+            self.__close_stream(stream)
+
+    def __close_stream(self, stream):
+        """ Forgets a finished stream.
+
+        Args:
+            stream (Http2Stream): the stream.
+        """
+        with self.__lock:
+            self.__streams.pop(stream.stream_id, None)
+
+    def send_headers(self, stream, headers, end_stream):
+        """ Sends the headers of a response.
+
+        Args:
+            stream (Http2Stream): the stream.
+            headers (list of tuple(str, str)): the header names, in lowercase, and values.
+            end_stream (bool): `True` if there is no body.
+        """
+        with self.__write_lock:
+            block = self.__encoder.encode(headers)
+            max_size = self.__peer_max_frame_size
+            first, block = block[:max_size], block[max_size:]
+            flags = (Http2Connection.END_STREAM if end_stream else 0) | (0 if block else Http2Connection.END_HEADERS)
+            self.__write_frame(Http2Connection.HEADERS, flags, stream.stream_id, first)
+            while block:
+                fragment, block = block[:max_size], block[max_size:]
+                self.__write_frame(Http2Connection.CONTINUATION, 0 if block else Http2Connection.END_HEADERS,
+                                   stream.stream_id, fragment)
+
+    def send_data(self, stream, data, end_stream):
+        """ Sends data of a response, waiting for the flow control windows of the stream and the connection.
+
+        Args:
+            stream (Http2Stream): the stream.
+            data (bytes): the data.
+            end_stream (bool): `True` if it is the end of the body.
+
+        Raises:
+            ConnectionError: if the stream is reset or the connection is closed.
+        """
+        view = memoryview(data)
+        while True:
+            with self.__lock:
+                while not (stream.reset or self.__closed) and len(view) > 0 and \
+                        (stream.send_window <= 0 or self.__send_window <= 0):
+                    self.__lock.wait()
+
+                if stream.reset or self.__closed:
+                    raise ConnectionError("HTTP/2 stream {} closed".format(stream.stream_id))
+
+                size = min(len(view), stream.send_window, self.__send_window, self.__peer_max_frame_size)
+                stream.send_window -= size
+                self.__send_window -= size
+
+            chunk, view = view[:size], view[size:]
+            last = len(view) == 0
+            with self.__write_lock:
+                self.__write_frame(Http2Connection.DATA, Http2Connection.END_STREAM if end_stream and last else 0,
+                                   stream.stream_id, chunk)
+
+            if last:
+                return
+
+    def __send_settings(self):
+        """ Sends the settings of the server.
+        """
+        self.__send_frame(Http2Connection.SETTINGS, 0, 0, struct.pack(
+            ">HI", Http2Connection.SETTINGS_MAX_CONCURRENT_STREAMS, Http2Connection.__MAX_CONCURRENT_STREAMS))
+
+    def __send_goaway(self, error_code):
+        """ Tells the client that the connection is closing because of an error.
+        """
+        try:
+            self.__send_frame(Http2Connection.GOAWAY, 0, 0, struct.pack(">II", self.__last_stream_id, error_code))
+
+        except OSError:
+            pass
+
+    def __send_frame(self, frame_type, flags, stream_id, payload=b""):
+        """ Sends a frame.
+        """
+        with self.__write_lock:
+            self.__write_frame(frame_type, flags, stream_id, payload)
+
+    def __write_frame(self, frame_type, flags, stream_id, payload):
+        """ Writes a frame, the write lock has to be held.
+        """
+        header = struct.pack(">I", len(payload))[1:] + struct.pack(">BBI", frame_type, flags, stream_id)
+        self.__client.sendall(header + bytes(payload))
+
+    def __read_frame(self, phase=None):
+        """ Reads a frame, within the timeout of the phase of the connection. The payload has the header timeout, or
+        the body timeout if it is a DATA frame.
+
+        Args:
+            phase (str): the timeout for the frame, by default the body timeout if any stream is receiving its body or
+                the idle timeout otherwise.
+
+        Returns:
+            A tuple with the type, the flags, the stream identifier and the payload.
+
+        Raises:
+            HttpRequestTimeoutException: if the timeout is exceeded.
+        """
+        if phase is None:
+            with self.__lock:
+                receiving = any(not stream.end_stream_received for stream in self.__streams.values())
+
+            phase = "body" if receiving else "idle"
+
+        header = self.__read_exactly(9, deadline=self.__get_deadline(phase))
+        length = struct.unpack(">I", b"\x00" + header[:3])[0]
+        frame_type, flags, stream_id = struct.unpack(">BBI", header[3:])
+        if length > Http2Connection.__MAX_FRAME_SIZE:
+            raise Http2ConnectionErrorException(Http2Connection.FRAME_SIZE_ERROR)
+
+        deadline = self.__get_deadline("body" if frame_type == Http2Connection.DATA else "header")
+        return frame_type, flags, stream_id & 0x7fffffff, self.__read_exactly(length, deadline=deadline)
+
+    @staticmethod
+    def __get_deadline(phase):
+        """ Gets the deadline of a timeout of `HttpRequest`, starting now.
+
+        Args:
+            phase (str): the timeout, either "idle", "header" or "body".
+
+        Returns:
+            A tuple(float, str) with the `time.monotonic()` value of the deadline and the phase, or `None` if the
+            timeout is not configured.
+        """
+        timeout = HttpRequest.get_timeout(phase)
+        return None if timeout is None else (time.monotonic() + timeout, phase)
+
+    def __read_exactly(self, length, expected=None, deadline=None):
+        """ Reads an exact amount of bytes, first from the already read data. The socket timeout is not used to wait,
+        as it would apply to the stream threads that are sending data too.
+
+        Args:
+            length (int): the amount of bytes.
+            expected (bytes): the bytes that have to be read, if they are known.
+            deadline (tuple(float, str)): the deadline, as returned by `__get_deadline`, or `None` to wait forever.
+
+        Returns:
+            The `bytes`.
+
+        Raises:
+            ConnectionError: if the client closes the connection.
+            Http2ConnectionErrorException: if the bytes are not the expected ones.
+            HttpRequestTimeoutException: if the deadline is exceeded.
+        """
+        while len(self.__buffer) < length:
+            if deadline is not None and \
+                    not (isinstance(self.__client, ssl.SSLSocket) and self.__client.pending()):
+                remaining = deadline[0] - time.monotonic()
+                if remaining <= 0 or not select.select([self.__client], [], [], remaining)[0]:
+                    raise HttpRequestTimeoutException(deadline[1])
+
+            data = self.__client.recv(65536)
+            if not data:
+                raise ConnectionError("HTTP/2 connection closed by the client")
+
+            self.__buffer += data
+
+        data, self.__buffer = self.__buffer[:length], self.__buffer[length:]
+        if expected is not None and data != expected:
+            raise Http2ConnectionErrorException(Http2Connection.PROTOCOL_ERROR)
+
+        return data
+
+    @staticmethod
+    def __remove_padding(flags, payload):
+        """ Removes the padding of a DATA or HEADERS frame.
+        """
+        if not flags & Http2Connection.PADDED:
+            return payload
+
+        if len(payload) == 0 or payload[0] >= len(payload):
+            raise Http2ConnectionErrorException(Http2Connection.PROTOCOL_ERROR)
+
+        return payload[1:len(payload) - payload[0]]
+
+    @staticmethod
+    def __build_request(headers, body):
+        """ Maps the headers and the body of a stream to an `HttpRequest`. The pseudo-headers become the request line,
+        ":authority" becomes the "Host" header, and the other header names are capitalized as in HTTP/1.1, like
+        "Content-Type".
+
+        Args:
+            headers (list of tuple(str, str)): the headers.
+            body (bytes): the body.
+
+        Returns:
+            The `HttpRequest`.
+
+        Raises:
+            KeyError: if a required pseudo-header is missing.
+        """
+        pseudo_headers = {}
+        request = HttpRequest(None)
+        request.http_version = "HTTP/2.0"
+        for name, value in headers:
+            if name.startswith(":"):
+                pseudo_headers[name] = value
+
+            else:
+                name = "-".join(part.capitalize() for part in name.split("-"))
+                if name in request.headers and name == "Cookie":
+                    request.headers[name] += "; " + value
+
+                elif name in request.headers:
+                    request.headers[name] += ", " + value
+
+                else:
+                    request.headers[name] = value
+
+        request.method = pseudo_headers[":method"]
+        full_uri = pseudo_headers[":path"].split("?", 1)
+        request.request_uri = full_uri[0]
+        request.query_string = "" if len(full_uri) <= 1 else full_uri[1]
+        if ":authority" in pseudo_headers:
+            request.headers.setdefault("Host", pseudo_headers[":authority"])
+
+        if body or "Content-Length" in request.headers:
+            request.headers.setdefault("Content-Length", str(len(body)))
+            request.raw_body = body
+
+        return request
+
+
+class Http2Stream:
+    """ An HTTP/2 stream, given to the request handler in place of the client socket.
+
+    Attributes:
+        stream_id (int): the stream identifier.
+        request (HttpRequest): the request, once the client has sent it whole.
+        headers (list of tuple(str, str)): the received headers.
+        body (list of bytes): the received data.
+        body_size (int): the size of the received data.
+        send_window (int): the flow control window for sending data.
+        receive_window (int): the flow control window for receiving data.
+        end_stream_received (bool): if the client has finished sending.
+        reset (bool): if the client has reset the stream.
+        thread (threading.Thread): the thread that handles the stream.
+    """
+    __CONNECTION_HEADERS = {"connection", "keep-alive", "proxy-connection", "transfer-encoding", "upgrade"}
+
+    def __init__(self, connection, stream_id, send_window, receive_window):
+        self.__connection = connection
+        self.stream_id = stream_id
+        self.request = None
+        self.headers = []
+        self.body = []
+        self.body_size = 0
+        self.send_window = send_window
+        self.receive_window = receive_window
+        self.end_stream_received = False
+        self.reset = False
+        self.thread = None
+
+    def send_response(self, response):
+        """ Sends a response as a HEADERS frame and DATA frames, followed by the chunks of its stream, if it has one.
+        The headers specific to HTTP/1.1 connections are not sent, as they are not allowed in HTTP/2.
+
+        Args:
+            response (HttpResponse): the response.
+        """
+        headers = [(":status", response.status.split(" ")[0])]
+        for name in response.headers:
+            if name.lower() not in Http2Stream.__CONNECTION_HEADERS:
+                headers.append((name.lower(), str(response.headers[name])))
+
+        body = response.body
+        stream = response.stream
+        if self.request is not None and self.request.method == "HEAD":
+            body = None
+            stream = None
+
+        try:
+            self.__connection.send_headers(self, headers, end_stream=not body and stream is None)
+            if body:
+                self.__connection.send_data(self, body, end_stream=stream is None)
+
+            if stream is not None:
+                for chunk in stream:
+                    if chunk:
+                        self.__connection.send_data(self, chunk, end_stream=False)
+
+                self.__connection.send_data(self, b"", end_stream=True)
+
+        except (OSError, ConnectionError):
+            pass
+
+    def close(self):
+        """ Ends the handling of the stream. The stream is closed by its last frame, so there is nothing to do.
+        """
+        pass
+
+
+class Http2ConnectionErrorException(Exception):
+    """ An exception to raise when the client breaks the HTTP/2 protocol and the connection has to be closed.
+
+    Attributes:
+        error_code (int): the HTTP/2 error code.
+    """
+    def __init__(self, error_code):
+        self.error_code = error_code
+        super().__init__("HTTP/2 connection error {}".format(error_code))
@@ -0,0 +1,449 @@
+import http.client
+import socket
+import threading
+import time
+import urllib.parse
+
+from httprequest import HttpRequestParseErrorException, HttpRequestTimeoutException
+
+
+class ReverseProxy:
+    """ Forwards the requests to a set of upstream servers through pools of persistent connections, so the proxied
+    requests don't pay a connection setup nor leave a socket in TIME_WAIT each. The request body is sent to the
+    upstream as it is received from the client and the response body is given back as a stream, so neither of them is
+    buffered whole.
+
+    The requests are balanced between the healthy upstreams, either in turns ("round_robin") or to the one with the
+    fewest requests in flight ("least_connections"). An upstream is marked unhealthy when a new connection to it fails,
+    and a background thread checks every upstream periodically, either requesting the health path or just connecting
+    to it, and closes the pooled connections that have been idle for too long.
+    """
+    __HOP_BY_HOP_HEADERS = {"connection", "keep-alive", "proxy-authenticate", "proxy-authorization",
+                            "proxy-connection", "te", "trailer", "transfer-encoding", "upgrade"}
+
+    __BALANCES = ["round_robin", "least_connections"]
+
+    __CHUNK_SIZE = 65536
+
+    __IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "TRACE", "PUT", "DELETE"}
+
+    def __init__(self, upstreams, balance="round_robin", pool_size=10, idle_timeout=60, timeout=30,
+                 health_path=None, health_interval=10, strip_prefix=False):
+        """ Creates the pools and starts the health checks.
+
+        Args:
+            upstreams (list of str): the base URLs of the upstream servers, like "http://127.0.0.1:8000".
+            balance (str): the balancing strategy, either "round_robin" or "least_connections".
+            pool_size (int): the maximum amount of connections to each upstream.
+            idle_timeout (float): the seconds a pooled connection can be idle before it is closed.
+            timeout (float): the seconds to wait for a pooled connection, to connect to the upstream and for each read
+                from it.
+            health_path (str): the path requested to check the health of the upstreams, or `None` to just connect to
+                them.
+            health_interval (float): the seconds between health checks.
+            strip_prefix (bool): `True` to remove the route prefix from the path sent to the upstream.
+
+        Raises:
+            ProxyConfigWrongTypeException: if any of the options has an incorrect type.
+        """
+        if not isinstance(upstreams, (list, tuple)) or not upstreams or balance not in ReverseProxy.__BALANCES:
+            raise ProxyConfigWrongTypeException(upstreams if balance in ReverseProxy.__BALANCES else balance)
+
+        for value in [pool_size, idle_timeout, timeout, health_interval]:
+            if isinstance(value, bool) or not isinstance(value, (int, float)) or value <= 0:
+                raise ProxyConfigWrongTypeException(value)
+
+        if health_path is not None and (not isinstance(health_path, str) or not health_path.startswith("/")):
+            raise ProxyConfigWrongTypeException(health_path)
+
+        self.__pools = [UpstreamPool(upstream, pool_size, idle_timeout, timeout) for upstream in upstreams]
+        self.__balance = balance
+        self.__health_path = health_path
+        self.__health_interval = health_interval
+        self.__strip_prefix = strip_prefix
+        self.__turn = 0
+        self.__lock = threading.Lock()
+        threading.Thread(target=self.__maintain, daemon=True).start()
+
+    def forward(self, request, response, address, prefix):
+        """ Forwards a request to an upstream and sets its response. If a pooled connection turns out to be closed by
+        the upstream before the request head is sent, or before the request body is sent if the method is idempotent,
+        the request is retried once with a new connection. The response body is set as the stream of the response, an
+        `UpstreamStream`, and the connection goes back to the pool once it is read whole or right away if the response
+        has no body.
+
+        Args:
+            request (HttpRequest): the request, with its body deferred to stream it.
+            response (HttpResponse): the response.
+            address (tuple(str, int)): the client address and port, added to the "X-Forwarded-For" header.
+            prefix (str): the route prefix that matched the request.
+
+        Raises:
+            HttpRequestParseErrorException: if the client closes the connection before sending the whole body.
+            HttpRequestTimeoutException: if the client is too slow sending the body.
+        """
+        path = request.request_uri
+        if self.__strip_prefix:
+            path = path[len(prefix.rstrip("/")):] or "/"
+
+        if request.query_string:
+            path += "?" + request.query_string
+
+        pool = self.__choose()
+        headers = self.__upstream_headers(request, address, pool)
+        for attempt in range(2):
+            try:
+                connection, reused = pool.acquire(reuse=attempt == 0)
+
+            except UpstreamPoolExhaustedException:
+                response.status = 503
+                return
+
+            head_sent = False
+            body_sent = False
+            try:
+                connection.putrequest(request.method, path, skip_host=True, skip_accept_encoding=True)
+                for name, value in headers:
+                    connection.putheader(name, value)
+
+                connection.endheaders()
+                head_sent = True
+                for chunk in request.iter_body(ReverseProxy.__CHUNK_SIZE):
+                    body_sent = True
+                    connection.send(chunk)
+
+                upstream = connection.getresponse()
+                break
+
+            except (HttpRequestParseErrorException, HttpRequestTimeoutException):
+                pool.release(connection, reusable=False)
+                raise
+
+            except socket.timeout:
+                pool.release(connection, reusable=False)
+                response.status = 504
+                return
+
+            except (OSError, http.client.HTTPException):
+                pool.release(connection, reusable=False)
+                if reused and not body_sent and attempt == 0 and \
+                        (not head_sent or request.method in ReverseProxy.__IDEMPOTENT_METHODS):
+                    """ The upstream closed the idle connection, it is safe to retry as nothing was consumed. Once the
+                    head is sent the upstream may have handled the request, so only the idempotent ones are retried. The
+                    retry uses a new connection and closes the idle ones, as they are likely closed too.
+                    """
+                    continue
+
+                if not reused:
+                    pool.healthy = False
+
+                response.status = 502
+                return
+
+        response.status = upstream.status
+        for name, value in upstream.getheaders():
+            if name.lower() in ReverseProxy.__HOP_BY_HOP_HEADERS:
+                continue
+
+            """ The repeated headers are joined, as the response headers are a `dict`.
+            """
+            if name in response.headers:
+                response.headers[name] += ", " + value
+
+            else:
+                response.headers[name] = value
+
+        if request.method == "HEAD" or upstream.length == 0:
+            """ The responses without a body give the connection back to the pool at once, as there is nothing to
+            stream.
+            """
+            try:
+                upstream.read()
+                pool.release(connection, not upstream.will_close)
+
+            except (OSError, http.client.HTTPException):
+                pool.release(connection, reusable=False)
+
+            return
+
+        if "Content-Length" not in response.headers:
+            response.headers["Connection"] = "close"
+
+        response.stream = UpstreamStream(pool, connection, upstream, ReverseProxy.__CHUNK_SIZE)
+
+    def __choose(self):
+        """ Chooses the upstream for a request, among the healthy ones if there are any.
+
+        Returns:
+            The `UpstreamPool` of the upstream.
+        """
+        pools = [pool for pool in self.__pools if pool.healthy] or self.__pools
+        if self.__balance == "least_connections":
+            return min(pools, key=lambda pool: pool.active)
+
+        with self.__lock:
+            self.__turn += 1
+            return pools[self.__turn % len(pools)]
+
+    @staticmethod
+    def __upstream_headers(request, address, pool):
+        """ Gets the headers to send to the upstream, that are the request headers without the hop-by-hop ones, with
+        the upstream as "Host" and the "X-Forwarded-*" headers.
+
+        Args:
+            request (HttpRequest): the request.
+            address (tuple(str, int)): the client address and port.
+            pool (UpstreamPool): the pool of the upstream.
+
+        Returns:
+            A `list` of tuple(str, str) with the headers.
+        """
+        connection_headers = {name.strip().lower() for name in request.headers.get("Connection", "").split(",")}
+        headers = [("Host", pool.netloc)]
+        forwarded_for = address[0]
+        for name, value in request.headers.items():
+            lower_name = name.lower()
+            if lower_name == "x-forwarded-for":
+                forwarded_for = value + ", " + forwarded_for
+
+            elif lower_name not in ReverseProxy.__HOP_BY_HOP_HEADERS and lower_name not in connection_headers and \
+                    lower_name not in ["host", "x-forwarded-host", "x-forwarded-proto"]:
+                headers.append((name, value))
+
+        headers.append(("X-Forwarded-For", forwarded_for))
+        headers.append(("X-Forwarded-Proto", request.scheme))
+        if "Host" in request.headers:
+            headers.append(("X-Forwarded-Host", request.headers["Host"]))
+
+        return headers
+
+    def __maintain(self):
+        """ Checks the health of the upstreams and evicts the idle connections periodically, in a background thread.
+        """
+        while True:
+            time.sleep(self.__health_interval)
+            for pool in self.__pools:
+                pool.evict_idle()
+                pool.check_health(self.__health_path)
+
+
+class UpstreamStream:
+    """ The body of an upstream response, streamed chunk by chunk. The connection goes back to the pool once the body
+    is read whole. If the stream is closed before the end, even if it was never iterated, or the upstream fails, the
+    connection is closed instead. It is released only once.
+    """
+    def __init__(self, pool, connection, upstream, chunk_size):
+        """ Creates the stream.
+
+        Args:
+            pool (UpstreamPool): the pool of the upstream.
+            connection (http.client.HTTPConnection): the connection.
+            upstream (http.client.HTTPResponse): the upstream response.
+            chunk_size (int): the maximum size of each chunk.
+        """
+        self.__pool = pool
+        self.__connection = connection
+        self.__upstream = upstream
+        self.__chunk_size = chunk_size
+        self.__released = False
+        self.__lock = threading.Lock()
+
+    def __iter__(self):
+        """ Reads the body.
+
+        Yields:
+            The `bytes` of each chunk of the body.
+        """
+        reusable = False
+        try:
+            while not self.__released:
+                chunk = self.__upstream.read1(self.__chunk_size)
+                if not chunk:
+                    """ Reading the end of the body lets the connection send another request, as `read1` doesn't
+                    mark the response as finished once its whole length is read.
+                    """
+                    self.__upstream.read()
+                    reusable = not self.__upstream.will_close
+                    break
+
+                yield chunk
+
+        except (OSError, http.client.HTTPException):
+            """ The response is cut, the client notices it as the connection is closed before its end.
+            """
+            pass
+
+        finally:
+            self.__release(reusable)
+
+    def close(self):
+        """ Closes the stream, closing the connection if the body was not read whole.
+        """
+        self.__release(False)
+
+    def __release(self, reusable):
+        """ Gives the connection back to the pool, if it was not already.
+
+        Args:
+            reusable (bool): `True` if the connection can send another request.
+        """
+        with self.__lock:
+            if self.__released:
+                return
+
+            self.__released = True
+
+        self.__pool.release(self.__connection, reusable)
+
+
+class UpstreamPool:
+    """ A pool of persistent connections to an upstream server. The most recently used idle connection is reused
+    first, so the rest stay idle and are evicted when the load goes down.
+
+    Attributes:
+        netloc (str): the host and port of the upstream.
+        active (int): the amount of requests in flight to the upstream.
+        healthy (bool): if the upstream passed its last health check.
+    """
+    def __init__(self, upstream, size, idle_timeout, timeout):
+        """ Creates the pool without connecting.
+
+        Args:
+            upstream (str): the base URL of the upstream, with "http" or "https" scheme.
+            size (int): the maximum amount of connections.
+            idle_timeout (float): the seconds a connection can be idle before it is closed.
+            timeout (float): the seconds to wait for a free connection, to connect and for each read.
+
+        Raises:
+            ProxyConfigWrongTypeException: if the upstream is not a valid URL.
+        """
+        try:
+            url = urllib.parse.urlsplit(upstream)
+            port = url.port
+
+        except (AttributeError, TypeError, ValueError):
+            raise ProxyConfigWrongTypeException(upstream)
+
+        if url.scheme not in ["http", "https"] or not url.hostname:
+            raise ProxyConfigWrongTypeException(upstream)
+
+        self.netloc = url.netloc
+        self.active = 0
+        self.healthy = True
+        self.__host = url.hostname
+        self.__port = port
+        self.__connection_class = http.client.HTTPSConnection if url.scheme == "https" else http.client.HTTPConnection
+        self.__size = size
+        self.__idle_timeout = idle_timeout
+        self.__timeout = timeout
+        self.__idle = []
+        self.__open = 0
+        self.__condition = threading.Condition()
+
+    def acquire(self, reuse=True):
+        """ Takes an idle connection, or creates a new one if the pool is not full, waiting for a connection to be
+        released otherwise.
+
+        Args:
+            reuse (bool): `False` to create a new connection and close the idle ones.
+
+        Returns:
+            A tuple(http.client.HTTPConnection, bool) with the connection and if it was used before.
+
+        Raises:
+            UpstreamPoolExhaustedException: if no connection is released before the timeout.
+        """
+        deadline = time.monotonic() + self.__timeout
+        with self.__condition:
+            while not self.__idle and self.__open >= self.__size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise UpstreamPoolExhaustedException(self.netloc)
+
+                self.__condition.wait(remaining)
+
+            self.active += 1
+            while self.__idle:
+                connection, released_at = self.__idle.pop()
+                if reuse and time.monotonic() - released_at < self.__idle_timeout:
+                    return connection, True
+
+                connection.close()
+                self.__open -= 1
+
+            self.__open += 1
+
+        return self.__connection_class(self.__host, self.__port, timeout=self.__timeout), False
+
+    def release(self, connection, reusable):
+        """ Gives a connection back to the pool.
+
+        Args:
+            connection (http.client.HTTPConnection): the connection.
+            reusable (bool): `True` if the response was read whole and the upstream keeps the connection open,
+                otherwise the connection is closed.
+        """
+        with self.__condition:
+            self.active -= 1
+            if reusable:
+                self.__idle.append((connection, time.monotonic()))
+
+            else:
+                connection.close()
+                self.__open -= 1
+
+            self.__condition.notify()
+
+    def evict_idle(self):
+        """ Closes the connections that have been idle longer than the idle timeout.
+        """
+        with self.__condition:
+            now = time.monotonic()
+            expired = [entry for entry in self.__idle if now - entry[1] >= self.__idle_timeout]
+            self.__idle = [entry for entry in self.__idle if now - entry[1] < self.__idle_timeout]
+            self.__open -= len(expired)
+            self.__condition.notify_all()
+
+        for connection, _ in expired:
+            connection.close()
+
+    def check_health(self, path):
+        """ Checks if the upstream is healthy with a new connection, that is not pooled.
+
+        Args:
+            path (str): the path to request, the upstream is healthy if it doesn't answer with a 5xx HTTP status
+                code, or `None` to just check that it accepts connections.
+        """
+        connection = self.__connection_class(self.__host, self.__port, timeout=self.__timeout)
+        try:
+            if path is None:
+                connection.connect()
+                healthy = True
+
+            else:
+                connection.request("GET", path, headers={"Host": self.netloc})
+                healthy = connection.getresponse().status < 500
+
+        except (OSError, http.client.HTTPException):
+            healthy = False
+
+        finally:
+            connection.close()
+
+        self.healthy = healthy
+
+
+class UpstreamPoolExhaustedException(Exception):
+    """ Exception to be raised if every connection to an upstream is in use for longer than the timeout.
+    """
+    def __init__(self, upstream):
+        message = "No connection to the upstream '{}' was released in time".format(upstream)
+        super().__init__(message)
+
+
+class ProxyConfigWrongTypeException(Exception):
+    """ Exception to be raised if a proxy option has an incorrect type.
+    """
+    def __init__(self, value):
+        message = "Wrong proxy option, '{}' was given".format(value)
+        super().__init__(message)
@@ -1,53 +1,353 @@
+import socket
+import ssl
+import threading
+import time
+
+
 class HttpRequest:
     """ HTTP request class.
-    
+
     Attributes:
         method (str): the HTTP method.
         request_uri (str): the request URI.
         query_string (str): the query string.
         http_version (str): the HTTP version.
         headers (dict of str: str): a `dict` containing the headers.
+        scheme (str): "https" if the connection is over TLS, "http" otherwise.
         body (str): the body.
+        raw_body (bytes): the body without decoding.
+        parsed_at (float): the `time.monotonic()` value of the moment the request was parsed, `None` until then.
     """
-    def __init__(self, client):
-        """ The constructor parses the HTTP request.
+    __TIMEOUTS = {
+        "idle": None,
+        "header": None,
+        "body": None,
+        "body_min_rate": None,
+        "write": None
+    }
+
+    __MAX_HEAD_SIZE = 65536
+
+    __RECV_SIZE = 8192
+
+    __CURRENT = threading.local()
+
+    def __init__(self, client, defer_body=None):
+        """ The constructor parses the HTTP request. If timeouts are configured, the client has to send the first byte
+        of the request within the idle timeout, the rest of the request line and headers within the header timeout and
+        the body within the body timeout, that is extended one second for every `body_min_rate` bytes received.
 
         Args:
             client (socket.socket): the client socket.
+            defer_body (function): an optional function that gets the request once its head is parsed and returns
+                `True` if the body has to be left unread, to be streamed with `iter_body` or read the first time it is
+                accessed.
 
         Raises:
-            BadRequestException: If the request cannot be parsed.
+            HttpRequestParseErrorException: If the request cannot be parsed.
+            HttpRequestTimeoutException: If the client is too slow sending the request.
         """
         self.method = None
         self.request_uri = None
         self.query_string = None
         self.http_version = None
         self.headers = dict()
-        self.body = None
+        self.scheme = "https" if isinstance(client, ssl.SSLSocket) else "http"
+        self.__client = client
+        self.__buffer = b""
+        self.__body = None
+        self.__raw_body = None
+        self.__unread_body = 0
+        self.__deferred_body = False
+        self.parsed_at = None
         if client is not None:
-            with client.makefile() as request_file:
-                try:
-                    line = request_file.readline()
-                    line_split = line.split(" ")
-                    self.method = line_split[0]
-                    full_uri = line_split[1].split("?")
-                    self.request_uri = full_uri[0]
-                    self.query_string = "" if len(full_uri) <= 1 else full_uri[1]
-                    self.http_version = line_split[2]
-                    line = request_file.readline()
-                    while line != "\r\n" and line != "\n":
-                        line_split = line.split(": ")
-                        self.headers[line_split[0]] = line_split[1].strip()
-                        line = request_file.readline()
-
-                    if "Content-Length" in self.headers:
-                        self.body = request_file.read(int(self.headers["Content-Length"]))
-
-                except IndexError:
-                    raise HttpRequestParseErrorException()
+            try:
+                lines = [line.rstrip("\r") for line in self.__read_head().decode("utf-8").split("\n")]
+                line_split = lines[0].split(" ")
+                self.method = line_split[0]
+                full_uri = line_split[1].split("?")
+                self.request_uri = full_uri[0]
+                self.query_string = "" if len(full_uri) <= 1 else full_uri[1]
+                self.http_version = line_split[2]
+                for line in lines[1:]:
+                    line_split = line.split(": ")
+                    self.headers[line_split[0]] = line_split[1].strip()
+
+                if "Content-Length" in self.headers:
+                    self.__unread_body = int(self.headers["Content-Length"])
+                    if self.__unread_body < 0:
+                        raise HttpRequestParseErrorException()
+
+                    if defer_body is not None and defer_body(self):
+                        self.__deferred_body = True
+
+                    else:
+                        self.__raw_body = b"".join(self.iter_body())
+
+            except (IndexError, ValueError):
+                raise HttpRequestParseErrorException()
+
+            finally:
+                self.__reset_timeout()
+
+        self.parsed_at = time.monotonic()
+
+    @property
+    def body(self):
+        """ str: the body, decoded as UTF-8 the first time it is accessed, or `None` if the request has no body or it
+        has been streamed. If the reading of the body was deferred, it is read the first time it is accessed.
+
+        Raises:
+            HttpRequestParseErrorException: If the deferred body cannot be read or the body is not UTF-8 text.
+            HttpRequestTimeoutException: If the client is too slow sending the deferred body.
+        """
+        if self.__body is None and self.raw_body is not None:
+            try:
+                self.__body = self.__raw_body.decode("utf-8")
+
+            except UnicodeDecodeError:
+                raise HttpRequestParseErrorException()
+
+        return self.__body
+
+    @body.setter
+    def body(self, value):
+        """ Sets the body.
+
+        Args:
+            value (str): the body.
+        """
+        self.__deferred_body = False
+        self.__body = value
+        self.__raw_body = None if value is None else value.encode("utf-8")
+
+    @property
+    def raw_body(self):
+        """ bytes: the body, or `None` if the request has no body or it has been streamed. If the reading of the body
+        was deferred, it is read the first time it is accessed.
+
+        Raises:
+            HttpRequestParseErrorException: If the deferred body cannot be read.
+            HttpRequestTimeoutException: If the client is too slow sending the deferred body.
+        """
+        if self.__deferred_body:
+            self.__raw_body = b"".join(self.iter_body())
+
+        return self.__raw_body
+
+    @raw_body.setter
+    def raw_body(self, value):
+        """ Sets the body without decoding it.
+
+        Args:
+            value (bytes): the body.
+        """
+        self.__deferred_body = False
+        self.__body = None
+        self.__raw_body = value
+
+    def iter_body(self, chunk_size=65536):
+        """ Iterates over the body as it is received, without buffering it whole. If the body has already been read,
+        it is given in one chunk. The body timeouts apply as if it was read by the constructor.
+
+        Args:
+            chunk_size (int): the maximum size of each chunk.
+
+        Yields:
+            The `bytes` of each chunk.
+
+        Raises:
+            HttpRequestParseErrorException: If the client closes the connection before sending the whole body.
+            HttpRequestTimeoutException: If the body timeout is exceeded.
+        """
+        if self.__raw_body is not None or not self.__unread_body:
+            if self.__raw_body:
+                yield self.__raw_body
+
+            return
+
+        self.__deferred_body = False
+        body_timeout = HttpRequest.__TIMEOUTS["body"]
+        min_rate = HttpRequest.__TIMEOUTS["body_min_rate"]
+        deadline = None if body_timeout is None else time.monotonic() + body_timeout
+        try:
+            while self.__unread_body > 0:
+                if not self.__buffer:
+                    self.__buffer = self.__recv(deadline, "body", min(chunk_size, self.__unread_body))
+                    if deadline is not None and min_rate is not None:
+                        deadline += len(self.__buffer) / min_rate
+
+                chunk = self.__buffer[:min(chunk_size, self.__unread_body)]
+                self.__buffer = self.__buffer[len(chunk):]
+                self.__unread_body -= len(chunk)
+                yield chunk
+
+        finally:
+            self.__reset_timeout()
+
+    def __read_head(self):
+        """ Reads the request line and the headers.
+
+        Returns:
+            The `bytes` of the request line and the headers, without the empty line that ends them.
+
+        Raises:
+            HttpRequestParseErrorException: If the client closes the connection or the head is too big.
+            HttpRequestTimeoutException: If the idle or header timeout is exceeded.
+        """
+        idle_timeout = HttpRequest.__TIMEOUTS["idle"]
+        deadline = None if idle_timeout is None else time.monotonic() + idle_timeout
+        self.__buffer = self.__recv(deadline, "idle")
+        header_timeout = HttpRequest.__TIMEOUTS["header"]
+        deadline = None if header_timeout is None else time.monotonic() + header_timeout
+        while True:
+            """ The head ends with an empty line, either "\r\n" or "\n".
+            """
+            end = self.__buffer.find(b"\n\r\n")
+            end_length = 3
+            bare_end = self.__buffer.find(b"\n\n")
+            if bare_end != -1 and (end == -1 or bare_end < end):
+                end, end_length = bare_end, 2
+
+            if end != -1:
+                head = self.__buffer[:end]
+                self.__buffer = self.__buffer[end + end_length:]
+                return head
+
+            if len(self.__buffer) > HttpRequest.__MAX_HEAD_SIZE:
+                raise HttpRequestParseErrorException()
+
+            self.__buffer += self.__recv(deadline, "header")
+
+    def __recv(self, deadline, phase, size=None):
+        """ Receives data from the client, waiting until the deadline at most.
+
+        Args:
+            deadline (float): the `time.monotonic()` value of the deadline, or `None` to wait forever.
+            phase (str): the part of the request that is being read, either "idle", "header" or "body".
+            size (int): the maximum amount of bytes to receive, 8192 by default.
+
+        Returns:
+            The received `bytes`.
+
+        Raises:
+            HttpRequestParseErrorException: If the client closes the connection.
+            HttpRequestTimeoutException: If the deadline is exceeded.
+        """
+        if deadline is not None:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise HttpRequestTimeoutException(phase)
+
+            self.__client.settimeout(remaining)
+
+        try:
+            data = self.__client.recv(size or HttpRequest.__RECV_SIZE)
+
+        except socket.timeout:
+            raise HttpRequestTimeoutException(phase)
+
+        if not data:
+            raise HttpRequestParseErrorException()
+
+        return data
+
+    def __reset_timeout(self):
+        """ Removes the timeout of the client socket, if the reading of the request set it.
+        """
+        if self.__client is not None and \
+                any(HttpRequest.__TIMEOUTS[key] is not None for key in ["idle", "header", "body"]):
+            self.__client.settimeout(None)
+
+    def take_buffered_data(self):
+        """ Takes the data received from the client after the end of the request, for the protocols that continue on
+        the same connection, like HTTP/2.
+
+        Returns:
+            The received `bytes` that are not part of the request.
+        """
+        data, self.__buffer = self.__buffer, b""
+        return data
+
+    @staticmethod
+    def get_current():
+        """ Gets the request being handled by the current thread.
+
+        Returns:
+            The `HttpRequest`, or `None` if the thread is not handling a request.
+        """
+        return getattr(HttpRequest.__CURRENT, "request", None)
+
+    @staticmethod
+    def set_current(request):
+        """ Sets the request being handled by the current thread.
+
+        Args:
+            request (HttpRequest): the request, or `None` once it is handled.
+        """
+        HttpRequest.__CURRENT.request = request
+
+    @staticmethod
+    def get_timeout(name):
+        """ Gets a configured timeout.
+
+        Args:
+            name (str): the name of the timeout, see `set_timeouts`.
+
+        Returns:
+            The timeout, or `None` if it is not configured.
+        """
+        return HttpRequest.__TIMEOUTS[name]
+
+    @staticmethod
+    def set_timeouts(timeouts):
+        """ Sets the timeouts that protect the server from slow clients. Each timeout is optional and disabled if it is
+        not given.
+
+        Args:
+            timeouts (dict of str: float): the timeouts, with the keys:
+                "idle": seconds to wait for the first byte of the request.
+                "header": seconds to receive the request line and the headers after the first byte.
+                "body": seconds to receive the body before counting the minimum rate.
+                "body_min_rate": bytes per second that extend the body timeout while they are received.
+                "write": seconds to send the response.
+
+        Raises:
+            TimeoutsWrongTypeException: if the timeouts object has an incorrect structure.
+        """
+        if not isinstance(timeouts, dict):
+            raise TimeoutsWrongTypeException(timeouts)
+
+        for key in timeouts:
+            value = timeouts[key]
+            if key not in HttpRequest.__TIMEOUTS or (value is not None and (
+                    isinstance(value, bool) or not isinstance(value, (int, float)) or value <= 0)):
+                raise TimeoutsWrongTypeException(timeouts)
+
+        HttpRequest.__TIMEOUTS.update(timeouts)
 
 
 class HttpRequestParseErrorException(Exception):
     """ An exception to raise if the HTTP request is not well formed.
     """
     pass
+
+
+class HttpRequestTimeoutException(Exception):
+    """ An exception to raise if the client takes too long sending the HTTP request.
+
+    Attributes:
+        phase (str): the part of the request that was being read, either "idle", "header" or "body".
+    """
+    def __init__(self, phase):
+        self.phase = phase
+        super().__init__("Timeout exceeded while reading the request {}".format(phase))
+
+
+class TimeoutsWrongTypeException(Exception):
+    """ Exception to be raised if the timeouts object has an incorrect structure.
+    """
+    def __init__(self, timeouts):
+        message = "Timeouts should be a `dict` of 'idle', 'header', 'body', 'body_min_rate' or 'write': positive " \
+                  "number, '{}' was given".format(timeouts)
+        super().__init__(message)
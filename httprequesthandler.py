@@ -1,10 +1,24 @@
 import hashlib
 import base64
+import contextlib
 import re
+import socket
+import ssl
+import threading
+import traceback
 
+from http2 import Http2Connection, Http2Stream
 from httpresponse import HttpResponse
-from httprequest import HttpRequest, HttpRequestParseErrorException
+from httprequest import HttpRequest, HttpRequestParseErrorException, HttpRequestTimeoutException
+from httpproxy import ReverseProxy
 from filegetter import FileGetter
+from admissioncontroller import AdmissionController, RequestRejectedException
+from jsonencoder import JsonEncoder
+from profiler import SamplingProfiler, RequestTracer, ProfilingConfigWrongTypeException
+from processexecutor import ProcessExecutor, ProcessCallTimeoutException
+from multipartparser import MultipartSizeLimitException
+from tlscontext import TlsContext
+from websocketbus import WebSocketBus
 
 
 class HttpRequestHandler:
@@ -13,6 +27,8 @@ class HttpRequestHandler:
 
     __ENDPOINTS = dict()
 
+    __PROXIES = dict()
+
     __API_URI = "/api"
 
     __HOOKS = {
@@ -21,6 +37,17 @@ class HttpRequestHandler:
         "AFTER_SENDING": []
     }
 
+    __TIMEOUT_COUNTERS = {
+        "idle": 0,
+        "header": 0,
+        "body": 0,
+        "write": 0
+    }
+
+    __TIMEOUT_COUNTERS_LOCK = threading.Lock()
+
+    __SERVER_OPTIONS = ["tls", "websocket_bus", "asset_manifest", "tracing", "profiling", "process_pool"]
+
     def __init__(self, client, address):
         """ Handles the request and sends a response to the client.
 
@@ -28,16 +55,47 @@ class HttpRequestHandler:
             client (socket.socket): The client of the request.
             address (tuple(str, int)): The client address and port, for logging purposes.
         """
+        if TlsContext.is_enabled() and not isinstance(client, (Http2Stream, ssl.SSLSocket)):
+            """ With TLS, the handshake is done before reading the request, and if it fails the connection is closed
+            without a response.
+            """
+            try:
+                client = TlsContext.wrap(client)
+
+            except OSError:
+                print("{}:{} - TLS handshake failed".format(address[0], address[1]))
+                client.close()
+                return
+
         self.__client = client
         self.__address = address
         self.__response = HttpResponse()
         self.__request = None
         self.__close_connection = True
+        self.__admitted = False
+        self.__response_sent = False
+        self.__trace = RequestTracer.start_trace()
         stop_handling_request = False
         try:
-            """ First parses the HTTP request and, if there are hooks to call after parsing them, calls them.
+            """ First parses the HTTP request, then checks if the server can handle it and, if there are hooks to call
+            after parsing them, calls them.
+            """
+            with self.__span("parse"):
+                if isinstance(client, Http2Stream):
+                    self.__request = client.request
+
+                else:
+                    self.__request = HttpRequest(client, defer_body=HttpRequestHandler.__is_streamed_request)
+
+            if self.__handle_http2_request():
+                return
+
+            """ The queueing delay used by the adaptive load shedding starts once the request is parsed, so the TLS
+            handshake and a slow client don't count as server load. See `AdmissionController` for more information.
             """
-            self.__request = HttpRequest(client)
+            HttpRequest.set_current(self.__request)
+            AdmissionController.admit(queued_since=self.__request.parsed_at)
+            self.__admitted = True
             self.__after_parsing()
 
         except StopHandlingRequestException:
@@ -52,42 +110,216 @@ class HttpRequestHandler:
             stop_handling_request = True
             self.__response.status = 400
 
-        if not stop_handling_request:
-            request_uri = self.__request.request_uri
-            request_method = self.__request.method
-            """ Checks if the request has a valid HTTP method, if not, it returns a 400 HTTP error code to the client.
+        except HttpRequestTimeoutException as e:
+            """ If the client is too slow sending the request, it returns a 408 HTTP error code to the client.
             """
-            if request_method in ["GET", "POST", "HEAD", "PUT", "DELETE", "TRACE", "OPTIONS", "CONNECT", "PATCH"]:
-                """ Checks if the request is for the API or the app and handles it accordingly.
-                """
-                if request_uri == self.__API_URI or request_uri.startswith(self.__API_URI + "/"):
-                    self.__handle_api_request()
-                else:
-                    self.__handle_app_request()
+            stop_handling_request = True
+            self.__response.status = 408
+            self.__response.headers["Connection"] = "close"
+            self.__count_timeout(e.phase)
+
+        except RequestRejectedException as e:
+            """ If the server is overloaded, it returns a 503 HTTP error code to the client without calling any hook or
+            endpoint.
+            """
+            stop_handling_request = True
+            self.__set_service_unavailable(e.retry_after)
+
+        except Exception:
+            """ If a hook fails unexpectedly, it returns a 500 HTTP error code to the client.
+            """
+            stop_handling_request = True
+            self.__set_internal_server_error()
+
+        try:
+            if not stop_handling_request:
+                self.__dispatch()
+
+        except Exception:
+            """ If an endpoint, the proxy or the WebSocket handler fail unexpectedly, it returns a 500 HTTP error code
+            to the client, or closes the connection if the response was already sent.
+            """
+            if self.__response_sent:
+                traceback.print_exc()
+                self.__client.close()
 
             else:
-                self.__response.status = 400
+                self.__set_internal_server_error()
 
+        finally:
+            """ Sends the response, that releases the admission slot, clears the current request and finishes the
+            trace in any case.
+            """
             self.__end_handling()
 
+    def __dispatch(self):
+        """ Checks if the request has a valid HTTP method and if it is for a proxy route, the API or the app, and
+        handles it accordingly. If the method is not valid, it sets a 400 HTTP error code.
+        """
+        request_uri = self.__request.request_uri
+        request_method = self.__request.method
+        if request_method in ["GET", "POST", "HEAD", "PUT", "DELETE", "TRACE", "OPTIONS", "CONNECT", "PATCH"]:
+            proxy_prefix = self.__get_proxy_prefix(request_uri)
+            if proxy_prefix is not None:
+                with self.__span("proxy"):
+                    self.__handle_proxy_request(proxy_prefix)
+
+            elif request_uri == self.__API_URI or request_uri.startswith(self.__API_URI + "/"):
+                with self.__span("routing"):
+                    self.__handle_api_request()
+            else:
+                with self.__span("file"):
+                    self.__handle_app_request()
+
         else:
-            self.__end_handling()
+            self.__response.status = 400
 
     def __end_handling(self):
-        """ Ends the handling, either closing or leaving the connection open, also prints logging data.
+        """ Ends the handling, either closing or leaving the connection open, also prints logging data. The response is
+        sent only once, as the WebSocket requests end the handling before giving the connection to their handler.
         """
+        if self.__response_sent:
+            return
+
+        self.__response_sent = True
+        try:
+            self.__before_sending()
+
+        except Exception:
+            self.__set_internal_server_error()
+
         if self.__request is not None:
             print("{}:{} - {}: {} {}".format(self.__address[0], self.__address[1], self.__request.method,
                                              self.__request.request_uri, self.__response.status))
         else:
             print("{}:{} - {}".format(self.__address[0], self.__address[1], self.__response.status))
 
-        self.__before_sending()
-        self.__client.send(self.__response.build())
-        self.__after_sending()
+        try:
+            """ If there is a write timeout, the whole response has to be sent before it expires, otherwise the
+            connection is closed. If the response has a stream, each chunk has the whole timeout.
+            """
+            write_timeout = HttpRequest.get_timeout("write")
+            with self.__span("send"):
+                if isinstance(self.__client, Http2Stream):
+                    self.__client.send_response(self.__response)
+
+                else:
+                    self.__client.settimeout(write_timeout)
+                    self.__client.sendall(self.__response.build())
+                    if self.__response.stream is not None and \
+                            (self.__request is None or self.__request.method != "HEAD"):
+                        for chunk in self.__response.stream:
+                            self.__client.sendall(chunk)
+
+                    self.__client.settimeout(None)
+
+            self.__after_sending()
+
+        except socket.timeout:
+            self.__close_connection = True
+            self.__count_timeout("write")
+
+        except OSError:
+            """ The client has closed the connection.
+            """
+            self.__close_connection = True
+
+        except Exception:
+            """ The response couldn't be built or streamed, or an after sending hook failed.
+            """
+            traceback.print_exc()
+            self.__close_connection = True
+
+        finally:
+            if hasattr(self.__response.stream, "close"):
+                self.__response.stream.close()
+
+            HttpRequest.set_current(None)
+            self.__release_admission()
+            self.__record_trace()
+
         if self.__close_connection:
             self.__client.close()
 
+    def __span(self, name):
+        """ Records a timing span for the code run inside the `with` block if the request is being traced. See
+        `RequestTracer` for more information.
+
+        Args:
+            name (str): the name of the span.
+
+        Returns:
+            The span context manager.
+        """
+        if self.__trace is None:
+            return contextlib.nullcontext()
+
+        return self.__trace.span(name)
+
+    def __record_trace(self):
+        """ Writes the trace of the request, if it is being traced.
+        """
+        if self.__trace is None:
+            return
+
+        if self.__request is not None:
+            self.__trace.tags["method"] = self.__request.method
+            self.__trace.tags["uri"] = self.__request.request_uri[:256]
+
+        self.__trace.tags["status"] = self.__response.status_code
+        RequestTracer.record(self.__trace)
+        self.__trace = None
+
+    def __release_admission(self):
+        """ Releases the global admission slot taken by the request. See `AdmissionController` for more information.
+        """
+        if self.__admitted:
+            self.__admitted = False
+            AdmissionController.release()
+
+    @staticmethod
+    def __count_timeout(phase):
+        """ Counts a timeout for monitoring purposes.
+
+        Args:
+            phase (str): the phase where the timeout was exceeded, either "idle", "header", "body" or "write".
+        """
+        with HttpRequestHandler.__TIMEOUT_COUNTERS_LOCK:
+            HttpRequestHandler.__TIMEOUT_COUNTERS[phase] += 1
+
+    @staticmethod
+    def get_current_request():
+        """ Gets the request being handled, so the endpoint functions can read its headers, query string or body. In
+        the endpoints run in the process pool it is a copy of the request.
+
+        Returns:
+            The `HttpRequest`, or `None` if it is not called while handling a request.
+        """
+        return HttpRequest.get_current()
+
+    @staticmethod
+    def get_asset_url(file_path):
+        """ Gets the URL of an app file to be used in the pages, fingerprinted with its content hash if the asset
+        manifest is enabled, so the clients cache it forever. See `FileGetter.get_asset_url` for more information.
+
+        Args:
+            file_path (str): the name of the file, relative to the app folder.
+
+        Returns:
+            The absolute URL of the file.
+        """
+        return FileGetter.get_asset_url(file_path)
+
+    @staticmethod
+    def get_timeout_counters():
+        """ Gets how many connections have been closed because of each timeout.
+
+        Returns:
+            A `dict` of str: int with the counters of the "idle", "header", "body" and "write" timeouts.
+        """
+        with HttpRequestHandler.__TIMEOUT_COUNTERS_LOCK:
+            return dict(HttpRequestHandler.__TIMEOUT_COUNTERS)
+
     def __after_parsing(self):
         """ Just calls the `__hooks_execution` method with the name of the after parsing hook list.
         """
@@ -114,7 +346,47 @@ class HttpRequestHandler:
         # TODO: reference here the explanation of its hook method like: "See that method"
         hook_list = HttpRequestHandler.__HOOKS[hook_list_name]
         for function in hook_list:
-            function(self.__request, self.__response)
+            if self.__trace is None:
+                function(self.__request, self.__response)
+
+            else:
+                name = getattr(function, "__qualname__", repr(function))
+                with self.__span("hook:{}:{}".format(hook_list_name, name)):
+                    function(self.__request, self.__response)
+
+    def __handle_http2_request(self):
+        """ Checks if the client wants to use HTTP/2 and, if so, gives the connection to an `Http2Connection`, that
+        handles each of its streams with a new `HttpRequestHandler`. The client can either start with the HTTP/2
+        preface, that is parsed as a "PRI" request, or ask for the upgrade with the "Upgrade: h2c" header, in which
+        case the request is handled as the first stream after sending the 101 HTTP status code.
+
+        Returns:
+            `True` if the connection was handled as HTTP/2.
+        """
+        if isinstance(self.__client, Http2Stream):
+            return False
+
+        if self.__request.method == "PRI" and self.__request.request_uri == "*" and \
+                self.__request.http_version == "HTTP/2.0":
+            Http2Connection(self.__client, self.__address, HttpRequestHandler,
+                            data=self.__request.take_buffered_data()).serve()
+            return True
+
+        """ The "h2c" upgrade is only for connections without TLS, that choose HTTP/2 with ALPN instead, so it is
+        ignored for them.
+        """
+        upgrade = [value.strip().lower() for value in self.__request.headers.get("Upgrade", "").split(",")]
+        if "h2c" in upgrade and "HTTP2-Settings" in self.__request.headers and self.__request.scheme != "https":
+            response = HttpResponse()
+            response.status = 101
+            response.headers["Connection"] = "Upgrade"
+            response.headers["Upgrade"] = "h2c"
+            self.__client.sendall(response.build())
+            Http2Connection(self.__client, self.__address, HttpRequestHandler,
+                            data=self.__request.take_buffered_data(), upgrade_request=self.__request).serve()
+            return True
+
+        return False
 
     def __handle_web_socket_request(self, ws_handler):
         """ Sends the WebSocket handshake and delegates the handling to the class set in `ws_handler`.
@@ -122,20 +394,89 @@ class HttpRequestHandler:
         Args:
             ws_handler (WebSocketHandler): the WebSocketHandler class.
         """
-        self.__response.status = 101
-        self.__response.headers["Upgrade"] = "websocket"
-        self.__response.headers["Connection"] = "Upgrade"
-        hasher = hashlib.sha1()
-        header_hash = self.__request.headers["Sec-WebSocket-Key"] + "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
-        hasher.update(header_hash.encode("utf-8"))
-        self.__response.headers["Sec-WebSocket-Accept"] = base64.b64encode(hasher.digest()).decode("utf-8")
+        if isinstance(self.__client, Http2Stream):
+            """ WebSockets over HTTP/2 are not supported.
+            """
+            self.__response.body = None
+            self.__response.status = 400
+            return
+
+        with self.__span("websocket_upgrade"):
+            self.__response.status = 101
+            self.__response.headers["Upgrade"] = "websocket"
+            self.__response.headers["Connection"] = "Upgrade"
+            hasher = hashlib.sha1()
+            header_hash = self.__request.headers["Sec-WebSocket-Key"] + "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+            hasher.update(header_hash.encode("utf-8"))
+            self.__response.headers["Sec-WebSocket-Accept"] = base64.b64encode(hasher.digest()).decode("utf-8")
+
         self.__close_connection = False
         self.__end_handling()
         ws_handler(self.__client)
 
+    @staticmethod
+    def __get_proxy_prefix(request_uri):
+        """ Gets the proxy route that matches a request URI, the longest one if there are several.
+
+        Args:
+            request_uri (str): the request URI.
+
+        Returns:
+            The prefix of the proxy route, or `None` if no proxy route matches.
+        """
+        matches = [prefix for prefix in HttpRequestHandler.__PROXIES
+                   if request_uri == prefix or request_uri.startswith(prefix.rstrip("/") + "/")]
+        return max(matches, key=len) if matches else None
+
+    @staticmethod
+    def __is_streamed_request(request):
+        """ Checks if the body of a request has to be streamed instead of read before handling it, that is if the
+        request matches a proxy route, so it is streamed to the upstream, or if it is a multipart/form-data upload, so
+        the endpoint can parse it while it is received. See `MultipartParser` for more information.
+
+        Args:
+            request (HttpRequest): the request, with just the head parsed.
+
+        Returns:
+            `True` if the body has to be streamed.
+        """
+        content_type = request.headers.get("Content-Type", "")
+        return content_type.split(";", 1)[0].strip().lower() == "multipart/form-data" or \
+            HttpRequestHandler.__get_proxy_prefix(request.request_uri) is not None
+
+    def __handle_proxy_request(self, prefix):
+        """ Forwards the request to an upstream of the proxy route. If the route has a concurrency limit and it is
+        exceeded, sends a 503 HTTP error code to the client without forwarding it. See `ReverseProxy` for more
+        information.
+
+        Args:
+            prefix (str): the prefix of the proxy route.
+        """
+        try:
+            AdmissionController.admit(prefix)
+
+        except RequestRejectedException as e:
+            self.__set_service_unavailable(e.retry_after)
+            return
+
+        try:
+            HttpRequestHandler.__PROXIES[prefix].forward(self.__request, self.__response, self.__address, prefix)
+
+        except HttpRequestParseErrorException:
+            self.__response.status = 400
+
+        except HttpRequestTimeoutException as e:
+            self.__response.status = 408
+            self.__response.headers["Connection"] = "close"
+            self.__count_timeout(e.phase)
+
+        finally:
+            AdmissionController.release(prefix)
+
     def __handle_app_request(self):
         """ Handles a file request. If the request is not GET or HEAD, sends a 405 HTTP error code to the client. If the
-        file doesn't exist, sends a 404 HTTP error code to the client.
+        file doesn't exist, sends a 404 HTTP error code to the client. If the client already has the file, identified by
+        its "ETag", sends a 304 HTTP code without it.
         """
         allowed_methods = ["GET", "HEAD"]
         if self.__request.method not in allowed_methods:
@@ -144,10 +485,22 @@ class HttpRequestHandler:
         else:
             request_uri = self.__request.request_uri[1:]
             try:
-                self.__response.body, self.__response.headers["Content-Type"] = FileGetter.get_file(request_uri)
+                accept_encoding = self.__request.headers.get("Accept-Encoding", "")
+                data, headers = FileGetter.get_asset(request_uri, accept_encoding)
 
             except IOError:
                 self.__response.status = 404
+                return
+
+            self.__response.headers.update(headers)
+            if_none_match = self.__request.headers.get("If-None-Match")
+            if "ETag" in headers and if_none_match is not None and \
+                    (headers["ETag"] in [tag.strip() for tag in if_none_match.split(",")] or if_none_match == "*"):
+                self.__response.status = 304
+                self.__response.headers.pop("Content-Type", None)
+
+            else:
+                self.__response.body = data
 
     def __handle_api_request(self):
         """ Handles an API request. It supports static and dynamic API requests. To make a dynamic API endpoint, the
@@ -171,7 +524,7 @@ class HttpRequestHandler:
             the client.
             """
             if request_method in resource:
-                self.__end_api_request(request_method, resource)
+                self.__end_api_request(request_method, resource, request_uri)
 
             else:
                 self.__set_method_not_allowed(resource.keys())
@@ -196,7 +549,7 @@ class HttpRequestHandler:
                             """ Gets the arguments from the request URI.
                             """
                             arguments = self.__get_arguments_from_dynamic_uri(regex, request_uri)
-                            self.__end_api_request(request_method, resource, arguments)
+                            self.__end_api_request(request_method, resource, uri, arguments)
 
                         else:
                             self.__set_method_not_allowed(resource.keys())
@@ -218,18 +571,91 @@ class HttpRequestHandler:
         self.__response.status = 405
         self.__response.headers["Allow"] = ", ".join(allowed_methods)
 
-    def __end_api_request(self, request_method, resource, arguments=list()):
-        """ Ends the API request. Sets the result of the execution of the endpoint function to the body of the response.
-        If the function has a WebSocket handler class associated, gives the handling of the client to this class.
+    def __set_internal_server_error(self):
+        """ Logs the exception being handled and replaces the response with an empty one with the 500 HTTP error code,
+        closing the stream of the response that was being built, if any.
+        """
+        traceback.print_exc()
+        if hasattr(self.__response.stream, "close"):
+            self.__response.stream.close()
+
+        self.__response = HttpResponse()
+        self.__response.status = 500
+
+    def __set_service_unavailable(self, retry_after):
+        """ Sets the 503 HTTP error code and the seconds to wait before retrying in the response.
+
+        Args:
+            retry_after (int): the seconds to wait before retrying.
+        """
+        self.__response.status = 503
+        self.__response.headers["Retry-After"] = str(retry_after)
+
+    def __end_api_request(self, request_method, resource, route, arguments=list()):
+        """ Ends the API request. Sets the result of the execution of the endpoint function to the body of the response,
+        serialized to JSON if it is a `dict`, `list`, `tuple` or dataclass instance. If the route has a concurrency
+        limit and it is exceeded, sends a 503 HTTP error code to the client without calling the function. If the
+        function runs in the process pool, sends a 503 HTTP error code if the pool is full and a 504 HTTP error code if
+        the function doesn't return in time. If the function reads a body that is malformed, too slow or too big,
+        sends a 400, 408 or 413 HTTP error code. If the function has a WebSocket handler class associated, gives the
+        handling of the client to this class.
 
         Args:
             request_method (str): the request method.
             resource (dict of str: obj): the function with its optional parameters.
+            route (str): the route of the endpoint, as it was given to the endpoint decorator.
             arguments (list of obj): the arguments given by the dynamic URI.
         """
         function_dict = resource[request_method]
         function = function_dict["function"]
-        self.__response.body = function(*arguments)
+        try:
+            AdmissionController.admit(route)
+
+        except RequestRejectedException as e:
+            self.__set_service_unavailable(e.retry_after)
+            return
+
+        try:
+            with self.__span("endpoint"):
+                if function_dict["executor"] == "process":
+                    body = ProcessExecutor.run(function, arguments, self.__request)
+
+                else:
+                    body = function(*arguments)
+
+            if JsonEncoder.is_serializable(body):
+                with self.__span("serialize"):
+                    body = JsonEncoder.encode(body)
+
+                self.__response.headers["Content-Type"] = "application/json"
+
+            self.__response.body = body
+
+        except RequestRejectedException as e:
+            self.__set_service_unavailable(e.retry_after)
+            return
+
+        except ProcessCallTimeoutException:
+            self.__response.status = 504
+            return
+
+        except HttpRequestParseErrorException:
+            self.__response.status = 400
+            return
+
+        except HttpRequestTimeoutException as e:
+            self.__response.status = 408
+            self.__response.headers["Connection"] = "close"
+            self.__count_timeout(e.phase)
+            return
+
+        except MultipartSizeLimitException:
+            self.__response.status = 413
+            return
+
+        finally:
+            AdmissionController.release(route)
+
         ws_handler = function_dict["ws_handler"]
         if ws_handler is not None:
             self.__handle_web_socket_request(ws_handler)
@@ -243,7 +669,23 @@ class HttpRequestHandler:
 
         Raises:
             ApiUriWrongSyntaxException: if the API URI has wrong syntax.
+            ConcurrencyLimitWrongTypeException: if any of the concurrency limit options has an incorrect type.
+            AdaptiveSheddingWithoutQueueException: if the adaptive shedding is enabled without "max_concurrency" and
+                "admission_queue".
+            TimeoutsWrongTypeException: if the timeouts object has an incorrect structure.
+            JsonEncoderWrongTypeException: if the JSON encoder is not valid.
+            ProfilingConfigWrongTypeException: if the tracing or profiling object has an incorrect structure.
+            ProcessPoolConfigWrongTypeException: if the process pool object has an incorrect structure.
+            AssetManifestConfigWrongTypeException: if the asset manifest object has an incorrect structure.
+            TlsConfigWrongTypeException: if the TLS object has an incorrect structure.
+            WebSocketBusConfigWrongTypeException: if the WebSocket bus object has an incorrect structure.
         """
+        if ProcessExecutor.is_in_worker():
+            """ The app is imported again in the workers of the process pool, that don't serve requests, so the options
+            that open files, start threads or scan the app folder are not applied there.
+            """
+            config = {key: value for key, value in config.items() if key not in HttpRequestHandler.__SERVER_OPTIONS}
+
         if "api_uri" in config:
             """ Configures the base API URI.
             """
@@ -264,6 +706,89 @@ class HttpRequestHandler:
             """
             FileGetter.set_file_mappings(config["file_mappings"])
 
+        if "tls" in config:
+            """ Enables or disables TLS on the accepted connections. See `TlsContext` for more information.
+            """
+            TlsContext.set_tls(config["tls"])
+
+        if "websocket_bus" in config:
+            """ Configures the bus that delivers messages to the WebSocket connections of every worker. See
+            `WebSocketBus` for more information.
+            """
+            WebSocketBus.set_bus(config["websocket_bus"])
+
+        if "asset_manifest" in config:
+            """ Enables or disables the in-memory manifest of the app files. See `FileGetter` for more information.
+            """
+            FileGetter.set_asset_manifest(config["asset_manifest"])
+
+        if "adaptive_shedding" in config and config["adaptive_shedding"] is None:
+            """ Disables the adaptive mode before the limits, so the limit and the queue it needs can be removed in the
+            same call.
+            """
+            AdmissionController.set_adaptive_shedding(None)
+
+        if "max_concurrency" in config:
+            """ Configures the maximum amount of requests handled at the same time.
+            """
+            AdmissionController.set_max_concurrency(config["max_concurrency"])
+
+        if "route_concurrency" in config:
+            """ Configures the maximum amount of requests handled at the same time for each API route.
+            """
+            AdmissionController.set_route_concurrency(config["route_concurrency"])
+
+        if "retry_after" in config:
+            """ Configures the seconds the rejected clients are told to wait before retrying.
+            """
+            AdmissionController.set_retry_after(config["retry_after"])
+
+        if "admission_queue" in config:
+            """ Configures the queue where the requests wait for a slot when the maximum concurrency is reached.
+            """
+            AdmissionController.set_queue(config["admission_queue"])
+
+        if "adaptive_shedding" in config:
+            """ Configures the load shedding based on the queueing delay of the requests.
+            """
+            AdmissionController.set_adaptive_shedding(config["adaptive_shedding"])
+
+        if "timeouts" in config:
+            """ Configures the timeouts that protect the server from slow clients.
+            """
+            HttpRequest.set_timeouts(config["timeouts"])
+
+        if "json_encoder" in config:
+            """ Configures the encoder of the values returned by the endpoints. See `JsonEncoder` for more information.
+            """
+            JsonEncoder.set_encoder(config["json_encoder"])
+
+        if "tracing" in config:
+            """ Enables or disables the tracing of the requests. The process ID is appended to the path, so the workers
+            of `HttpServer` don't overwrite the traces of each other. See `RequestTracer` for more information.
+            """
+            RequestTracer.set_tracing(config["tracing"])
+
+        if "profiling" in config:
+            """ Starts sampling the stacks with the given options, or stops it if `None`. The process ID is appended to
+            the output path, so each worker of `HttpServer` dumps its own stacks. See `SamplingProfiler` for more
+            information.
+            """
+            if config["profiling"] is None:
+                SamplingProfiler.stop()
+
+            elif isinstance(config["profiling"], dict):
+                SamplingProfiler.start(**config["profiling"])
+
+            else:
+                raise ProfilingConfigWrongTypeException(config["profiling"])
+
+        if "process_pool" in config:
+            """ Configures the pool of processes of the endpoints with the process executor. See `ProcessExecutor` for
+            more information.
+            """
+            ProcessExecutor.set_process_pool(config["process_pool"])
+
     @staticmethod
     def __get_regex_from_dynamic_uri(uri):
         """ Generates a regular expression given by a dynamic URI.
@@ -326,130 +851,189 @@ class HttpRequestHandler:
     """
 
     @staticmethod
-    def get(uri, ws_handler=None):
+    def get(uri, ws_handler=None, executor=None):
         """ Makes an endpoint with the method GET.
 
         Args:
             uri (str): the endpoint URI.
             ws_handler (WebSocketHandler): an optional WebSocket handler class, in case the request opens a WebSocket
                 connection.
+            executor (str): "process" to run the function in the process pool, or `None` to run it in the thread of
+                the request.
         """
-        return HttpRequestHandler.__method("GET", uri, ws_handler)
+        return HttpRequestHandler.__method("GET", uri, ws_handler, executor)
 
     @staticmethod
-    def post(uri, ws_handler=None):
+    def post(uri, ws_handler=None, executor=None):
         """ Makes an endpoint with the method POST.
 
         Args:
             uri (str): the endpoint URI.
             ws_handler (WebSocketHandler): an optional WebSocket handler class, in case the request opens a WebSocket
                 connection.
+            executor (str): "process" to run the function in the process pool, or `None` to run it in the thread of
+                the request.
         """
-        return HttpRequestHandler.__method("POST", uri, ws_handler)
+        return HttpRequestHandler.__method("POST", uri, ws_handler, executor)
 
     @staticmethod
-    def head(uri, ws_handler=None):
+    def head(uri, ws_handler=None, executor=None):
         """ Makes an endpoint with the method HEAD.
 
         Args:
             uri (str): the endpoint URI.
             ws_handler (WebSocketHandler): an optional WebSocket handler class, in case the request opens a WebSocket
                 connection.
+            executor (str): "process" to run the function in the process pool, or `None` to run it in the thread of
+                the request.
         """
-        return HttpRequestHandler.__method("HEAD", uri, ws_handler)
+        return HttpRequestHandler.__method("HEAD", uri, ws_handler, executor)
 
     @staticmethod
-    def put(uri, ws_handler=None):
+    def put(uri, ws_handler=None, executor=None):
         """ Makes an endpoint with the method PUT.
 
         Args:
             uri (str): the endpoint URI.
             ws_handler (WebSocketHandler): an optional WebSocket handler class, in case the request opens a WebSocket
                 connection.
+            executor (str): "process" to run the function in the process pool, or `None` to run it in the thread of
+                the request.
         """
-        return HttpRequestHandler.__method("PUT", uri, ws_handler)
+        return HttpRequestHandler.__method("PUT", uri, ws_handler, executor)
 
     @staticmethod
-    def delete(uri, ws_handler=None):
+    def delete(uri, ws_handler=None, executor=None):
         """ Makes an endpoint with the method DELETE.
 
         Args:
             uri (str): the endpoint URI.
             ws_handler (WebSocketHandler): an optional WebSocket handler class, in case the request opens a WebSocket
                 connection.
+            executor (str): "process" to run the function in the process pool, or `None` to run it in the thread of
+                the request.
         """
-        return HttpRequestHandler.__method("DELETE", uri, ws_handler)
+        return HttpRequestHandler.__method("DELETE", uri, ws_handler, executor)
 
     @staticmethod
-    def trace(uri, ws_handler=None):
+    def trace(uri, ws_handler=None, executor=None):
         """ Makes an endpoint with the method TRACE.
 
         Args:
             uri (str): the endpoint URI.
             ws_handler (WebSocketHandler): an optional WebSocket handler class, in case the request opens a WebSocket
                 connection.
+            executor (str): "process" to run the function in the process pool, or `None` to run it in the thread of
+                the request.
         """
-        return HttpRequestHandler.__method("TRACE", uri, ws_handler)
+        return HttpRequestHandler.__method("TRACE", uri, ws_handler, executor)
 
     @staticmethod
-    def options(uri, ws_handler=None):
+    def options(uri, ws_handler=None, executor=None):
         """ Makes an endpoint with the method OPTIONS.
 
         Args:
             uri (str): the endpoint URI.
             ws_handler (WebSocketHandler): an optional WebSocket handler class, in case the request opens a WebSocket
                 connection.
+            executor (str): "process" to run the function in the process pool, or `None` to run it in the thread of
+                the request.
         """
-        return HttpRequestHandler.__method("OPTIONS", uri, ws_handler)
+        return HttpRequestHandler.__method("OPTIONS", uri, ws_handler, executor)
 
     @staticmethod
-    def connect(uri, ws_handler=None):
+    def connect(uri, ws_handler=None, executor=None):
         """ Makes an endpoint with the method CONNECT.
 
         Args:
             uri (str): the endpoint URI.
             ws_handler (WebSocketHandler): an optional WebSocket handler class, in case the request opens a WebSocket
                 connection.
+            executor (str): "process" to run the function in the process pool, or `None` to run it in the thread of
+                the request.
         """
-        return HttpRequestHandler.__method("CONNECT", uri, ws_handler)
+        return HttpRequestHandler.__method("CONNECT", uri, ws_handler, executor)
 
     @staticmethod
-    def patch(uri, ws_handler=None):
+    def patch(uri, ws_handler=None, executor=None):
         """ Makes an endpoint with the method PATCH.
 
         Args:
             uri (str): the endpoint URI.
             ws_handler (WebSocketHandler): an optional WebSocket handler class, in case the request opens a WebSocket
                 connection.
+            executor (str): "process" to run the function in the process pool, or `None` to run it in the thread of
+                the request.
         """
-        return HttpRequestHandler.__method("PATCH", uri, ws_handler)
+        return HttpRequestHandler.__method("PATCH", uri, ws_handler, executor)
 
     @staticmethod
-    def __method(method, uri, ws_handler):
-        """ Makes the actual endpoint.
+    def __method(method, uri, ws_handler, executor):
+        """ Makes the actual endpoint. The wrapper returns the function, so it keeps its name in its module, that the
+        workers of the process pool need to import it. Registering the first function with the process executor
+        starts the pool.
 
         Args:
             method (str): the method that has to be used for this URI.
             uri (str): the endpoint URI.
             ws_handler (WebSocketHandler): an optional WebSocket handler class, in case the request opens a WebSocket
                 connection.
+            executor (str): "process" to run the function in the process pool, or `None`.
         Returns:
             The wrapper function.
 
         Raises:
             ApiRouteWrongSyntaxException: if the URI has wrong syntax.
+            EndpointExecutorWrongTypeException: if the executor is not valid.
         """
         if not uri.startswith("/"):
             raise ApiRouteWrongSyntaxException(uri)
 
+        if executor not in [None, "process"]:
+            raise EndpointExecutorWrongTypeException(executor)
+
         def wrap(f):
             if uri not in HttpRequestHandler.__ENDPOINTS:
                 HttpRequestHandler.__ENDPOINTS[uri] = {}
 
-            HttpRequestHandler.__ENDPOINTS[uri][method] = {"function": f, "ws_handler": ws_handler}
+            HttpRequestHandler.__ENDPOINTS[uri][method] = {"function": f, "ws_handler": ws_handler,
+                                                           "executor": executor}
+            if executor == "process":
+                ProcessExecutor.start()
+
+            return f
 
         return wrap
 
+    @staticmethod
+    def proxy(uri, upstreams, balance="round_robin", pool_size=10, idle_timeout=60, timeout=30, health_path=None,
+              health_interval=10, strip_prefix=False):
+        """ Makes a proxy route, that forwards every request whose URI is the given one or starts with it followed by
+        "/" to the upstreams, whatever their method is. The proxy routes are checked before the API and the app.
+
+        Args:
+            uri (str): the prefix of the route.
+            upstreams (list of str): the base URLs of the upstream servers, like "http://127.0.0.1:8000".
+            balance (str): the balancing strategy, either "round_robin" or "least_connections".
+            pool_size (int): the maximum amount of connections to each upstream.
+            idle_timeout (float): the seconds a pooled connection can be idle before it is closed.
+            timeout (float): the seconds to wait for a pooled connection, to connect to the upstream and for each read
+                from it.
+            health_path (str): the path requested to check the health of the upstreams, or `None` to just connect to
+                them.
+            health_interval (float): the seconds between health checks.
+            strip_prefix (bool): `True` to remove the prefix from the path sent to the upstream.
+
+        Raises:
+            ApiRouteWrongSyntaxException: if the URI has wrong syntax.
+            ProxyConfigWrongTypeException: if any of the options has an incorrect type.
+        """
+        if not uri.startswith("/"):
+            raise ApiRouteWrongSyntaxException(uri)
+
+        HttpRequestHandler.__PROXIES[uri] = ReverseProxy(upstreams, balance, pool_size, idle_timeout, timeout,
+                                                         health_path, health_interval, strip_prefix)
+
     """ Hook decorators
     """
 
@@ -499,6 +1083,14 @@ class ApiUriWrongSyntaxException(Exception):
         super().__init__(message)
 
 
+class EndpointExecutorWrongTypeException(Exception):
+    """ Exception to be raised when the executor of an endpoint is not valid.
+    """
+    def __init__(self, executor):
+        message = "Endpoint executor should be 'process' or `None`, '{}' was given".format(executor)
+        super().__init__(message)
+
+
 class StopHandlingRequestException(Exception):
     """ Exception to be raised when the request handling has to be stopped after the request parsing.
     """
@@ -7,6 +7,9 @@ class HttpResponse:
         http_version (str): the HTTP version, set to "HTTP/1.1" by default.
         headers (dict of str: str): a dict containing the headers.
         body (str): the body.
+        stream (iterable of bytes): an optional body that is sent chunk by chunk after the built response, without
+            buffering it whole. The "Content-Length" header is not set for it, so if its length is not known, the
+            connection has to be closed to end it.
     """
     __HTTP_STATUS = {
         100: "Continue",
@@ -25,6 +28,7 @@ class HttpResponse:
         304: "Not Modified",
         305: "Use Proxy",
         307: "Temporary Redirect",
+        308: "Permanent Redirect",
         400: "Bad Request",
         401: "Unauthorized",
         402: "Payment Required",
@@ -43,6 +47,8 @@ class HttpResponse:
         415: "Unsupported Media Type",
         416: "Request Range Not Satisfiable",
         417: "Expectation Failed",
+        422: "Unprocessable Entity",
+        429: "Too Many Requests",
         500: "Internal Server Error",
         501: "Not Implemented",
         502: "Bad Gateway",
@@ -51,6 +57,14 @@ class HttpResponse:
         505: "HTTP Version Not Supported"
     }
 
+    __HTTP_STATUS_CLASSES = {
+        1: "Informational",
+        2: "Success",
+        3: "Redirection",
+        4: "Client Error",
+        5: "Server Error"
+    }
+
     def __init__(self):
         self.headers = dict()
         self.__status = None
@@ -58,6 +72,7 @@ class HttpResponse:
         self.status = 204
         self.http_version = "HTTP/1.1"
         self.__body = None
+        self.stream = None
 
     @property
     def status_code(self):
@@ -89,7 +104,14 @@ class HttpResponse:
             self.__status = status_str
 
         except KeyError:
-            self.__status = "501 " + self.__HTTP_STATUS[501]
+            """ The valid codes without a known text, like the ones given by a proxied upstream, get the generic text of
+            their class.
+            """
+            if isinstance(status_code, int) and 100 <= status_code <= 599:
+                self.__status = status_str + self.__HTTP_STATUS_CLASSES[status_code // 100]
+
+            else:
+                self.__status = "501 " + self.__HTTP_STATUS[501]
 
     @property
     def body(self):
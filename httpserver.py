@@ -0,0 +1,325 @@
+import argparse
+import importlib
+import os
+import select
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from httprequesthandler import HttpRequestHandler
+from tlscontext import TlsContext
+from websocketbus import WebSocketBus
+
+
+class HttpServer:
+    """ Serves the requests with `HttpRequestHandler` in pre-forked worker processes that share one listening socket.
+    Each worker imports the app module, that registers the endpoints and hooks and configures the handler, and handles
+    every connection in its own thread.
+
+    Sending SIGHUP to the server reloads the app without downtime: it starts a new generation of workers that inherit
+    the already bound listening socket, waits until they have imported the app, and then tells the old workers to stop
+    accepting connections and to exit once their in-flight requests, WebSockets included, are finished or the drain
+    timeout expires. The listening socket is never closed, so no connection is refused during the reload. SIGTERM and
+    SIGINT drain every worker the same way and stop the server.
+    """
+    __READY_TIMEOUT = 60
+
+    __POLL_INTERVAL = 0.5
+
+    def __init__(self, app, host="0.0.0.0", port=8080, workers=1, drain_timeout=30):
+        """ Binds the listening socket.
+
+        Args:
+            app (str): the name of the app module, it has to be importable by the workers.
+            host (str): the host to listen on.
+            port (int): the port to listen on.
+            workers (int): the amount of worker processes.
+            drain_timeout (float): the seconds the old workers have to finish their in-flight requests when they are
+                stopped.
+        """
+        self.__app = app
+        self.__workers = workers
+        self.__drain_timeout = drain_timeout
+        self.__generation = []
+        self.__draining = []
+        self.__reload = False
+        self.__stop = False
+        """ Every generation of workers gets the same secret for the TLS ticket keys, so the clients can resume their
+        sessions with any worker, even after a reload. It is sent through a pipe, not to leave it in the environment.
+        """
+        self.__ticket_secret = os.urandom(32)
+        """ The workers find each other in the bus directory to deliver the WebSocket messages. See `WebSocketBus` for
+        more information.
+        """
+        self.__bus_directory = tempfile.mkdtemp(prefix="websocketbus-")
+        self.__socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.__socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.__socket.bind((host, port))
+        self.__socket.listen(socket.SOMAXCONN)
+        self.__socket.set_inheritable(True)
+
+    def run(self):
+        """ Starts the workers and supervises them until the server is stopped, restarting the ones that die and
+        reloading them on SIGHUP.
+        """
+        signal.signal(signal.SIGHUP, self.__on_reload)
+        signal.signal(signal.SIGTERM, self.__on_stop)
+        signal.signal(signal.SIGINT, self.__on_stop)
+        self.__generation = self.__start_generation()
+        if self.__generation is None:
+            raise WorkerStartFailedException(self.__app)
+
+        print("Serving {} on {}:{} with {} workers".format(self.__app, *self.__socket.getsockname(), self.__workers))
+        while not self.__stop:
+            time.sleep(HttpServer.__POLL_INTERVAL)
+            if self.__reload:
+                self.__reload = False
+                self.__reload_workers()
+
+            for i, process in enumerate(self.__generation):
+                if process.poll() is not None and not self.__stop:
+                    """ A worker died unexpectedly, it is replaced by a new one.
+                    """
+                    print("Worker {} exited with code {}, restarting it".format(process.pid, process.returncode))
+                    replacement = self.__start_generation(1)
+                    if replacement is not None:
+                        self.__generation[i] = replacement[0]
+
+            self.__reap_draining()
+
+        self.__drain(self.__generation)
+        while self.__draining:
+            time.sleep(HttpServer.__POLL_INTERVAL)
+            self.__reap_draining()
+
+        self.__socket.close()
+        shutil.rmtree(self.__bus_directory, ignore_errors=True)
+
+    def __on_reload(self, signum, frame):
+        """ Handles SIGHUP, the reload is done in the supervision loop.
+        """
+        self.__reload = True
+
+    def __on_stop(self, signum, frame):
+        """ Handles SIGTERM and SIGINT, the stop is done in the supervision loop.
+        """
+        self.__stop = True
+
+    def __reload_workers(self):
+        """ Replaces the current generation of workers with a new one. If the new workers cannot start, for example
+        because the new version of the app cannot be imported, the current workers keep serving.
+        """
+        print("Reloading {}".format(self.__app))
+        generation = self.__start_generation()
+        if generation is None:
+            print("The new workers failed to start, keeping the current ones")
+            return
+
+        self.__drain(self.__generation)
+        self.__generation = generation
+
+    def __start_generation(self, workers=None):
+        """ Starts worker processes and waits until every one of them has imported the app and is accepting
+        connections.
+
+        Args:
+            workers (int): the amount of workers, all the configured ones by default.
+
+        Returns:
+            A `list` of `subprocess.Popen` with the processes, or `None` if any of them failed to start, in which case
+            the others are stopped.
+        """
+        generation = []
+        ready_fds = []
+        env = dict(os.environ)
+        env["PYTHONPATH"] = os.pathsep.join([path for path in sys.path if path])
+        env[WebSocketBus.DIRECTORY_VARIABLE] = self.__bus_directory
+        for _ in range(workers or self.__workers):
+            ready_read, ready_write = os.pipe()
+            secret_read, secret_write = os.pipe()
+            process = subprocess.Popen([sys.executable, os.path.abspath(__file__), self.__app, "--worker",
+                                        "--fd", str(self.__socket.fileno()), "--ready-fd", str(ready_write),
+                                        "--secret-fd", str(secret_read), "--drain-timeout", str(self.__drain_timeout)],
+                                       pass_fds=(self.__socket.fileno(), ready_write, secret_read), env=env)
+            os.close(ready_write)
+            os.close(secret_read)
+            """ The secret fits in the pipe buffer, so writing it doesn't wait for the worker.
+            """
+            os.write(secret_write, self.__ticket_secret)
+            os.close(secret_write)
+            generation.append(process)
+            ready_fds.append(ready_read)
+
+        """ Each worker writes one byte to its pipe when it is ready, or closes it without writing if it dies.
+        """
+        deadline = time.monotonic() + HttpServer.__READY_TIMEOUT
+        pending = list(ready_fds)
+        failed = False
+        while pending and not failed and time.monotonic() < deadline:
+            readable, _, _ = select.select(pending, [], [], max(0, deadline - time.monotonic()))
+            for fd in readable:
+                if os.read(fd, 1) != b"1":
+                    failed = True
+
+                pending.remove(fd)
+
+        for fd in ready_fds:
+            os.close(fd)
+
+        if failed or pending:
+            for process in generation:
+                process.kill()
+                process.wait()
+
+            return None
+
+        return generation
+
+    def __drain(self, generation):
+        """ Tells workers to stop accepting connections and to exit once their in-flight requests are finished.
+
+        Args:
+            generation (list of subprocess.Popen): the workers.
+        """
+        for process in generation:
+            if process.poll() is None:
+                process.send_signal(signal.SIGTERM)
+
+            self.__draining.append((process, time.monotonic()))
+
+    def __reap_draining(self):
+        """ Forgets the draining workers that have exited and kills the ones that exceeded the drain timeout by far.
+        """
+        still_draining = []
+        for process, since in self.__draining:
+            if process.poll() is not None:
+                continue
+
+            if time.monotonic() - since > self.__drain_timeout + 10:
+                process.kill()
+                process.wait()
+                continue
+
+            still_draining.append((process, since))
+
+        self.__draining = still_draining
+
+
+class HttpServerWorker:
+    """ A worker process of `HttpServer`. It accepts connections from the inherited listening socket until it receives
+    SIGTERM, and then waits for the in-flight connections before exiting.
+    """
+    __ACCEPT_TIMEOUT = 0.5
+
+    __ACCEPT_BACKOFF = 0.1
+
+    def __init__(self, app, fd, ready_fd, secret_fd, drain_timeout):
+        """ Imports the app and tells the server it is ready.
+
+        Args:
+            app (str): the name of the app module.
+            fd (int): the file descriptor of the listening socket.
+            ready_fd (int): the file descriptor of the pipe where the worker tells the server it is ready.
+            secret_fd (int): the file descriptor of the pipe where the server sends the secret of the TLS ticket keys.
+            drain_timeout (float): the seconds the in-flight connections have to finish once the worker is stopped.
+        """
+        self.__socket = socket.socket(fileno=fd)
+        self.__drain_timeout = drain_timeout
+        self.__stop = threading.Event()
+        self.__connections = set()
+        self.__connections_lock = threading.Lock()
+        signal.signal(signal.SIGTERM, lambda signum, frame: self.__stop.set())
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        signal.signal(signal.SIGHUP, signal.SIG_IGN)
+        with os.fdopen(secret_fd, "rb") as f:
+            TlsContext.set_ticket_secret(f.read())
+
+        importlib.import_module(app)
+        os.write(ready_fd, b"1")
+        os.close(ready_fd)
+
+    def run(self):
+        """ Accepts connections until the worker is stopped, then drains the in-flight ones.
+        """
+        """ The timeout lets the loop notice the stop, and makes `accept` give up when another worker takes the
+        connection first.
+        """
+        self.__socket.settimeout(HttpServerWorker.__ACCEPT_TIMEOUT)
+        while not self.__stop.is_set():
+            try:
+                client, address = self.__socket.accept()
+
+            except (socket.timeout, InterruptedError):
+                continue
+
+            except OSError as e:
+                """ Running out of file descriptors, or a connection aborted before it is accepted, must not stop the
+                worker. The backoff lets the in-flight connections free some descriptors instead of spinning.
+                """
+                print("Worker {} failed to accept a connection: {}".format(os.getpid(), e))
+                self.__stop.wait(HttpServerWorker.__ACCEPT_BACKOFF)
+                continue
+
+            thread = threading.Thread(target=self.__handle, args=(client, address), daemon=True)
+            with self.__connections_lock:
+                self.__connections.add(thread)
+
+            thread.start()
+
+        """ Closing this process copy of the listening socket stops accepting, the socket stays open in the server and
+        the other workers.
+        """
+        self.__socket.close()
+        deadline = time.monotonic() + self.__drain_timeout
+        while time.monotonic() < deadline:
+            with self.__connections_lock:
+                if not self.__connections:
+                    break
+
+            time.sleep(0.05)
+
+    def __handle(self, client, address):
+        """ Handles a connection and forgets it once it is finished.
+        """
+        try:
+            HttpRequestHandler(client, address)
+
+        finally:
+            with self.__connections_lock:
+                self.__connections.discard(threading.current_thread())
+
+
+class WorkerStartFailedException(Exception):
+    """ Exception to be raised if the workers cannot start.
+    """
+    def __init__(self, app):
+        message = "The workers failed to start the app '{}'".format(app)
+        super().__init__(message)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serves an app with pre-forked workers, send SIGHUP to reload it.")
+    parser.add_argument("app", help="the app module, that registers the endpoints and configures the handler")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--drain-timeout", type=float, default=30)
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--fd", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--ready-fd", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--secret-fd", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.worker:
+        HttpServerWorker(args.app, args.fd, args.ready_fd, args.secret_fd, args.drain_timeout).run()
+
+    else:
+        HttpServer(args.app, args.host, args.port, args.workers, args.drain_timeout).run()
+
+
+if __name__ == "__main__":
+    main()
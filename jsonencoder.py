@@ -0,0 +1,186 @@
+import collections
+import dataclasses
+import json
+import threading
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class JsonEncoder:
+    """ Serializes the values returned by the endpoints to JSON. The `dict`, `list` and `tuple` values and the
+    dataclass instances are serialized with orjson if it is installed, or with the standard `json` module with
+    compact separators otherwise, unless another encoder is configured.
+
+    The encoded bytes of deeply immutable values, `tuple` and frozen dataclass instances containing only immutable
+    values, are memoized by identity, so an endpoint returning a constant is encoded only once. The mutable values are
+    always encoded, as they may change between requests.
+    """
+    __ENCODER = None
+
+    __CACHE = collections.OrderedDict()
+
+    __CACHE_SIZE = 256
+
+    __LOCK = threading.Lock()
+
+    __SCALAR_TYPES = (str, int, float, bool, type(None))
+
+    @staticmethod
+    def is_serializable(value):
+        """ Checks if a value returned by an endpoint has to be serialized.
+
+        Args:
+            value (obj): the value.
+
+        Returns:
+            `True` if the value is a `dict`, `list`, `tuple` or dataclass instance.
+        """
+        return isinstance(value, (dict, list, tuple)) or \
+            (dataclasses.is_dataclass(value) and not isinstance(value, type))
+
+    @staticmethod
+    def encode(value):
+        """ Encodes a value to JSON.
+
+        Args:
+            value (obj): the value.
+
+        Returns:
+            The JSON `bytes`.
+        """
+        with JsonEncoder.__LOCK:
+            entry = JsonEncoder.__CACHE.get(id(value))
+            if entry is not None and entry[0] is value:
+                JsonEncoder.__CACHE.move_to_end(id(value))
+                return entry[1]
+
+            encoder = JsonEncoder.__ENCODER
+
+        encoded = (encoder or JsonEncoder.__default_encoder())(value)
+        if JsonEncoder.__is_immutable(value):
+            """ The entry keeps a reference to the value, so its id cannot be reused by another object while it is
+            cached.
+            """
+            with JsonEncoder.__LOCK:
+                if JsonEncoder.__ENCODER is encoder:
+                    JsonEncoder.__CACHE[id(value)] = (value, encoded)
+                    if len(JsonEncoder.__CACHE) > JsonEncoder.__CACHE_SIZE:
+                        JsonEncoder.__CACHE.popitem(last=False)
+
+        return encoded
+
+    @staticmethod
+    def set_encoder(encoder):
+        """ Sets the encoder.
+
+        Args:
+            encoder (str|function): "json" for the standard `json` module, "orjson" for orjson, a function that gets
+                a value and returns its JSON `bytes`, or `None` to use orjson if it is installed.
+
+        Raises:
+            JsonEncoderWrongTypeException: if the encoder is not valid or orjson is not installed.
+        """
+        if encoder == "json":
+            encoder = JsonEncoder.__json_encoder
+
+        elif encoder == "orjson":
+            if orjson is None:
+                raise JsonEncoderWrongTypeException(encoder)
+
+            encoder = JsonEncoder.__orjson_encoder
+
+        elif encoder is not None and not callable(encoder):
+            raise JsonEncoderWrongTypeException(encoder)
+
+        with JsonEncoder.__LOCK:
+            JsonEncoder.__ENCODER = encoder
+            JsonEncoder.__CACHE.clear()
+
+    @staticmethod
+    def __default_encoder():
+        """ Gets the encoder used if none is configured.
+
+        Returns:
+            The encoder function.
+        """
+        if orjson is not None:
+            return JsonEncoder.__orjson_encoder
+
+        return JsonEncoder.__json_encoder
+
+    @staticmethod
+    def __json_encoder(value):
+        """ Encodes a value with the standard `json` module.
+
+        Args:
+            value (obj): the value.
+
+        Returns:
+            The JSON `bytes`.
+        """
+        return json.dumps(value, separators=(",", ":"), ensure_ascii=False,
+                          default=JsonEncoder.__json_default).encode("utf-8")
+
+    @staticmethod
+    def __json_default(value):
+        """ Converts the dataclass instances found by the standard `json` module to a `dict`.
+
+        Args:
+            value (obj): the value that cannot be serialized.
+
+        Returns:
+            A `dict` with the fields of the dataclass instance.
+
+        Raises:
+            TypeError: if the value is not a dataclass instance.
+        """
+        if dataclasses.is_dataclass(value) and not isinstance(value, type):
+            return {field.name: getattr(value, field.name) for field in dataclasses.fields(value)}
+
+        raise TypeError("Object of type {} is not JSON serializable".format(type(value).__name__))
+
+    @staticmethod
+    def __orjson_encoder(value):
+        """ Encodes a value with orjson.
+
+        Args:
+            value (obj): the value.
+
+        Returns:
+            The JSON `bytes`.
+        """
+        return orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS)
+
+    @staticmethod
+    def __is_immutable(value):
+        """ Checks if a value and every value inside it are immutable.
+
+        Args:
+            value (obj): the value.
+
+        Returns:
+            `True` if the value is deeply immutable.
+        """
+        if isinstance(value, JsonEncoder.__SCALAR_TYPES):
+            return True
+
+        if isinstance(value, tuple):
+            return all(JsonEncoder.__is_immutable(item) for item in value)
+
+        if dataclasses.is_dataclass(value) and not isinstance(value, type):
+            return value.__dataclass_params__.frozen and \
+                all(JsonEncoder.__is_immutable(getattr(value, field.name)) for field in dataclasses.fields(value))
+
+        return False
+
+
+class JsonEncoderWrongTypeException(Exception):
+    """ Exception to be raised if the JSON encoder is not valid.
+    """
+    def __init__(self, encoder):
+        message = "JSON encoder should be 'json', 'orjson' if it is installed, a function or `None`, '{}' was " \
+                  "given".format(encoder)
+        super().__init__(message)
@@ -0,0 +1,316 @@
+import re
+import tempfile
+
+from httprequest import HttpRequestParseErrorException
+
+
+class MultipartParser:
+    """ Parses a multipart/form-data body incrementally while it is received, so the uploads never sit whole in memory
+    and each part can be processed while the next ones are still being uploaded. Iterating over the parser gives the
+    parts in order, each one once its data is received whole.
+
+    The body is read in chunks of fixed size and the boundaries are searched in a buffer that only keeps the data not
+    written yet, that is never much more than a chunk. The data of the file parts, the ones with a filename, is written
+    as it arrives to a temporary file, or to the file-like object given by the sink, and the data of the other parts,
+    the form fields, is kept in memory.
+
+    Usage:
+        @HttpRequestHandler.post("/upload")
+        def upload():
+            for part in MultipartParser(HttpRequestHandler.get_current_request(), max_part_size=10 * 1024 * 1024):
+                ...
+    """
+    __PARAMETER_REGEX = re.compile(r';\s*([^=;\s]+)\s*=\s*("(?:[^"\\]|\\.)*"|[^;]*)')
+
+    __MAX_HEADERS_SIZE = 16384
+
+    def __init__(self, request, max_part_size=None, max_field_size=1048576, max_total_size=None, sink=None,
+                 temp_dir=None, chunk_size=65536):
+        """ Checks the request without reading its body.
+
+        Args:
+            request (HttpRequest): the request, its body is read while iterating.
+            max_part_size (int): the maximum size of the data of each file part, or `None` for no limit.
+            max_field_size (int): the maximum size of the data of each field part, that is kept in memory.
+            max_total_size (int): the maximum size of the whole body, or `None` for no limit.
+            sink (function): an optional function that gets each file part, before its data is received, and returns
+                a file-like object where its data is written. By default it is written to a temporary file.
+            temp_dir (str): the directory of the temporary files, the default one of the system if `None`.
+            chunk_size (int): the size of the chunks the body is read in.
+
+        Raises:
+            MultipartParseErrorException: if the request is not multipart/form-data or it has no valid boundary.
+            MultipartSizeLimitException: if the "Content-Length" of the request exceeds the total size limit.
+        """
+        content_type = request.headers.get("Content-Type", "")
+        media_type, parameters = MultipartParser.parse_header_value(content_type)
+        boundary = parameters.get("boundary", "")
+        if media_type != "multipart/form-data" or not 0 < len(boundary) <= 70:
+            raise MultipartParseErrorException("The request is not multipart/form-data with a valid boundary")
+
+        length = request.headers.get("Content-Length")
+        if max_total_size is not None and length is not None and length.isdigit() and int(length) > max_total_size:
+            raise MultipartSizeLimitException("body", max_total_size)
+
+        self.__request = request
+        self.__delimiter = b"\r\n--" + boundary.encode("latin-1")
+        self.__max_part_size = max_part_size
+        self.__max_field_size = max_field_size
+        self.__max_total_size = max_total_size
+        self.__sink = sink
+        self.__temp_dir = temp_dir
+        self.__chunk_size = chunk_size
+        self.__chunks = None
+        self.__buffer = bytearray()
+        self.__total_size = 0
+
+    def __iter__(self):
+        """ Iterates over the parts as they are received.
+
+        Yields:
+            Each `Part`, once its data is received whole.
+
+        Raises:
+            MultipartParseErrorException: if the body is not well formed.
+            MultipartSizeLimitException: if a part or the whole body exceeds its size limit.
+            HttpRequestParseErrorException: if the client closes the connection before sending the whole body.
+            HttpRequestTimeoutException: if the client is too slow sending the body.
+        """
+        if self.__chunks is not None:
+            raise MultipartParseErrorException("The body has already been parsed")
+
+        self.__chunks = iter(self.__request.iter_body(self.__chunk_size))
+        """ The first delimiter can be at the start of the body, without the line break that precedes the others.
+        """
+        self.__buffer = bytearray(b"\r\n")
+        self.__read_data(None)
+        while True:
+            """ After a delimiter, "--" ends the body and a line break starts a part.
+            """
+            while len(self.__buffer) < 2:
+                self.__fill()
+
+            if self.__buffer[:2] == b"--":
+                return
+
+            line_end = self.__find(b"\r\n", 1024)
+            if self.__buffer[:line_end].strip(b" \t"):
+                raise MultipartParseErrorException("Unexpected data after a boundary")
+
+            del self.__buffer[:line_end + 2]
+            part = Part(self.__read_headers())
+            self.__read_part(part)
+            yield part
+
+    def __read_headers(self):
+        """ Reads the headers of a part.
+
+        Returns:
+            A `dict` of str: str with the headers.
+
+        Raises:
+            MultipartParseErrorException: if the headers are not well formed or too big.
+        """
+        if self.__buffer[:2] == b"\r\n":
+            del self.__buffer[:2]
+            return {}
+
+        end = self.__find(b"\r\n\r\n", MultipartParser.__MAX_HEADERS_SIZE)
+        lines = self.__buffer[:end].decode("utf-8", "replace").split("\r\n")
+        del self.__buffer[:end + 4]
+        headers = {}
+        for line in lines:
+            name, separator, value = line.partition(":")
+            if not separator:
+                raise MultipartParseErrorException("Malformed part header")
+
+            headers["-".join(word.capitalize() for word in name.strip().split("-"))] = value.strip()
+
+        return headers
+
+    def __read_part(self, part):
+        """ Reads the data of a part, writing it to a file if it is a file part or keeping it in memory otherwise.
+
+        Args:
+            part (Part): the part.
+
+        Raises:
+            MultipartSizeLimitException: if the part exceeds its size limit.
+        """
+        if part.filename is None:
+            value = bytearray()
+            limit = self.__max_field_size
+            write = value.extend
+
+        else:
+            if self.__sink is not None:
+                part.file = self.__sink(part)
+
+            else:
+                part.file = tempfile.TemporaryFile(dir=self.__temp_dir)
+
+            limit = self.__max_part_size
+            write = part.file.write
+
+        def write_limited(data):
+            part.size += len(data)
+            if limit is not None and part.size > limit:
+                raise MultipartSizeLimitException(part.name, limit)
+
+            write(data)
+
+        self.__read_data(write_limited)
+        if part.filename is None:
+            part.value = bytes(value)
+
+        elif self.__sink is None:
+            part.file.seek(0)
+
+    def __read_data(self, write):
+        """ Reads data until the next delimiter, that is consumed too, writing it as it is received. The end of the
+        buffer that could be the start of the delimiter is kept until more data is received.
+
+        Args:
+            write (function): the function that writes the data, or `None` to discard it.
+
+        Raises:
+            MultipartParseErrorException: if the body ends before the delimiter.
+        """
+        keep = len(self.__delimiter) - 1
+        while True:
+            index = self.__buffer.find(self.__delimiter)
+            if index != -1:
+                self.__write(write, index)
+                del self.__buffer[:index + len(self.__delimiter)]
+                return
+
+            if len(self.__buffer) > keep:
+                size = len(self.__buffer) - keep
+                self.__write(write, size)
+                del self.__buffer[:size]
+
+            self.__fill()
+
+    def __write(self, write, size):
+        """ Writes the start of the buffer without copying it.
+
+        Args:
+            write (function): the function that writes the data, or `None` to discard it.
+            size (int): the amount of bytes to write.
+        """
+        if write is not None and size > 0:
+            with memoryview(self.__buffer) as view, view[:size] as data:
+                write(data)
+
+    def __find(self, separator, max_size):
+        """ Finds a separator in the buffer, receiving more data until it is found.
+
+        Args:
+            separator (bytes): the separator.
+            max_size (int): the maximum amount of bytes before the separator.
+
+        Returns:
+            The position of the separator.
+
+        Raises:
+            MultipartParseErrorException: if the separator is not found within the maximum size.
+        """
+        while True:
+            index = self.__buffer.find(separator)
+            if index != -1:
+                return index
+
+            if len(self.__buffer) > max_size:
+                raise MultipartParseErrorException("Malformed or too big part headers")
+
+            self.__fill()
+
+    def __fill(self):
+        """ Receives the next chunk of the body into the buffer.
+
+        Raises:
+            MultipartParseErrorException: if the body has ended.
+            MultipartSizeLimitException: if the body exceeds the total size limit.
+        """
+        chunk = next(self.__chunks, None)
+        if chunk is None:
+            raise MultipartParseErrorException("The body ended before the closing boundary")
+
+        self.__total_size += len(chunk)
+        if self.__max_total_size is not None and self.__total_size > self.__max_total_size:
+            raise MultipartSizeLimitException("body", self.__max_total_size)
+
+        self.__buffer += chunk
+
+    @staticmethod
+    def parse_header_value(value):
+        """ Parses a header value with parameters, like "form-data; name=\"field\"; filename=\"a.txt\"".
+
+        Args:
+            value (str): the header value.
+
+        Returns:
+            A tuple(str, dict of str: str) with the main value in lowercase and the parameters, with their names in
+            lowercase and their values unquoted.
+        """
+        main_value = value.split(";", 1)[0].strip().lower()
+        parameters = {}
+        for name, parameter in MultipartParser.__PARAMETER_REGEX.findall(value):
+            parameter = parameter.strip()
+            if len(parameter) >= 2 and parameter[0] == parameter[-1] == '"':
+                parameter = re.sub(r'\\(.)', r'\1', parameter[1:-1])
+
+            parameters[name.lower()] = parameter
+
+        return main_value, parameters
+
+
+class Part:
+    """ A part of a multipart/form-data body.
+
+    Attributes:
+        headers (dict of str: str): the headers of the part.
+        name (str): the name of the form field.
+        filename (str): the name of the uploaded file, or `None` if the part is not a file.
+        content_type (str): the type of the data, "text/plain" by default.
+        size (int): the size of the data.
+        value (bytes): the data of a field part, `None` for file parts.
+        file (file): the file where the data of a file part is written, at its start if it is a temporary file, or
+            `None` for field parts.
+    """
+    def __init__(self, headers):
+        _, parameters = MultipartParser.parse_header_value(headers.get("Content-Disposition", ""))
+        self.headers = headers
+        self.name = parameters.get("name")
+        self.filename = parameters.get("filename")
+        self.content_type = headers.get("Content-Type", "text/plain")
+        self.size = 0
+        self.value = None
+        self.file = None
+
+    @property
+    def text(self):
+        """ str: the data of a field part decoded as UTF-8.
+
+        Raises:
+            MultipartParseErrorException: if the data is not UTF-8 text.
+        """
+        try:
+            return None if self.value is None else self.value.decode("utf-8")
+
+        except UnicodeDecodeError:
+            raise MultipartParseErrorException("The field '{}' is not UTF-8 text".format(self.name))
+
+
+class MultipartParseErrorException(HttpRequestParseErrorException):
+    """ An exception to raise if the multipart/form-data body is not well formed.
+    """
+    pass
+
+
+class MultipartSizeLimitException(Exception):
+    """ An exception to raise if a part or the whole multipart/form-data body exceeds its size limit.
+    """
+    def __init__(self, name, limit):
+        message = "The size of '{}' exceeds the limit of {} bytes".format(name, limit)
+        super().__init__(message)
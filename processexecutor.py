@@ -0,0 +1,396 @@
+import concurrent.futures
+import multiprocessing
+import os
+import threading
+
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+
+from admissioncontroller import AdmissionController, RequestRejectedException
+from httprequest import HttpRequest
+
+
+class ProcessExecutor:
+    """ Runs the CPU-bound endpoints in a pool of worker processes shared by every request, so they don't block the
+    other requests of the server on the GIL. The workers are started when the first endpoint is registered, so the
+    first requests don't wait for them.
+
+    The calls waiting for a worker or running are bounded, and the calls over the bound are rejected right away as the
+    server is overloaded. Each call has a timeout, after which the request is answered without its result, although the
+    function keeps running in the worker until it returns, as a running call cannot be cancelled.
+
+    The arguments, the result and the body of the request are pickled to the workers, except for `bytes` over the
+    shared memory threshold, that are copied through shared memory instead of the pipe of the pool. In the workers,
+    `HttpRequestHandler.get_current_request` returns a copy of the request with its body.
+
+    The workers import the app module again to get the functions, even before the pool initializes them, so they know
+    they are workers from the `OWNER_VARIABLE` environment variable, that has the process ID of the process that
+    started the pool.
+    """
+    OWNER_VARIABLE = "HTTPSERVER_PROCESS_POOL_OWNER"
+
+    __LOCK = threading.Lock()
+
+    __POOL = None
+
+    __PENDING = 0
+
+    __IN_WORKER = os.environ.get(OWNER_VARIABLE, str(os.getpid())) != str(os.getpid())
+
+    __CONFIG = {
+        "workers": os.cpu_count() or 1,
+        "max_pending": None,
+        "timeout": 30,
+        "shared_memory_threshold": 65536,
+        "start_method": None
+    }
+
+    @staticmethod
+    def start():
+        """ Starts the pool and its workers, unless it is already started or it is called in a worker, where the app
+        module is imported again to get the functions.
+        """
+        with ProcessExecutor.__LOCK:
+            if ProcessExecutor.__POOL is not None or ProcessExecutor.__IN_WORKER:
+                return
+
+            os.environ[ProcessExecutor.OWNER_VARIABLE] = str(os.getpid())
+            start_method = ProcessExecutor.__CONFIG["start_method"]
+            if start_method is None:
+                """ Forking a server with running threads can deadlock the workers, the fork server starts them from a
+                process without threads.
+                """
+                start_method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+
+            workers = ProcessExecutor.__CONFIG["workers"]
+            ProcessExecutor.__POOL = concurrent.futures.ProcessPoolExecutor(
+                workers, mp_context=multiprocessing.get_context(start_method), initializer=_init_worker)
+            for _ in range(workers):
+                ProcessExecutor.__POOL.submit(_warm_up)
+
+    @staticmethod
+    def set_in_worker():
+        """ Marks the process as a worker of the pool.
+        """
+        ProcessExecutor.__IN_WORKER = True
+
+    @staticmethod
+    def is_in_worker():
+        """ Checks if the process is a worker of the pool.
+
+        Returns:
+            `True` if it is a worker.
+        """
+        return ProcessExecutor.__IN_WORKER
+
+    @staticmethod
+    def shutdown():
+        """ Stops the pool, without waiting for the running calls.
+        """
+        with ProcessExecutor.__LOCK:
+            pool, ProcessExecutor.__POOL = ProcessExecutor.__POOL, None
+
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    @staticmethod
+    def run(function, arguments, request=None):
+        """ Runs a function in a worker and waits for its result.
+
+        Args:
+            function (function): the function, it has to be importable by the workers, like a module level function.
+            arguments (list of obj): the arguments.
+            request (HttpRequest): the request being handled, that the function can get in the worker.
+
+        Returns:
+            The result of the function.
+
+        Raises:
+            RequestRejectedException: if the bound of pending calls is reached.
+            ProcessCallTimeoutException: if the function doesn't return before the timeout.
+        """
+        ProcessExecutor.start()
+        with ProcessExecutor.__LOCK:
+            max_pending = ProcessExecutor.__CONFIG["max_pending"]
+            if max_pending is None:
+                max_pending = 2 * ProcessExecutor.__CONFIG["workers"]
+
+            if ProcessExecutor.__PENDING >= max_pending:
+                raise RequestRejectedException(AdmissionController.get_retry_after())
+
+            ProcessExecutor.__PENDING += 1
+            pool = ProcessExecutor.__POOL
+            threshold = ProcessExecutor.__CONFIG["shared_memory_threshold"]
+            timeout = ProcessExecutor.__CONFIG["timeout"]
+
+        shared = []
+        result = concurrent.futures.Future()
+        try:
+            arguments = [_to_shared(argument, threshold, shared) for argument in arguments]
+            body = None
+            if request is not None:
+                body = _to_shared(request.raw_body, threshold, shared)
+                request = ProcessExecutor.__copy_request(request)
+
+            future = pool.submit(_call, function, arguments, request, body, threshold)
+
+        except BaseException as e:
+            ProcessExecutor.__finish(shared)
+            if isinstance(e, BrokenProcessPool):
+                ProcessExecutor.__replace(pool)
+
+            raise
+
+        future.add_done_callback(lambda done: ProcessExecutor.__on_done(done, result, shared))
+        try:
+            return result.result(timeout)
+
+        except concurrent.futures.TimeoutError:
+            raise ProcessCallTimeoutException(function, timeout)
+
+        except BrokenProcessPool:
+            ProcessExecutor.__replace(pool)
+            raise
+
+    @staticmethod
+    def __replace(pool):
+        """ Forgets a pool that cannot be used anymore because a worker died, so the next call starts a new one.
+
+        Args:
+            pool (concurrent.futures.ProcessPoolExecutor): the broken pool.
+        """
+        with ProcessExecutor.__LOCK:
+            if ProcessExecutor.__POOL is pool:
+                ProcessExecutor.__POOL = None
+
+        pool.shutdown(wait=False)
+
+    @staticmethod
+    def __copy_request(request):
+        """ Copies a request without its body and its connection, so it can be pickled.
+
+        Args:
+            request (HttpRequest): the request.
+
+        Returns:
+            The copy of the request.
+        """
+        copy = HttpRequest(None)
+        copy.method = request.method
+        copy.request_uri = request.request_uri
+        copy.query_string = request.query_string
+        copy.http_version = request.http_version
+        copy.scheme = request.scheme
+        copy.headers = dict(request.headers)
+        return copy
+
+    @staticmethod
+    def __on_done(future, result, shared):
+        """ Takes the result of a call once the worker has finished it, even if the caller has stopped waiting for it,
+        so the shared memory is always released.
+
+        Args:
+            future (concurrent.futures.Future): the future of the call in the pool.
+            result (concurrent.futures.Future): the future the caller waits for.
+            shared (list of shared_memory.SharedMemory): the shared memory of the arguments.
+        """
+        try:
+            result.set_result(_from_shared(future.result(), unlink=True))
+
+        except BaseException as e:
+            result.set_exception(e)
+
+        finally:
+            ProcessExecutor.__finish(shared)
+
+    @staticmethod
+    def __finish(shared):
+        """ Releases the shared memory of the arguments of a call and its place in the bound of pending calls.
+
+        Args:
+            shared (list of shared_memory.SharedMemory): the shared memory.
+        """
+        for memory in shared:
+            memory.close()
+            memory.unlink()
+
+        with ProcessExecutor.__LOCK:
+            ProcessExecutor.__PENDING -= 1
+
+    @staticmethod
+    def set_process_pool(config):
+        """ Configures the pool. If it is already started, it is replaced by a new one with the new configuration.
+
+        Args:
+            config (dict of str: obj): a `dict` with the optional keys:
+                "workers": the amount of worker processes, the amount of CPUs by default.
+                "max_pending": the maximum amount of calls waiting or running, twice the workers by default.
+                "timeout": the seconds to wait for the result of a call, 30 by default.
+                "shared_memory_threshold": the size from which the `bytes` are passed through shared memory, 65536 by
+                    default.
+                "start_method": the `multiprocessing` start method of the workers, "forkserver" by default if it is
+                    available, "spawn" otherwise.
+            Or `None` to stop the pool until it is used again.
+
+        Raises:
+            ProcessPoolConfigWrongTypeException: if the config object has an incorrect structure.
+        """
+        if config is None:
+            ProcessExecutor.shutdown()
+            return
+
+        if not isinstance(config, dict):
+            raise ProcessPoolConfigWrongTypeException(config)
+
+        for key, value in config.items():
+            if key not in ProcessExecutor.__CONFIG:
+                raise ProcessPoolConfigWrongTypeException(config)
+
+            if key == "start_method":
+                if value is not None and value not in multiprocessing.get_all_start_methods():
+                    raise ProcessPoolConfigWrongTypeException(config)
+
+            elif key in ["workers", "max_pending", "shared_memory_threshold"]:
+                if (value is not None or key != "max_pending") and \
+                        (isinstance(value, bool) or not isinstance(value, int) or value <= 0):
+                    raise ProcessPoolConfigWrongTypeException(config)
+
+            elif isinstance(value, bool) or not isinstance(value, (int, float)) or value <= 0:
+                raise ProcessPoolConfigWrongTypeException(config)
+
+        with ProcessExecutor.__LOCK:
+            running = ProcessExecutor.__POOL is not None
+            ProcessExecutor.__CONFIG.update(config)
+
+        if running:
+            ProcessExecutor.shutdown()
+            ProcessExecutor.start()
+
+
+class SharedBytes:
+    """ A reference to `bytes` copied to shared memory, that is pickled in their place.
+
+    Attributes:
+        name (str): the name of the shared memory block.
+        size (int): the size of the `bytes`, the block can be bigger.
+    """
+    def __init__(self, name, size):
+        self.name = name
+        self.size = size
+
+
+def _to_shared(value, threshold, shared=None):
+    """ Copies a value to shared memory if it is `bytes` over the threshold.
+
+    Args:
+        value (obj): the value.
+        threshold (int): the size threshold.
+        shared (list of shared_memory.SharedMemory): the list where the created block is added, so the creator can
+            release it, or `None` to close it right away and leave its release to the receiver.
+
+    Returns:
+        A `SharedBytes` with the reference to the copy, or the value itself if it is not copied.
+    """
+    if not isinstance(value, (bytes, bytearray)) or len(value) < threshold:
+        return value
+
+    memory = shared_memory.SharedMemory(create=True, size=len(value))
+    memory.buf[:len(value)] = value
+    if shared is None:
+        memory.close()
+
+    else:
+        shared.append(memory)
+
+    return SharedBytes(memory.name, len(value))
+
+
+def _from_shared(value, unlink=False):
+    """ Gets the `bytes` of a value copied to shared memory.
+
+    Args:
+        value (obj): the value, either a `SharedBytes` or any other value, that is returned as it is.
+        unlink (bool): `True` to release the shared memory after reading it.
+
+    Returns:
+        The value.
+    """
+    if not isinstance(value, SharedBytes):
+        return value
+
+    memory = shared_memory.SharedMemory(name=value.name)
+    try:
+        return bytes(memory.buf[:value.size])
+
+    finally:
+        memory.close()
+        if unlink:
+            memory.unlink()
+
+
+def _call(function, arguments, request, body, threshold):
+    """ Runs a function in a worker. It is a module level function so the pool can pickle it.
+
+    Args:
+        function (function): the function.
+        arguments (list of obj): the arguments, with the `bytes` over the threshold in shared memory.
+        request (HttpRequest): the copy of the request, or `None`.
+        body (bytes): the body of the request, in shared memory if it is over the threshold.
+        threshold (int): the size from which the result is returned through shared memory.
+
+    Returns:
+        The result, in shared memory if it is `bytes` over the threshold.
+    """
+    arguments = [_from_shared(argument) for argument in arguments]
+    if request is not None:
+        request.raw_body = _from_shared(body)
+
+    HttpRequest.set_current(request)
+    try:
+        return _to_shared(function(*arguments), threshold)
+
+    finally:
+        HttpRequest.set_current(None)
+
+
+def _init_worker():
+    """ Initializes a worker. It is a module level function so the pool can pickle it.
+    """
+    ProcessExecutor.set_in_worker()
+    parent = multiprocessing.parent_process()
+    if parent is not None:
+        threading.Thread(target=_exit_with_parent, args=(parent,), daemon=True).start()
+
+
+def _exit_with_parent(parent):
+    """ Exits the worker when the server process dies, as the pool cannot stop it if the server is killed.
+
+    Args:
+        parent (multiprocessing.process.BaseProcess): the server process.
+    """
+    parent.join()
+    os._exit(1)
+
+
+def _warm_up():
+    """ Does nothing, it makes the pool start a worker.
+    """
+    pass
+
+
+class ProcessCallTimeoutException(Exception):
+    """ Exception to be raised if a function run in a worker doesn't return before the timeout.
+    """
+    def __init__(self, function, timeout):
+        name = getattr(function, "__qualname__", repr(function))
+        message = "The function '{}' didn't return in {} seconds".format(name, timeout)
+        super().__init__(message)
+
+
+class ProcessPoolConfigWrongTypeException(Exception):
+    """ Exception to be raised if the process pool config object has an incorrect structure.
+    """
+    def __init__(self, config):
+        message = "Process pool config should be a `dict` of 'workers', 'max_pending', 'timeout', " \
+                  "'shared_memory_threshold' or 'start_method' or `None`, '{}' was given".format(config)
+        super().__init__(message)
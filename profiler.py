@@ -0,0 +1,274 @@
+import collections
+import contextlib
+import json
+import os
+import sys
+import threading
+import time
+
+
+class SamplingProfiler:
+    """ Samples the stacks of every thread at a fixed rate for a bounded window and dumps them as collapsed stacks, the
+    format read by flamegraph.pl and speedscope, where each line is the frames of a stack from the root separated by
+    ";" followed by the amount of samples. It can be started and stopped at runtime without restarting the server.
+
+    The process ID is appended to the path of the dump, like "profile.folded.1234", as every worker of `HttpServer`
+    samples its own stacks.
+    """
+    __LOCK = threading.Lock()
+
+    __THREAD = None
+
+    __STOP = threading.Event()
+
+    @staticmethod
+    def start(rate=100, duration=30, output="profile.folded"):
+        """ Starts sampling in a background thread, unless it is already sampling.
+
+        Args:
+            rate (int): the samples per second.
+            duration (float): the seconds to sample, after them the stacks are dumped and the sampling stops.
+            output (str): the path of the file where the collapsed stacks are dumped, followed by "." and the process
+                ID.
+
+        Returns:
+            `True` if the sampling started, `False` if it was already sampling.
+
+        Raises:
+            ProfilingConfigWrongTypeException: if any of the arguments has an incorrect type.
+        """
+        for value in [rate, duration]:
+            if isinstance(value, bool) or not isinstance(value, (int, float)) or value <= 0:
+                raise ProfilingConfigWrongTypeException(value)
+
+        if not isinstance(output, str):
+            raise ProfilingConfigWrongTypeException(output)
+
+        with SamplingProfiler.__LOCK:
+            if SamplingProfiler.__THREAD is not None and SamplingProfiler.__THREAD.is_alive():
+                return False
+
+            SamplingProfiler.__STOP.clear()
+            SamplingProfiler.__THREAD = threading.Thread(target=SamplingProfiler.__sample,
+                                                         args=(1 / rate, duration, output), daemon=True)
+            SamplingProfiler.__THREAD.start()
+            return True
+
+    @staticmethod
+    def stop():
+        """ Stops the sampling before the end of its window and waits until the stacks are dumped.
+        """
+        SamplingProfiler.__STOP.set()
+        thread = SamplingProfiler.__THREAD
+        if thread is not None:
+            thread.join()
+
+    @staticmethod
+    def is_running():
+        """ Checks if it is sampling.
+
+        Returns:
+            `True` if it is sampling.
+        """
+        thread = SamplingProfiler.__THREAD
+        return thread is not None and thread.is_alive()
+
+    @staticmethod
+    def __sample(interval, duration, output):
+        """ Samples until the window ends or it is stopped, then dumps the stacks.
+
+        Args:
+            interval (float): the seconds between samples.
+            duration (float): the seconds of the window.
+            output (str): the path of the dump file.
+        """
+        stacks = collections.Counter()
+        own_thread = threading.get_ident()
+        deadline = time.monotonic() + duration
+        while time.monotonic() < deadline and not SamplingProfiler.__STOP.wait(interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_thread:
+                    continue
+
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append("{}:{}:{}".format(os.path.basename(code.co_filename), code.co_name,
+                                                   code.co_firstlineno))
+                    frame = frame.f_back
+
+                stacks[";".join(reversed(stack))] += 1
+
+        with open("{}.{}".format(output, os.getpid()), "w") as f:
+            for stack, count in stacks.most_common():
+                f.write("{} {}\n".format(stack, count))
+
+
+class RequestTracer:
+    """ Records timing spans of the handling of the requests and writes them to a ring buffer file, so its size is
+    bounded however long the tracing is enabled. The file has a fixed amount of slots of fixed size, each one holding
+    one trace as a JSON line padded with spaces, and the oldest trace is overwritten when all the slots are used. Each
+    trace has a "seq" field with its order, and the spans have a "name", their "start" relative to the start of the
+    trace and their "duration", both in milliseconds.
+
+    The process ID is appended to the path of the file, like "traces.ring.1234", as every worker of `HttpServer` records
+    its own traces and numbers them on its own.
+    """
+    __LOCK = threading.Lock()
+
+    __CONFIG = None
+
+    __FILE = None
+
+    __SEQ = 0
+
+    __SLOT_SIZE = 4096
+
+    @staticmethod
+    def start_trace():
+        """ Starts the trace of a request.
+
+        Returns:
+            A new `Trace`, or `None` if the tracing is disabled.
+        """
+        if RequestTracer.__CONFIG is None:
+            return None
+
+        return Trace()
+
+    @staticmethod
+    def record(trace):
+        """ Writes a finished trace to its slot in the ring buffer file.
+
+        Args:
+            trace (Trace): the trace.
+        """
+        with RequestTracer.__LOCK:
+            if RequestTracer.__FILE is None:
+                return
+
+            data = trace.to_dict()
+            data["seq"] = RequestTracer.__SEQ
+            line = json.dumps(data, separators=(",", ":")).encode("utf-8")
+            while len(line) >= RequestTracer.__SLOT_SIZE and (data["spans"] or data["tags"]):
+                """ Keeps the slot size fixed dropping the spans that don't fit, and then the tags.
+                """
+                if data["spans"]:
+                    data["spans"] = data["spans"][:len(data["spans"]) // 2]
+
+                else:
+                    data["tags"] = {}
+
+                data["truncated"] = True
+                line = json.dumps(data, separators=(",", ":")).encode("utf-8")
+
+            if len(line) >= RequestTracer.__SLOT_SIZE:
+                return
+
+            slot = RequestTracer.__SEQ % RequestTracer.__CONFIG["capacity"]
+            RequestTracer.__FILE.seek(slot * RequestTracer.__SLOT_SIZE)
+            RequestTracer.__FILE.write(line.ljust(RequestTracer.__SLOT_SIZE - 1) + b"\n")
+            RequestTracer.__FILE.flush()
+            RequestTracer.__SEQ += 1
+
+    @staticmethod
+    def read_traces(path):
+        """ Reads the traces of a ring buffer file, from the oldest to the newest.
+
+        Args:
+            path (str): the path of the file.
+
+        Returns:
+            A `list` of `dict` with the traces.
+        """
+        traces = []
+        with open(path, "rb") as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    traces.append(json.loads(line.decode("utf-8")))
+
+        return sorted(traces, key=lambda trace: trace["seq"])
+
+    @staticmethod
+    def set_tracing(tracing):
+        """ Enables or disables the tracing. Enabling it again truncates the file.
+
+        Args:
+            tracing (dict of str: obj): a `dict` with the "path" of the ring buffer file, that is followed by "." and
+                the process ID, and the "capacity" in traces, that defaults to 1024, or `None` to disable the tracing.
+
+        Raises:
+            ProfilingConfigWrongTypeException: if the tracing object has an incorrect structure.
+        """
+        if tracing is not None:
+            if not isinstance(tracing, dict) or not isinstance(tracing.get("path"), str):
+                raise ProfilingConfigWrongTypeException(tracing)
+
+            capacity = tracing.get("capacity", 1024)
+            if isinstance(capacity, bool) or not isinstance(capacity, int) or capacity <= 0:
+                raise ProfilingConfigWrongTypeException(tracing)
+
+        with RequestTracer.__LOCK:
+            if RequestTracer.__FILE is not None:
+                RequestTracer.__FILE.close()
+                RequestTracer.__FILE = None
+
+            RequestTracer.__CONFIG = None
+            if tracing is not None:
+                path = "{}.{}".format(tracing["path"], os.getpid())
+                RequestTracer.__FILE = open(path, "wb")
+                RequestTracer.__SEQ = 0
+                RequestTracer.__CONFIG = {"path": path, "capacity": capacity}
+
+
+class Trace:
+    """ The timing spans of the handling of one request.
+
+    Attributes:
+        spans (list of tuple(str, float, float)): the name, start and end `time.perf_counter()` values of each span.
+        tags (dict of str: str): data that identifies the request, like its method and URI.
+    """
+    def __init__(self):
+        self.__start = time.perf_counter()
+        self.spans = []
+        self.tags = {}
+
+    @contextlib.contextmanager
+    def span(self, name):
+        """ Records a span for the code run inside the `with` block.
+
+        Args:
+            name (str): the name of the span.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+
+        finally:
+            self.spans.append((name, start, time.perf_counter()))
+
+    def to_dict(self):
+        """ Converts the trace to a serializable `dict`, with the times in milliseconds relative to its start.
+
+        Returns:
+            The `dict`.
+        """
+        def to_ms(value):
+            return round(value * 1000, 3)
+
+        return {
+            "time": time.time(),
+            "tags": self.tags,
+            "duration": to_ms(time.perf_counter() - self.__start),
+            "spans": [{"name": name, "start": to_ms(start - self.__start), "duration": to_ms(end - start)}
+                      for name, start, end in sorted(self.spans, key=lambda span: span[1])]
+        }
+
+
+class ProfilingConfigWrongTypeException(Exception):
+    """ Exception to be raised if a profiling or tracing option has an incorrect type.
+    """
+    def __init__(self, value):
+        message = "Wrong profiling or tracing option, '{}' was given".format(value)
+        super().__init__(message)
@@ -0,0 +1,344 @@
+import ctypes
+import hashlib
+import hmac
+import os
+import ssl
+import sys
+import threading
+import time
+
+
+class TlsContext:
+    """ Terminates TLS on the accepted connections, so the server doesn't need a TLS terminator in front of it. The
+    handshake is done in the thread of the connection, with a timeout, before the request is parsed.
+
+    The clients that reconnect resume their session and skip the full handshake, either with a session ticket, that
+    works in any worker process, or with the session cache of the worker. The ticket keys are derived from a secret
+    shared by the workers and the current rotation period, so every worker encrypts and decrypts the tickets with the
+    same key and they all rotate it at the same time without talking to each other. The secret is read from the ticket
+    key file if there is one, or else it is the one given to `set_ticket_secret`, that `HttpServer` sends to its
+    workers through a pipe, or else it is random, so each process has its own keys.
+
+    Python has no API for the ticket keys, they are set through OpenSSL with `ctypes` in CPython, once the OpenSSL
+    context found has been checked, only reading it, to be the one of the `ssl.SSLContext`. If that is not possible or
+    the check fails, the tickets only work in the process that issued them. OpenSSL keeps a single ticket key, so the
+    tickets issued before a rotation need a full handshake after it.
+
+    The protocols offered with ALPN are "h2" and "http/1.1" by default, the HTTP/2 connections are detected by their
+    preface as the ones without TLS.
+    """
+    __SSL_CTRL_SET_SESS_CACHE_SIZE = 42
+
+    __SSL_CTRL_GET_TLSEXT_TICKET_KEYS = 58
+
+    __SSL_CTRL_SET_TLSEXT_TICKET_KEYS = 59
+
+    __TICKET_KEYS_SIZE = 80
+
+    __LOCK = threading.Lock()
+
+    __CONTEXT = None
+
+    __ROTATION_STOP = None
+
+    __TICKET_SECRET = None
+
+    __DEFAULT_CONFIG = {
+        "certfile": None,
+        "keyfile": None,
+        "alpn": ["h2", "http/1.1"],
+        "num_tickets": 2,
+        "ticket_key_file": None,
+        "ticket_key_rotation": 43200,
+        "session_lifetime": 7200,
+        "session_cache_size": 20480,
+        "handshake_timeout": 10
+    }
+
+    __CONFIG = dict(__DEFAULT_CONFIG)
+
+    @staticmethod
+    def is_enabled():
+        """ Checks if TLS is enabled.
+
+        Returns:
+            `True` if the connections have to be wrapped with `wrap`.
+        """
+        return TlsContext.__CONTEXT is not None
+
+    @staticmethod
+    def wrap(client):
+        """ Does the TLS handshake with a client.
+
+        Args:
+            client (socket.socket): the accepted client socket.
+
+        Returns:
+            The `ssl.SSLSocket` of the connection.
+
+        Raises:
+            OSError: if the handshake fails or the client doesn't finish it within the handshake timeout.
+        """
+        client.settimeout(TlsContext.__CONFIG["handshake_timeout"])
+        tls_client = TlsContext.__CONTEXT.wrap_socket(client, server_side=True, do_handshake_on_connect=False)
+        try:
+            tls_client.do_handshake()
+
+        except OSError:
+            """ The wrapped socket has taken the connection from the client socket, it has to be closed itself.
+            """
+            tls_client.close()
+            raise
+
+        tls_client.settimeout(None)
+        return tls_client
+
+    @staticmethod
+    def get_session_stats():
+        """ Gets the session statistics of OpenSSL for this process, like the amount of resumed sessions, "hits",
+        and the ones that needed a full handshake, "misses".
+
+        Returns:
+            A `dict` of str: int with the statistics, empty if TLS is not enabled.
+        """
+        context = TlsContext.__CONTEXT
+        return {} if context is None else context.session_stats()
+
+    @staticmethod
+    def set_ticket_secret(secret):
+        """ Sets the secret the ticket keys are derived from when there is no ticket key file, so the processes with
+        the same secret can resume the sessions of each other. It has to be called before enabling TLS.
+
+        Args:
+            secret (bytes): the secret, at least 32 bytes.
+
+        Raises:
+            TlsConfigWrongTypeException: if the secret is not `bytes` or is too short.
+        """
+        if not isinstance(secret, bytes) or len(secret) < 32:
+            raise TlsConfigWrongTypeException({"ticket_secret": secret})
+
+        TlsContext.__TICKET_SECRET = secret
+
+    @staticmethod
+    def set_tls(config):
+        """ Enables TLS with the given options, or disables it.
+
+        Args:
+            config (dict of str: obj): a `dict` with the keys:
+                "certfile": the PEM file with the certificate chain, mandatory.
+                "keyfile": the PEM file with the private key, if it is not in the certificate file.
+                "alpn": the `list` of protocols offered with ALPN, "h2" and "http/1.1" by default.
+                "num_tickets": the amount of session tickets sent after a TLS 1.3 handshake, 2 by default, 0 disables
+                    the tickets.
+                "ticket_key_file": a file with at least 32 random bytes shared by every worker to derive the ticket
+                    keys.
+                "ticket_key_rotation": the seconds each ticket key is used, 43200 by default.
+                "session_lifetime": the seconds a session can be resumed, 7200 by default.
+                "session_cache_size": the maximum amount of sessions in the cache of each process, 20480 by default.
+                "handshake_timeout": the seconds the client has to finish the handshake, 10 by default.
+            Or `None` to disable TLS.
+
+        Raises:
+            TlsConfigWrongTypeException: if the config object has an incorrect structure.
+            OSError: if the certificate, the key or the ticket key file cannot be read.
+            ssl.SSLError: if the certificate or the key are not valid.
+        """
+        if config is None:
+            with TlsContext.__LOCK:
+                TlsContext.__stop_rotation()
+                TlsContext.__CONTEXT = None
+
+            return
+
+        if not isinstance(config, dict) or not isinstance(config.get("certfile"), str):
+            raise TlsConfigWrongTypeException(config)
+
+        for key, value in config.items():
+            if key not in TlsContext.__DEFAULT_CONFIG:
+                raise TlsConfigWrongTypeException(config)
+
+            if key in ["certfile", "keyfile", "ticket_key_file"]:
+                if value is not None and not isinstance(value, str):
+                    raise TlsConfigWrongTypeException(config)
+
+            elif key == "alpn":
+                if not isinstance(value, list) or not all(isinstance(protocol, str) for protocol in value):
+                    raise TlsConfigWrongTypeException(config)
+
+            elif key in ["num_tickets", "session_cache_size"]:
+                if isinstance(value, bool) or not isinstance(value, int) or value < 0:
+                    raise TlsConfigWrongTypeException(config)
+
+            elif isinstance(value, bool) or not isinstance(value, (int, float)) or value <= 0:
+                raise TlsConfigWrongTypeException(config)
+
+        new_config = dict(TlsContext.__DEFAULT_CONFIG)
+        new_config.update(config)
+        secret = TlsContext.__read_secret(new_config["ticket_key_file"])
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(new_config["certfile"], new_config["keyfile"])
+        if new_config["alpn"]:
+            context.set_alpn_protocols(new_config["alpn"])
+
+        context.num_tickets = new_config["num_tickets"]
+        if new_config["num_tickets"] == 0:
+            context.options |= ssl.OP_NO_TICKET
+
+        rotation = new_config["ticket_key_rotation"]
+        libssl = TlsContext.__load_libssl()
+        if libssl is not None and TlsContext.__is_context(context, libssl) and \
+                TlsContext.__rotate(context, libssl, secret, rotation):
+            pointer = TlsContext.__get_pointer(context)
+            libssl.SSL_CTX_set_timeout(pointer, int(new_config["session_lifetime"]))
+            libssl.SSL_CTX_ctrl(pointer, TlsContext.__SSL_CTRL_SET_SESS_CACHE_SIZE, new_config["session_cache_size"],
+                                None)
+
+        else:
+            libssl = None
+
+        with TlsContext.__LOCK:
+            TlsContext.__stop_rotation()
+            TlsContext.__CONFIG = new_config
+            TlsContext.__CONTEXT = context
+            if libssl is not None:
+                TlsContext.__ROTATION_STOP = threading.Event()
+                threading.Thread(target=TlsContext.__rotate_periodically,
+                                 args=(context, libssl, secret, rotation, TlsContext.__ROTATION_STOP),
+                                 daemon=True).start()
+
+    @staticmethod
+    def __read_secret(ticket_key_file):
+        """ Gets the secret the ticket keys are derived from.
+
+        Args:
+            ticket_key_file (str): the ticket key file, or `None`.
+
+        Returns:
+            The secret as `bytes`.
+
+        Raises:
+            TlsConfigWrongTypeException: if the ticket key file is too short.
+        """
+        if ticket_key_file is not None:
+            with open(ticket_key_file, "rb") as f:
+                secret = f.read()
+
+            if len(secret) < 32:
+                raise TlsConfigWrongTypeException({"ticket_key_file": ticket_key_file})
+
+            return secret
+
+        return TlsContext.__TICKET_SECRET or os.urandom(32)
+
+    @staticmethod
+    def __rotate_periodically(context, libssl, secret, rotation, stop):
+        """ Sets the ticket key of each rotation period when it starts, until the context is replaced. The key is
+        changed in the context in use, so its session cache is kept.
+
+        Args:
+            context (ssl.SSLContext): the context.
+            libssl (ctypes.CDLL): the OpenSSL library.
+            secret (bytes): the secret the keys are derived from.
+            rotation (float): the seconds of each rotation period.
+            stop (threading.Event): the event set when the context is replaced.
+        """
+        while not stop.wait(rotation - time.time() % rotation):
+            TlsContext.__rotate(context, libssl, secret, rotation)
+
+    @staticmethod
+    def __rotate(context, libssl, secret, rotation):
+        """ Sets the ticket key of the current rotation period, the same in every process with the same secret. The key
+        is made of a name, that tells OpenSSL which key encrypted a ticket, an HMAC key and an AES key.
+
+        Args:
+            context (ssl.SSLContext): the context.
+            libssl (ctypes.CDLL): the OpenSSL library.
+            secret (bytes): the secret the keys are derived from.
+            rotation (float): the seconds of each rotation period.
+
+        Returns:
+            `True` if OpenSSL has the new key.
+        """
+        period = int(time.time() // rotation)
+        keys = b"".join(hmac.new(secret, b"ticket key %d %d" % (period, block), hashlib.sha512).digest()
+                        for block in range(2))[:TlsContext.__TICKET_KEYS_SIZE]
+        pointer = TlsContext.__get_pointer(context)
+        libssl.SSL_CTX_ctrl(pointer, TlsContext.__SSL_CTRL_SET_TLSEXT_TICKET_KEYS, len(keys), keys)
+        current = ctypes.create_string_buffer(TlsContext.__TICKET_KEYS_SIZE)
+        libssl.SSL_CTX_ctrl(pointer, TlsContext.__SSL_CTRL_GET_TLSEXT_TICKET_KEYS, len(current), current)
+        return current.raw == keys
+
+    @staticmethod
+    def __is_context(context, libssl):
+        """ Checks, without changing anything, that the OpenSSL context found for an `ssl.SSLContext` is really its
+        context, comparing the options and the verify mode read from both, and that it has ticket keys of the expected
+        size.
+
+        Args:
+            context (ssl.SSLContext): the context.
+            libssl (ctypes.CDLL): the OpenSSL library.
+
+        Returns:
+            `True` if the ticket keys can be set in the OpenSSL context.
+        """
+        pointer = TlsContext.__get_pointer(context)
+        return bool(pointer) and libssl.SSL_CTX_get_options(pointer) == int(context.options) and \
+            libssl.SSL_CTX_get_verify_mode(pointer) == int(context.verify_mode) and \
+            libssl.SSL_CTX_ctrl(pointer, TlsContext.__SSL_CTRL_GET_TLSEXT_TICKET_KEYS, 0, None) == \
+            TlsContext.__TICKET_KEYS_SIZE
+
+    @staticmethod
+    def __stop_rotation():
+        """ Stops the periodic rotation of the ticket keys of the current context.
+        """
+        if TlsContext.__ROTATION_STOP is not None:
+            TlsContext.__ROTATION_STOP.set()
+            TlsContext.__ROTATION_STOP = None
+
+    @staticmethod
+    def __load_libssl():
+        """ Loads the OpenSSL library the `ssl` module is linked to.
+
+        Returns:
+            The `ctypes.CDLL` with the argument types of the used functions, or `None` if it cannot be loaded.
+        """
+        if sys.implementation.name != "cpython" or not hasattr(ssl._ssl, "__file__"):
+            return None
+
+        try:
+            libssl = ctypes.CDLL(ssl._ssl.__file__)
+            libssl.SSL_CTX_ctrl.restype = ctypes.c_long
+            libssl.SSL_CTX_ctrl.argtypes = [ctypes.c_void_p, ctypes.c_int, ctypes.c_long, ctypes.c_void_p]
+            libssl.SSL_CTX_set_timeout.restype = ctypes.c_long
+            libssl.SSL_CTX_set_timeout.argtypes = [ctypes.c_void_p, ctypes.c_long]
+            libssl.SSL_CTX_get_options.restype = ctypes.c_uint64
+            libssl.SSL_CTX_get_options.argtypes = [ctypes.c_void_p]
+            libssl.SSL_CTX_get_verify_mode.restype = ctypes.c_int
+            libssl.SSL_CTX_get_verify_mode.argtypes = [ctypes.c_void_p]
+            return libssl
+
+        except (OSError, AttributeError):
+            return None
+
+    @staticmethod
+    def __get_pointer(context):
+        """ Gets the OpenSSL context of an `ssl.SSLContext`, that CPython keeps right after the object header.
+
+        Args:
+            context (ssl.SSLContext): the context.
+
+        Returns:
+            The pointer as an `int`.
+        """
+        return ctypes.c_void_p.from_address(id(context) + object.__basicsize__).value
+
+
+class TlsConfigWrongTypeException(Exception):
+    """ Exception to be raised if the TLS config object has an incorrect structure.
+    """
+    def __init__(self, config):
+        message = "TLS config should be a `dict` with a 'certfile' and optionally 'keyfile', 'alpn', 'num_tickets', " \
+                  "'ticket_key_file' with at least 32 bytes, 'ticket_key_rotation', 'session_lifetime', " \
+                  "'session_cache_size' or 'handshake_timeout', or `None`, '{}' was given".format(config)
+        super().__init__(message)
@@ -0,0 +1,706 @@
+import atexit
+import collections
+import itertools
+import os
+import socket
+import struct
+import tempfile
+import threading
+import time
+
+
+class WebSocketBus:
+    """ Lets any worker process send messages to the WebSocket connections held by any other worker of the server, to
+    a single connection by its ID or to a group of connections. Each `WebSocketHandler` is registered in the bus of its
+    worker when it is created and gets a `connection_id` made of the ID of the worker and a counter, so a message for a
+    connection goes straight to the worker that owns it. The groups are local to each worker: a published message is
+    delivered to the members in the worker and sent to every other worker, that delivers it to its own members.
+
+    The workers talk through Unix domain sockets, one listening socket per worker named after its process ID in the bus
+    directory, that is how the workers find each other. Each worker keeps a connection and a queue of messages to every
+    other worker, and a thread sends the queued messages, joining the small ones queued meanwhile in a single write up
+    to the batch size, so a burst of messages costs a few system calls.
+
+    A slow client or worker never blocks the senders: the messages for a worker whose queue is full are dropped, and
+    the messages for a client are queued in its connection, see `WebSocketHandler.post`, so a client whose queue is
+    full or that doesn't take a message within the send timeout is disconnected.
+
+    The bus directory is the one configured, or else the one in the `DIRECTORY_VARIABLE` environment variable, that
+    `HttpServer` sets for its workers, or else a new temporary one, so the bus only reaches the connections of the
+    process itself.
+
+    Usage:
+        class ChatHandler(WebSocketHandler):
+            def setup(self):
+                self.join("room")
+                ...
+
+            def received_message(self, message):
+                WebSocketBus.publish("room", message)
+    """
+    DIRECTORY_VARIABLE = "HTTPSERVER_WEBSOCKET_BUS_DIR"
+
+    __SEND = 0
+
+    __PUBLISH = 1
+
+    __HEADER = struct.Struct(">BHBI")
+
+    __MAX_TARGET_SIZE = 65535
+
+    __RECV_SIZE = 262144
+
+    __LOCK = threading.Lock()
+
+    __WORKER_ID = None
+
+    __DIRECTORY = None
+
+    __TEMPORARY_DIRECTORY = False
+
+    __LISTENER = None
+
+    __COUNTER = itertools.count(1)
+
+    __CONNECTIONS = {}
+
+    __GROUPS = {}
+
+    __MEMBERSHIPS = {}
+
+    __PEERS = {}
+
+    __DISCOVERED_AT = None
+
+    __STATS = {
+        "frames_sent": 0,
+        "batches_sent": 0,
+        "frames_received": 0,
+        "frames_dropped": 0
+    }
+
+    __CONFIG = {
+        "directory": None,
+        "max_batch_size": 65536,
+        "batch_delay": 0,
+        "max_queue_size": 8388608,
+        "discovery_interval": 1,
+        "send_timeout": 5,
+        "max_connection_queue_size": 8388608
+    }
+
+    @staticmethod
+    def start():
+        """ Starts listening for the other workers, unless it is already listening in this process.
+        """
+        with WebSocketBus.__LOCK:
+            worker_id = str(os.getpid())
+            if WebSocketBus.__LISTENER is not None and WebSocketBus.__WORKER_ID == worker_id:
+                return
+
+            directory = WebSocketBus.__CONFIG["directory"] or os.environ.get(WebSocketBus.DIRECTORY_VARIABLE)
+            temporary_directory = directory is None
+            if temporary_directory:
+                directory = tempfile.mkdtemp(prefix="websocketbus-")
+
+            os.makedirs(directory, exist_ok=True)
+            path = os.path.join(directory, worker_id + ".sock")
+            """ The socket is bound with a temporary name and renamed once it is listening, so the other workers never
+            find it refusing connections.
+            """
+            temporary_path = path + ".tmp"
+            if os.path.exists(temporary_path):
+                os.unlink(temporary_path)
+
+            listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            listener.bind(temporary_path)
+            listener.listen(socket.SOMAXCONN)
+            os.rename(temporary_path, path)
+            WebSocketBus.__WORKER_ID = worker_id
+            WebSocketBus.__DIRECTORY = directory
+            WebSocketBus.__TEMPORARY_DIRECTORY = temporary_directory
+            WebSocketBus.__LISTENER = listener
+            WebSocketBus.__PEERS = {}
+            WebSocketBus.__DISCOVERED_AT = None
+            threading.Thread(target=WebSocketBus.__accept, args=(listener,), daemon=True).start()
+            atexit.register(WebSocketBus.__remove_files, path, temporary_directory)
+
+    @staticmethod
+    def stop():
+        """ Stops listening and closes the connections with the other workers. The registered connections are kept,
+        and the bus starts again the next time it is used.
+        """
+        with WebSocketBus.__LOCK:
+            listener, WebSocketBus.__LISTENER = WebSocketBus.__LISTENER, None
+            peers, WebSocketBus.__PEERS = WebSocketBus.__PEERS, {}
+            if listener is None or WebSocketBus.__WORKER_ID != str(os.getpid()):
+                return
+
+            WebSocketBus.__remove_files(os.path.join(WebSocketBus.__DIRECTORY, WebSocketBus.__WORKER_ID + ".sock"),
+                                        WebSocketBus.__TEMPORARY_DIRECTORY)
+            listener.close()
+
+        for peer in peers.values():
+            peer.close()
+
+    @staticmethod
+    def register(handler):
+        """ Registers a connection of this worker, starting the bus if needed.
+
+        Args:
+            handler (WebSocketHandler): the handler of the connection.
+
+        Returns:
+            The ID of the connection, unique among the workers.
+        """
+        WebSocketBus.start()
+        with WebSocketBus.__LOCK:
+            connection_id = "{}.{}".format(WebSocketBus.__WORKER_ID, next(WebSocketBus.__COUNTER))
+            WebSocketBus.__CONNECTIONS[connection_id] = handler
+            WebSocketBus.__MEMBERSHIPS[connection_id] = set()
+
+        return connection_id
+
+    @staticmethod
+    def unregister(connection_id):
+        """ Forgets a connection of this worker and removes it from its groups.
+
+        Args:
+            connection_id (str): the ID of the connection.
+        """
+        with WebSocketBus.__LOCK:
+            WebSocketBus.__CONNECTIONS.pop(connection_id, None)
+            for group in WebSocketBus.__MEMBERSHIPS.pop(connection_id, ()):
+                members = WebSocketBus.__GROUPS[group]
+                members.discard(connection_id)
+                if not members:
+                    del WebSocketBus.__GROUPS[group]
+
+    @staticmethod
+    def join(connection_id, group):
+        """ Adds a connection of this worker to a group.
+
+        Args:
+            connection_id (str): the ID of the connection.
+            group (str): the name of the group.
+
+        Raises:
+            WebSocketBusConnectionNotFoundException: if the connection is not registered in this worker.
+            WebSocketBusTargetTooLongException: if the name of the group is too long.
+        """
+        WebSocketBus.__check_target(group)
+        with WebSocketBus.__LOCK:
+            if connection_id not in WebSocketBus.__CONNECTIONS:
+                raise WebSocketBusConnectionNotFoundException(connection_id)
+
+            WebSocketBus.__MEMBERSHIPS[connection_id].add(group)
+            WebSocketBus.__GROUPS.setdefault(group, set()).add(connection_id)
+
+    @staticmethod
+    def leave(connection_id, group):
+        """ Removes a connection of this worker from a group.
+
+        Args:
+            connection_id (str): the ID of the connection.
+            group (str): the name of the group.
+        """
+        with WebSocketBus.__LOCK:
+            WebSocketBus.__MEMBERSHIPS.get(connection_id, set()).discard(group)
+            members = WebSocketBus.__GROUPS.get(group)
+            if members is not None:
+                members.discard(connection_id)
+                if not members:
+                    del WebSocketBus.__GROUPS[group]
+
+    @staticmethod
+    def send(connection_id, message):
+        """ Sends a message to a connection of any worker. The message is dropped if the connection is closed.
+
+        Args:
+            connection_id (str): the ID of the connection.
+            message (str|bytes): the message, `str` messages are sent as text and `bytes` as binary.
+
+        Raises:
+            WebSocketBusTargetTooLongException: if the ID of the connection is too long.
+        """
+        WebSocketBus.__check_target(connection_id)
+        WebSocketBus.start()
+        worker_id = connection_id.partition(".")[0]
+        if worker_id == WebSocketBus.__WORKER_ID:
+            WebSocketBus.__deliver(connection_id, message)
+            return
+
+        peer = WebSocketBus.__get_peer(worker_id)
+        if peer is not None and not peer.put(WebSocketBus.__frame(WebSocketBus.__SEND, connection_id, message)):
+            WebSocketBus.__count_dropped()
+
+    @staticmethod
+    def publish(group, message):
+        """ Sends a message to every connection of a group, in any worker.
+
+        Args:
+            group (str): the name of the group.
+            message (str|bytes): the message, `str` messages are sent as text and `bytes` as binary.
+
+        Raises:
+            WebSocketBusTargetTooLongException: if the name of the group is too long.
+        """
+        WebSocketBus.__check_target(group)
+        WebSocketBus.start()
+        frame = WebSocketBus.__frame(WebSocketBus.__PUBLISH, group, message)
+        for peer in WebSocketBus.__get_peers():
+            if not peer.put(frame):
+                WebSocketBus.__count_dropped()
+
+        WebSocketBus.__deliver_to_group(group, message)
+
+    @staticmethod
+    def get_stats():
+        """ Gets the counters of the frames exchanged with the other workers, the batches sent show how many frames
+        are joined in each write, and the frames dropped because the queue of a worker was full.
+
+        Returns:
+            A `dict` of str: int with "frames_sent", "batches_sent", "frames_received" and "frames_dropped".
+        """
+        with WebSocketBus.__LOCK:
+            return dict(WebSocketBus.__STATS)
+
+    @staticmethod
+    def __count_batch(frames):
+        """ Counts a batch sent to another worker.
+
+        Args:
+            frames (int): the amount of frames of the batch.
+        """
+        with WebSocketBus.__LOCK:
+            WebSocketBus.__STATS["frames_sent"] += frames
+            WebSocketBus.__STATS["batches_sent"] += 1
+
+    @staticmethod
+    def __check_target(target):
+        """ Checks that a connection ID or a group name fits in the frames sent to the other workers.
+
+        Args:
+            target (str): the connection ID or the group name.
+
+        Raises:
+            WebSocketBusTargetTooLongException: if it is longer than 65535 bytes encoded as UTF-8.
+        """
+        if len(target.encode("utf-8")) > WebSocketBus.__MAX_TARGET_SIZE:
+            raise WebSocketBusTargetTooLongException(target, WebSocketBus.__MAX_TARGET_SIZE)
+
+    @staticmethod
+    def __count_dropped():
+        """ Counts a frame dropped because the queue of a worker was full.
+        """
+        with WebSocketBus.__LOCK:
+            WebSocketBus.__STATS["frames_dropped"] += 1
+
+    @staticmethod
+    def __frame(kind, target, message):
+        """ Encodes a message for another worker, as a header with its kind, the sizes of its target and its payload
+        and if it is text, followed by the target and the payload.
+
+        Args:
+            kind (int): either `__SEND` or `__PUBLISH`.
+            target (str): the connection ID or the group.
+            message (str|bytes): the message.
+
+        Returns:
+            The frame as `bytes`.
+        """
+        is_text = isinstance(message, str)
+        payload = message.encode("utf-8") if is_text else bytes(message)
+        target = target.encode("utf-8")
+        return WebSocketBus.__HEADER.pack(kind, len(target), is_text, len(payload)) + target + payload
+
+    @staticmethod
+    def __accept(listener):
+        """ Accepts the connections of the other workers until the bus is stopped.
+
+        Args:
+            listener (socket.socket): the listening socket.
+        """
+        while True:
+            try:
+                connection, _ = listener.accept()
+
+            except OSError:
+                return
+
+            threading.Thread(target=WebSocketBus.__receive, args=(connection,), daemon=True).start()
+
+    @staticmethod
+    def __receive(connection):
+        """ Receives the frames of another worker and delivers them, until it closes the connection.
+
+        Args:
+            connection (socket.socket): the connection with the other worker.
+        """
+        header_size = WebSocketBus.__HEADER.size
+        buffer = bytearray()
+        with connection:
+            while True:
+                try:
+                    data = connection.recv(WebSocketBus.__RECV_SIZE)
+
+                except OSError:
+                    return
+
+                if not data:
+                    return
+
+                buffer += data
+                offset = 0
+                frames = 0
+                while len(buffer) - offset >= header_size:
+                    kind, target_size, is_text, payload_size = WebSocketBus.__HEADER.unpack_from(buffer, offset)
+                    end = offset + header_size + target_size + payload_size
+                    if len(buffer) < end:
+                        break
+
+                    target_start = offset + header_size
+                    target = buffer[target_start:target_start + target_size].decode("utf-8")
+                    message = bytes(buffer[target_start + target_size:end])
+                    if is_text:
+                        message = message.decode("utf-8")
+
+                    if kind == WebSocketBus.__SEND:
+                        WebSocketBus.__deliver(target, message)
+
+                    else:
+                        WebSocketBus.__deliver_to_group(target, message)
+
+                    offset = end
+                    frames += 1
+
+                del buffer[:offset]
+                with WebSocketBus.__LOCK:
+                    WebSocketBus.__STATS["frames_received"] += frames
+
+    @staticmethod
+    def __deliver(connection_id, message):
+        """ Queues a message in a connection of this worker, without waiting for the client. If the handler fails, the
+        connection is unregistered, so it doesn't affect the delivery to the other connections.
+
+        Args:
+            connection_id (str): the ID of the connection.
+            message (str|bytes): the message.
+        """
+        handler = WebSocketBus.__CONNECTIONS.get(connection_id)
+        if handler is None:
+            return
+
+        try:
+            handler.post(message, WebSocketBus.__CONFIG["max_connection_queue_size"],
+                         WebSocketBus.__CONFIG["send_timeout"])
+
+        except Exception:
+            WebSocketBus.unregister(connection_id)
+
+    @staticmethod
+    def __deliver_to_group(group, message):
+        """ Sends a message to the connections of a group in this worker.
+
+        Args:
+            group (str): the name of the group.
+            message (str|bytes): the message.
+        """
+        with WebSocketBus.__LOCK:
+            members = list(WebSocketBus.__GROUPS.get(group, ()))
+
+        for connection_id in members:
+            WebSocketBus.__deliver(connection_id, message)
+
+    @staticmethod
+    def __get_peer(worker_id):
+        """ Gets the connection with another worker, opening it if needed.
+
+        Args:
+            worker_id (str): the ID of the worker.
+
+        Returns:
+            The `BusPeer`, or `None` if the worker is not in the bus.
+        """
+        with WebSocketBus.__LOCK:
+            peer = WebSocketBus.__PEERS.get(worker_id)
+            if peer is None and WebSocketBus.__DIRECTORY is not None:
+                path = os.path.join(WebSocketBus.__DIRECTORY, worker_id + ".sock")
+                if os.path.exists(path):
+                    peer = WebSocketBus.__open_peer(worker_id, path)
+
+            return peer
+
+    @staticmethod
+    def __get_peers():
+        """ Gets the connections with every other worker. The bus directory is listed again, to find the new workers,
+        at most once per discovery interval.
+
+        Returns:
+            A `list` of `BusPeer`.
+        """
+        with WebSocketBus.__LOCK:
+            now = time.monotonic()
+            discovered_at = WebSocketBus.__DISCOVERED_AT
+            if discovered_at is None or now - discovered_at >= WebSocketBus.__CONFIG["discovery_interval"]:
+                WebSocketBus.__DISCOVERED_AT = now
+                try:
+                    names = os.listdir(WebSocketBus.__DIRECTORY)
+
+                except OSError:
+                    names = []
+
+                for name in names:
+                    worker_id, extension = os.path.splitext(name)
+                    if extension == ".sock" and worker_id != WebSocketBus.__WORKER_ID and \
+                            worker_id not in WebSocketBus.__PEERS:
+                        WebSocketBus.__open_peer(worker_id, os.path.join(WebSocketBus.__DIRECTORY, name))
+
+            return list(WebSocketBus.__PEERS.values())
+
+    @staticmethod
+    def __open_peer(worker_id, path):
+        """ Opens the connection with another worker. It has to be called with the lock held.
+
+        Args:
+            worker_id (str): the ID of the worker.
+            path (str): the path of its socket.
+
+        Returns:
+            The `BusPeer`.
+        """
+        config = WebSocketBus.__CONFIG
+        peer = BusPeer(worker_id, path, config["max_batch_size"], config["batch_delay"], config["max_queue_size"],
+                       WebSocketBus.__count_batch, WebSocketBus.__forget_peer)
+        WebSocketBus.__PEERS[worker_id] = peer
+        return peer
+
+    @staticmethod
+    def __forget_peer(peer):
+        """ Forgets the connection with another worker once it fails. If the worker has exited without removing its
+        socket, for example because it was killed, the socket is removed.
+
+        Args:
+            peer (BusPeer): the connection.
+        """
+        with WebSocketBus.__LOCK:
+            if WebSocketBus.__PEERS.get(peer.worker_id) is peer:
+                del WebSocketBus.__PEERS[peer.worker_id]
+
+        try:
+            os.kill(int(peer.worker_id), 0)
+
+        except ProcessLookupError:
+            WebSocketBus.__remove_socket(peer.path)
+
+        except (OSError, ValueError):
+            pass
+
+    @staticmethod
+    def __remove_files(path, temporary_directory):
+        """ Removes the socket of this worker and, if the bus directory was created for this process only, the
+        directory too.
+
+        Args:
+            path (str): the path of the socket.
+            temporary_directory (bool): `True` if the directory is a temporary one created by `start`.
+        """
+        WebSocketBus.__remove_socket(path)
+        if temporary_directory:
+            try:
+                os.rmdir(os.path.dirname(path))
+
+            except OSError:
+                pass
+
+    @staticmethod
+    def __remove_socket(path):
+        """ Removes the socket of a worker, if it still exists.
+
+        Args:
+            path (str): the path of the socket.
+        """
+        try:
+            os.unlink(path)
+
+        except OSError:
+            pass
+
+    @staticmethod
+    def set_bus(config):
+        """ Configures the bus. If it is already started, it is stopped and started again the next time it is used.
+
+        Args:
+            config (dict of str: obj): a `dict` with the optional keys:
+                "directory": the directory of the sockets of the workers, see `WebSocketBus` for the default one.
+                "max_batch_size": the maximum size in bytes of the messages joined in a single write, 65536 by
+                    default.
+                "batch_delay": the seconds to wait for more messages before each write, 0 by default, that only joins
+                    the messages queued while the previous write was being done.
+                "max_queue_size": the maximum size in bytes of the messages queued for each worker, the messages are
+                    dropped when it is reached, 8388608 by default.
+                "discovery_interval": the minimum seconds between the listings of the bus directory to find new
+                    workers, 1 by default.
+                "send_timeout": the seconds a client has to take each message before it is disconnected, 5 by
+                    default.
+                "max_connection_queue_size": the maximum length of the messages queued for each client, the client
+                    is disconnected when it is reached, 8388608 by default.
+
+        Raises:
+            WebSocketBusConfigWrongTypeException: if the config object has an incorrect structure.
+        """
+        if not isinstance(config, dict):
+            raise WebSocketBusConfigWrongTypeException(config)
+
+        for key, value in config.items():
+            if key not in WebSocketBus.__CONFIG:
+                raise WebSocketBusConfigWrongTypeException(config)
+
+            if key == "directory":
+                if value is not None and not isinstance(value, str):
+                    raise WebSocketBusConfigWrongTypeException(config)
+
+            elif key in ["max_batch_size", "max_queue_size", "max_connection_queue_size"]:
+                if isinstance(value, bool) or not isinstance(value, int) or value <= 0:
+                    raise WebSocketBusConfigWrongTypeException(config)
+
+            elif key == "send_timeout":
+                if isinstance(value, bool) or not isinstance(value, (int, float)) or value <= 0:
+                    raise WebSocketBusConfigWrongTypeException(config)
+
+            elif isinstance(value, bool) or not isinstance(value, (int, float)) or value < 0:
+                raise WebSocketBusConfigWrongTypeException(config)
+
+        WebSocketBus.stop()
+        with WebSocketBus.__LOCK:
+            WebSocketBus.__CONFIG.update(config)
+
+
+class BusPeer:
+    """ The connection with another worker of the bus and the queue of frames to send to it. A thread connects to the
+    worker and sends the queued frames, joining the ones queued meanwhile in a single write up to the batch size.
+
+    Attributes:
+        worker_id (str): the ID of the worker.
+        path (str): the path of the socket of the worker.
+        closed (bool): if the connection is closed, the frames put after that are dropped.
+    """
+    def __init__(self, worker_id, path, max_batch_size, batch_delay, max_queue_size, on_batch, on_failure):
+        """ Starts the thread that connects to the worker.
+
+        Args:
+            worker_id (str): the ID of the worker.
+            path (str): the path of the socket of the worker.
+            max_batch_size (int): the maximum size in bytes of each write.
+            batch_delay (float): the seconds to wait for more frames before each write.
+            max_queue_size (int): the maximum size in bytes of the queued frames.
+            on_batch (function): the function that gets the amount of frames of each batch sent.
+            on_failure (function): the function that gets the peer if the connection fails.
+        """
+        self.worker_id = worker_id
+        self.path = path
+        self.closed = False
+        self.__max_batch_size = max_batch_size
+        self.__batch_delay = batch_delay
+        self.__max_queue_size = max_queue_size
+        self.__on_batch = on_batch
+        self.__on_failure = on_failure
+        self.__frames = collections.deque()
+        self.__queued_size = 0
+        self.__condition = threading.Condition()
+        threading.Thread(target=self.__run, daemon=True).start()
+
+    def put(self, frame):
+        """ Queues a frame, without waiting.
+
+        Args:
+            frame (bytes): the frame.
+
+        Returns:
+            `False` if the frame is dropped because the queue is full, `True` otherwise, even if the connection is
+            closed.
+        """
+        with self.__condition:
+            if self.closed:
+                return True
+
+            if self.__queued_size and self.__queued_size + len(frame) > self.__max_queue_size:
+                return False
+
+            self.__frames.append(frame)
+            self.__queued_size += len(frame)
+            self.__condition.notify_all()
+            return True
+
+    def close(self):
+        """ Closes the connection, dropping the queued frames.
+        """
+        with self.__condition:
+            self.closed = True
+            self.__frames.clear()
+            self.__queued_size = 0
+            self.__condition.notify_all()
+
+    def __run(self):
+        """ Connects to the worker and sends the queued frames until the connection is closed or fails.
+        """
+        connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            connection.connect(self.path)
+            while True:
+                with self.__condition:
+                    while not self.__frames and not self.closed:
+                        self.__condition.wait()
+
+                    if self.closed:
+                        return
+
+                if self.__batch_delay:
+                    time.sleep(self.__batch_delay)
+
+                with self.__condition:
+                    batch = []
+                    size = 0
+                    while self.__frames and (not batch or size + len(self.__frames[0]) <= self.__max_batch_size):
+                        frame = self.__frames.popleft()
+                        batch.append(frame)
+                        size += len(frame)
+
+                    self.__queued_size -= size
+
+                connection.sendall(b"".join(batch))
+                self.__on_batch(len(batch))
+
+        except OSError:
+            self.close()
+            self.__on_failure(self)
+
+        finally:
+            connection.close()
+
+
+class WebSocketBusConnectionNotFoundException(Exception):
+    """ Exception to be raised if a connection is not registered in the bus of this worker.
+    """
+    def __init__(self, connection_id):
+        message = "The WebSocket connection '{}' is not registered in this worker".format(connection_id)
+        super().__init__(message)
+
+
+class WebSocketBusTargetTooLongException(Exception):
+    """ Exception to be raised if a connection ID or a group name is too long to be sent to the other workers.
+    """
+    def __init__(self, target, max_size):
+        message = "WebSocket bus connection IDs and group names should be at most {} bytes long, one of {} bytes " \
+                  "was given".format(max_size, len(target.encode("utf-8")))
+        super().__init__(message)
+
+
+class WebSocketBusConfigWrongTypeException(Exception):
+    """ Exception to be raised if the WebSocket bus config object has an incorrect structure.
+    """
+    def __init__(self, config):
+        message = "WebSocket bus config should be a `dict` of 'directory', 'max_batch_size', 'batch_delay', " \
+                  "'max_queue_size', 'discovery_interval', 'send_timeout' or 'max_connection_queue_size', " \
+                  "'{}' was given".format(config)
+        super().__init__(message)
@@ -1,15 +1,26 @@
 from select import select
 from struct import unpack_from
+import collections
+import socket
+import ssl
+import threading
+import time
 
+from websocketbus import WebSocketBus
 from websocketmessage import WebSocketMessage
 
 
 class WebSocketHandler:
     """ Handles a basic web socket communication. Its methods `setup` and `received_message` may be extended.
+
+    Every connection is registered in the `WebSocketBus` of its worker while `setup` runs, so the other workers can
+    send messages to it by its ID or to the groups it joins. The bus queues those messages with `post`, and a writer
+    thread sends them, so the bus doesn't wait for the client.
     
     Attributes:
         client (socket.socket): the client socket.
         closed (bool): a flag to close the connection.
+        connection_id (str): the ID of the connection in the `WebSocketBus`.
 
     TODO:
         * Change the read method to handle bigger messages and to support more opcodes.
@@ -17,7 +28,24 @@ class WebSocketHandler:
     def __init__(self, client):
         self.client = client
         self.closed = False
-        self.setup()
+        self.__send_lock = threading.Lock()
+        self.__outbox = collections.deque()
+        self.__outbox_size = 0
+        self.__outbox_condition = threading.Condition()
+        self.__writer_started = False
+        self.__finished = False
+        self.connection_id = WebSocketBus.register(self)
+        try:
+            self.setup()
+
+        finally:
+            """ The connection is handled by `setup`, once it returns or fails no more messages are delivered to it, and
+            the writer thread ends.
+            """
+            WebSocketBus.unregister(self.connection_id)
+            with self.__outbox_condition:
+                self.__finished = True
+                self.__outbox_condition.notify_all()
 
     def setup(self):
         """ Sets up the handler.
@@ -32,6 +60,134 @@ class WebSocketHandler:
         """
         pass
 
+    def send(self, message, timeout=None):
+        """ Sends a message to the client. It can be called from any thread.
+
+        Args:
+            message (str|bytes): the message to send, `str` messages are sent as text and `bytes` as binary.
+            timeout (float): the seconds the client has to take the whole message, or `None` to wait as long as
+                needed. If it is exceeded the connection is dropped, as the message is left cut.
+
+        Raises:
+            socket.timeout: if the timeout is exceeded.
+            OSError: if the connection is closed.
+        """
+        type_ = None
+        if isinstance(message, str):
+            type_ = "text"
+            message = message.encode("utf-8")
+
+        with self.__send_lock:
+            deadline = None if timeout is None else time.monotonic() + timeout
+            for chunk in WebSocketMessage(message, type_).get_chunks():
+                self.__send_before(chunk, deadline)
+
+    def post(self, message, max_queue_size, timeout):
+        """ Queues a message to be sent to the client by a writer thread, without waiting. The thread is started when
+        the first message is queued and ends with the connection. If the queue is full, the client is not taking the
+        messages as fast as they come and the connection is dropped.
+
+        Args:
+            message (str|bytes): the message to send, `str` messages are sent as text and `bytes` as binary.
+            max_queue_size (int): the maximum length of the queued messages.
+            timeout (float): the seconds the client has to take each message, see `send`.
+        """
+        with self.__outbox_condition:
+            if self.closed or self.__finished:
+                return
+
+            full = self.__outbox_size > 0 and self.__outbox_size + len(message) > max_queue_size
+            if not full:
+                self.__outbox.append(message)
+                self.__outbox_size += len(message)
+                self.__outbox_condition.notify()
+                if not self.__writer_started:
+                    self.__writer_started = True
+                    threading.Thread(target=self.__write, args=(timeout,), daemon=True).start()
+
+        if full:
+            self.__drop()
+
+    def __write(self, timeout):
+        """ Sends the queued messages until the connection is closed or `setup` returns.
+
+        Args:
+            timeout (float): the seconds the client has to take each message.
+        """
+        while True:
+            with self.__outbox_condition:
+                while not self.__outbox and not self.closed and not self.__finished:
+                    self.__outbox_condition.wait()
+
+                if self.closed or self.__finished:
+                    self.__outbox.clear()
+                    self.__outbox_size = 0
+                    return
+
+                message = self.__outbox.popleft()
+                self.__outbox_size -= len(message)
+
+            try:
+                self.send(message, timeout)
+
+            except Exception:
+                self.__drop()
+
+    def __send_before(self, chunk, deadline):
+        """ Sends a chunk to the client, waiting for the socket to be writable until the deadline at most. The socket
+        timeout is not used and neither is `sendall`, as the socket is shared with the thread that reads from the
+        client, that makes it briefly non-blocking.
+
+        Args:
+            chunk (bytes): the chunk.
+            deadline (float): the `time.monotonic()` value of the deadline, or `None` to wait as long as needed.
+
+        Raises:
+            socket.timeout: if the deadline is exceeded, the connection is dropped.
+        """
+        view = memoryview(chunk)
+        while len(view) > 0:
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0 or not select([], [self.client], [], remaining)[1]:
+                self.__drop()
+                raise socket.timeout("WebSocket client too slow taking the message")
+
+            try:
+                view = view[self.client.send(view):]
+
+            except (BlockingIOError, ssl.SSLWantWriteError):
+                """ The socket is briefly non-blocking while a message is read, and it was full again.
+                """
+                pass
+
+    def __drop(self):
+        """ Drops the connection without the closing handshake, that cannot follow a cut message. Shutting the socket
+        down wakes up the thread that reads from the client, that closes it.
+        """
+        self.closed = True
+        WebSocketBus.unregister(self.connection_id)
+        try:
+            self.client.shutdown(socket.SHUT_RDWR)
+
+        except OSError:
+            pass
+
+    def join(self, group):
+        """ Adds the connection to a group, so it gets the messages published to it by any worker.
+
+        Args:
+            group (str): the name of the group.
+        """
+        WebSocketBus.join(self.connection_id, group)
+
+    def leave(self, group):
+        """ Removes the connection from a group.
+
+        Args:
+            group (str): the name of the group.
+        """
+        WebSocketBus.leave(self.connection_id, group)
+
     def is_closed(self):
         """ Checks if the connection is closed.
         """ 
@@ -51,6 +207,14 @@ class WebSocketHandler:
         return True
 
     def read(self):
+        """ Reads a message from the client. With TLS, the socket may have already received and decrypted more
+        messages, that `select` cannot see as they are not in the socket anymore, so they are read too.
+        """
+        self.__read_message()
+        while not self.closed and isinstance(self.client, ssl.SSLSocket) and self.client.pending() > 0:
+            self.__read_message()
+
+    def __read_message(self):
         """ Reads a message from the client. The names of the variables were chosen trying to follow the
         names of the parts of the messages in the WebSocket Protocol specification. The method is easy
         to understand if you understand the protocol and how messages are built. For more information,
@@ -61,9 +225,31 @@ class WebSocketHandler:
         while not fin:
             first_bytes = bytearray(2)
             self.client.settimeout(0)
-            self.client.recv_into(first_bytes)
+            try:
+                received = self.client.recv_into(first_bytes)
+
+            except ssl.SSLWantReadError:
+                """ With TLS, the data received so far may not be a whole record yet, the rest is on its way.
+                """
+                received = None
+
+            self.client.settimeout(None)
+            if received is None:
+                self.__recv_exactly(first_bytes)
+
+            elif received == 0:
+                """ The client closed the connection without sending a close message.
+                """
+                self.closed = True
+                WebSocketBus.unregister(self.connection_id)
+                self.client.close()
+                return
+
+            elif received == 1:
+                self.__recv_exactly(memoryview(first_bytes)[1:])
+
             fin = first_bytes[0] & 0b10000000 > 0
-            rsv = first_bytes[0] & 0b01110000 >> 4
+            rsv = (first_bytes[0] & 0b01110000) >> 4
             opcode = first_bytes[0] & 0b00001111
             mask = first_bytes[1] & 0b10000000 > 0
             payload_length = first_bytes[1] & 0b01111111
@@ -72,24 +258,25 @@ class WebSocketHandler:
             if payload_length > 0:
                 if payload_length == 126:
                     aux_buff = bytearray(2)
-                    self.client.recv_into(aux_buff)
-                    payload_length = unpack_from(">H", aux_buff)
+                    self.__recv_exactly(aux_buff)
+                    payload_length = unpack_from(">H", aux_buff)[0]
 
                 elif payload_length == 127:
                     aux_buff = bytearray(8)
-                    self.client.recv_into(aux_buff)
-                    payload_length = unpack_from(">Q", aux_buff)
+                    self.__recv_exactly(aux_buff)
+                    payload_length = unpack_from(">Q", aux_buff)[0]
 
             if mask:
                 masking_key = bytearray(4)
-                self.client.recv_into(masking_key)
+                self.__recv_exactly(masking_key)
 
             if payload_length > 0:
                 payload = bytearray(payload_length)
-                self.client.recv_into(payload, payload_length)
+                self.__recv_exactly(payload)
 
             if opcode == 8:
                 self.closed = True
+                WebSocketBus.unregister(self.connection_id)
                 self.client.close()
                 return
 
@@ -104,14 +291,32 @@ class WebSocketHandler:
                     for i in range(payload_length):
                         payload[i] ^= masking_key[i % 4]
 
-                    message += str(payload)
+                    message += payload.decode("utf-8")
 
         self.received_message(message)
 
+    def __recv_exactly(self, buffer):
+        """ Receives from the client until the buffer is full, as a frame may arrive split in several segments.
+
+        Args:
+            buffer (bytearray|memoryview): the buffer to fill.
+
+        Raises:
+            ConnectionError: if the client closes the connection before filling the buffer.
+        """
+        view = memoryview(buffer)
+        while len(view) > 0:
+            received = self.client.recv_into(view)
+            if received == 0:
+                raise ConnectionError("WebSocket connection closed in the middle of a frame")
+
+            view = view[received:]
+
     def close(self):
         """ Closes the connection.
         """
         self.closed = True
+        WebSocketBus.unregister(self.connection_id)
         try:
             self.client.settimeout(None)
             self.client.send(WebSocketMessage.get_close())
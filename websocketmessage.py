@@ -34,7 +34,7 @@ class WebSocketMessage:
                 header += 0b10000000
 
             chunk = bytearray()
-            chunk.append(pack(">B", header))
+            chunk.append(header)
             payload_length = len(payload)
             if payload_length < 126:
                 chunk.append(payload_length)
@@ -55,4 +55,4 @@ class WebSocketMessage:
         Returns:
             A bytearray with the close message.
         """
-        return bytearray(0b1000100000000000)
+        return bytearray([0b10001000, 0])